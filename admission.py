@@ -0,0 +1,184 @@
+"""
+Connection admission control and idle-session reaping
+
+Every accepted connection is checked against a global session cap and a
+per-source-IP cap before any SSH work is done for it; refused connections
+are closed straight away.  Admitted sessions are tracked in one registry,
+and a single reaper thread closes sessions that have been idle for longer
+than the idle timeout, instead of every session keeping its own timer.
+
+Sessions only record the time of their last activity (`touch()`), so the
+hot path costs one clock read per received or sent chunk.
+"""
+
+import logging
+import threading
+import time
+from metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 10000
+
+# Seconds a blocked send may wait for a slow reader before the session is
+# dropped; output is produced in bounded chunks only as fast as it is sent
+DEFAULT_SEND_TIMEOUT = 30
+
+
+class SessionRecord:
+    """Admission record for one connection"""
+
+    __slots__ = ('ip', 'started', 'last_active', 'closer', 'reaped')
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.started = self.last_active = time.monotonic()
+        # Callable that tears the connection down (socket, then transport)
+        self.closer = None
+        self.reaped = False
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+class AdmissionControl:
+    """Session caps, idle timeout and the counters behind them"""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, max_per_ip=None,
+                 idle_timeout=None, send_timeout=DEFAULT_SEND_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.max_per_ip = max_per_ip
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.sessions = set()
+        self.per_ip = {}
+        self.counters = {
+            "accepted": 0,
+            "rejected_global": 0,
+            "rejected_per_ip": 0,
+            "reaped_idle": 0,
+            "dropped_slow": 0,
+        }
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def admit(self, address):
+        """Return a SessionRecord for an accepted connection, or None to refuse it"""
+        ip = address[0] if isinstance(address, tuple) else address
+        with self._lock:
+            if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+                self.counters["rejected_global"] += 1
+                return None
+            count = self.per_ip.get(ip, 0)
+            if self.max_per_ip is not None and count >= self.max_per_ip:
+                self.counters["rejected_per_ip"] += 1
+                return None
+            session = SessionRecord(ip)
+            self.sessions.add(session)
+            self.per_ip[ip] = count + 1
+            self.counters["accepted"] += 1
+        if self.idle_timeout and self._reaper is None:
+            self._start_reaper()
+        return session
+
+    def release(self, session):
+        with self._lock:
+            if session not in self.sessions:
+                return
+            self.sessions.discard(session)
+            count = self.per_ip[session.ip] - 1
+            if count:
+                self.per_ip[session.ip] = count
+            else:
+                del self.per_ip[session.ip]
+
+    def record_slow(self):
+        with self._lock:
+            self.counters["dropped_slow"] += 1
+
+    def reason(self, address):
+        """Describe why a connection from address would be refused"""
+        ip = address[0] if isinstance(address, tuple) else address
+        if self.max_per_ip is not None and self.per_ip.get(ip, 0) >= self.max_per_ip:
+            return f"per-IP limit of {self.max_per_ip} reached for {ip}"
+        return f"limit of {self.max_sessions} sessions reached"
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["active"] = len(self.sessions)
+        return stats
+
+    # Idle reaping
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name="idle-reaper",
+                                            daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        interval = max(0.5, min(self.idle_timeout / 4, 5.0))
+        while True:
+            time.sleep(interval)
+            self.reap()
+
+    def reap(self, now=None):
+        """Close sessions idle for longer than the idle timeout"""
+        if not self.idle_timeout:
+            return 0
+        deadline = (now if now is not None else time.monotonic()) - self.idle_timeout
+        with self._lock:
+            idle = [session for session in self.sessions
+                    if session.last_active < deadline and not session.reaped]
+            for session in idle:
+                session.reaped = True
+            self.counters["reaped_idle"] += len(idle)
+        if idle:
+            log.info("Closing %d idle session(s)", len(idle))
+        for session in idle:
+            if session.closer is not None:
+                try:
+                    session.closer()
+                except Exception:
+                    pass
+        return len(idle)
+
+
+_admission = None
+
+
+def admission_control():
+    """The admission control shared by every listener in this process"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionControl()
+    return _admission
+
+
+def set_admission_control(control):
+    global _admission
+    _admission = control
+
+
+def _collect():
+    stats = admission_control().stats()
+    return (
+        ("ssh_connections_accepted_total", "counter", "Connections admitted",
+         stats["accepted"]),
+        ("ssh_connections_rejected_total", "counter", "Connections refused by a session cap",
+         {("global",): stats["rejected_global"], ("per_ip",): stats["rejected_per_ip"]},
+         ("limit",)),
+        ("ssh_sessions_reaped_idle_total", "counter", "Sessions closed by the idle timeout",
+         stats["reaped_idle"]),
+        ("ssh_sessions_dropped_slow_total", "counter",
+         "Sessions dropped because the client stopped reading", stats["dropped_slow"]),
+        ("ssh_sessions_active", "gauge", "Admitted connections currently open",
+         stats["active"]),
+    )
+
+
+REGISTRY.register_collector(_collect)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+asyncio front end for the simulated device
+
+Accepts connections on a single event loop instead of starting a handler
+thread per client.  paramiko still runs one transport thread per connection
+for the SSH protocol itself, but the CLI sessions are driven from the loop by
+polling each channel's file descriptor.
+"""
+
+import asyncio
+import logging
+import paramiko
+import socket
+from ssh_interface import DeviceSSHServer
+from admission import admission_control
+from ssh_server import BANNER, DEFAULT_BACKLOG, EXEC_CLOSE_TIMEOUT, admit, create_server_socket
+from ssh_transport import TransportSettings
+from cli import DeviceCLI
+from device_state import DeviceState
+from faults import DISCONNECT, InjectedDisconnect
+from metrics import BYTES_RECEIVED, BYTES_SENT, SESSIONS
+from netconf import NetconfError, NetconfSession
+from recorder import session_recorder
+from session import CLISession
+
+
+log = logging.getLogger(__name__)
+
+AUTH_TIMEOUT = 30
+
+# paramiko has no write-readiness event for a channel, so a send waiting for
+# the client's window polls with these bounds (seconds)
+SEND_POLL_MIN = 0.005
+SEND_POLL_MAX = 0.1
+
+
+class LoopEvent:
+    """threading.Event look-alike that wakes an asyncio waiter when set"""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._future = loop.create_future()
+        self._set = False
+
+    def set(self):
+        # Called from paramiko's transport thread
+        if not self._set:
+            self._set = True
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    def is_set(self):
+        return self._set
+
+    async def wait(self, timeout=None):
+        if self._set:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+async def read_channel(channel, loop):
+    """Wait until the channel has data (or is closed) and read it"""
+    while not (channel.recv_ready() or channel.closed or channel.eof_received):
+        fd = channel.fileno()
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+    return channel.recv(65536)
+
+
+async def write_channel(channel, data, loop, record=None):
+    """Send data without blocking the loop while a slow reader's window is full
+
+    Gives up after the admission control's send timeout, like
+    ssh_server.send_bounded.
+    """
+    deadline = None
+    delay = SEND_POLL_MIN
+    while data:
+        if channel.send_ready():
+            sent = channel.send(data)
+            BYTES_SENT.inc(amount=sent)
+            data = data[sent:]
+            deadline = None
+            delay = SEND_POLL_MIN
+            continue
+        if channel.closed:
+            raise EOFError("channel closed")
+        now = loop.time()
+        if deadline is None:
+            deadline = now + admission_control().send_timeout
+        elif now >= deadline:
+            admission_control().record_slow()
+            raise socket.timeout("send timed out")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, SEND_POLL_MAX)
+    if record is not None:
+        record.touch()
+
+
+async def handle_fault_async(channel, fault):
+    """Act on a fault marker without blocking the loop (see faults.py)"""
+    if fault is DISCONNECT:
+        channel.get_transport().close()
+        raise InjectedDisconnect()
+    await asyncio.sleep(fault.seconds)
+
+
+async def handle_ssh_session_async(channel, cli, loop, record=None, terminal=None):
+    """Drive a CLI session on the event loop"""
+    session = CLISession(cli, terminal)
+    recorder = session_recorder()
+    capture = recorder.open_session(cli.hostname) if recorder is not None else None
+    greeting = BANNER + session.prompt()
+    if capture is not None:
+        capture.output(greeting)
+    await write_channel(channel, greeting, loop)
+
+    while cli.running:
+        try:
+            data = await read_channel(channel, loop)
+            if not data:
+                break
+            BYTES_RECEIVED.inc(amount=len(data))
+            if record is not None:
+                record.touch()
+            if capture is not None:
+                capture.input(data)
+
+            for chunk in session.feed(data):
+                if chunk.__class__ is not bytes:
+                    await handle_fault_async(channel, chunk)
+                    continue
+                if capture is not None:
+                    capture.output(chunk)
+                await write_channel(channel, chunk, loop, record)
+
+        except InjectedDisconnect:
+            log.debug("Session dropped by fault injection")
+            break
+        except Exception as e:
+            log.warning("Session error: %s", e)
+            break
+
+    if capture is not None:
+        capture.close()
+    channel.close()
+
+
+async def handle_netconf_session_async(channel, cli, loop, record=None):
+    """Drive a NETCONF subsystem channel on the event loop"""
+    session = NetconfSession(cli)
+    await write_channel(channel, session.hello(), loop)
+
+    while session.running:
+        try:
+            data = await read_channel(channel, loop)
+            if not data:
+                break
+            BYTES_RECEIVED.inc(amount=len(data))
+            if record is not None:
+                record.touch()
+
+            for chunk in session.feed(data):
+                await write_channel(channel, chunk, loop, record)
+
+        except NetconfError as e:
+            log.info("NETCONF session %d closed: %s", session.session_id, e)
+            break
+        except Exception as e:
+            log.warning("Session error: %s", e)
+            break
+
+    channel.close()
+
+
+async def run_exec_command_async(channel, cli, command, loop):
+    """Send an exec-request command's output and exit status from the loop
+
+    As ssh_server.run_exec_command, but pauses and slow readers wait on
+    the loop instead of holding a thread.
+    """
+    status = 0
+    try:
+        for chunk in cli.iter_command_bytes(command):
+            if chunk.__class__ is not bytes:
+                await handle_fault_async(channel, chunk)
+                continue
+            await write_channel(channel, chunk, loop)
+        if cli.failed:
+            status = 1
+    except InjectedDisconnect:
+        log.debug("Exec session dropped by fault injection")
+        return
+    except Exception as e:
+        log.warning("Exec error: %s", e)
+        status = 1
+    channel.send_exit_status(status)
+    channel.shutdown_write()
+
+
+async def handle_exec_command_async(channel, cli, command, loop):
+    """Run an exec-request command on the loop and close the channel"""
+    try:
+        await run_exec_command_async(channel, cli, command, loop)
+        # Let the client close first (see ssh_server.handle_exec_command)
+        while await asyncio.wait_for(read_channel(channel, loop), EXEC_CLOSE_TIMEOUT):
+            pass
+    except asyncio.TimeoutError:
+        pass
+    except Exception as e:
+        log.warning("Exec error: %s", e)
+    finally:
+        channel.close()
+
+
+async def handle_client_connection_async(client_socket, settings, loop, state=None,
+                                         fleet=None, record=None):
+    """Negotiate SSH for one client without blocking the event loop"""
+    transport = None
+    if record is not None:
+        record.closer = lambda: client_socket.shutdown(socket.SHUT_RDWR)
+    try:
+        client_socket.setblocking(True)
+        client_socket.settimeout(30)
+        # Small request/response packets must not wait for delayed ACKs
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        transport = settings.create_transport(client_socket)
+        if record is not None:
+            record.closer = transport.close
+
+        negotiated = LoopEvent(loop)
+        shell_requested = LoopEvent(loop)
+        server = DeviceSSHServer(event=shell_requested, fleet=fleet)
+        transport.start_server(event=negotiated, server=server)
+
+        if not await negotiated.wait(AUTH_TIMEOUT) or not transport.is_active():
+            log.info("SSH negotiation failed")
+            return
+
+        # The shell, exec or subsystem request arrives after auth and channel
+        # open, so once it is seen the channel is already waiting in the
+        # accept queue
+        if not await shell_requested.wait(AUTH_TIMEOUT):
+            log.info("No channel opened - authentication may have failed")
+            return
+        channel = transport.accept(0)
+        if channel is None:
+            log.info("No channel opened - authentication may have failed")
+            return
+
+        log.debug("Client authenticated successfully")
+
+        cli = DeviceCLI(server.device or state)
+        if server.exec_command is not None:
+            SESSIONS.inc("exec")
+            await handle_exec_command_async(channel, cli, server.exec_command, loop)
+        elif server.subsystem == "netconf":
+            SESSIONS.inc("netconf")
+            await handle_netconf_session_async(channel, cli, loop, record)
+        else:
+            SESSIONS.inc("shell")
+            await handle_ssh_session_async(channel, cli, loop, record, server.terminal)
+
+    except paramiko.SSHException as e:
+        log.info("SSH protocol error: %s", e)
+    except Exception as e:
+        log.warning("Client connection error: %r", e)
+    finally:
+        try:
+            if transport:
+                transport.close()
+            else:
+                client_socket.close()
+        except:
+            pass
+        if record is not None:
+            admission_control().release(record)
+
+
+async def serve_listeners(listeners, settings, fleet=None):
+    """Accept connections from several listening sockets until cancelled
+
+    listeners maps each listening socket to the device state its clients
+    are connected to (None when the device is chosen at login from fleet).
+    Connections are admitted against the process's admission control.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = set()
+
+    async def accept_loop(server_socket, state):
+        server_socket.setblocking(False)
+        while True:
+            client_socket, addr = await loop.sock_accept(server_socket)
+            record = admit(client_socket, addr)
+            if record is None:
+                continue
+            task = loop.create_task(handle_client_connection_async(
+                client_socket, settings, loop, state, fleet, record))
+            sessions.add(task)
+            task.add_done_callback(sessions.discard)
+
+    acceptors = [loop.create_task(accept_loop(server_socket, state))
+                 for server_socket, state in listeners.items()]
+    try:
+        await asyncio.gather(*acceptors)
+    finally:
+        for task in acceptors + list(sessions):
+            task.cancel()
+
+
+async def serve(server_socket, settings, state=None, fleet=None):
+    """Accept connections from a listening socket until cancelled"""
+    if state is None and fleet is None:
+        state = DeviceState()
+    await serve_listeners({server_socket: state}, settings, fleet)
+
+
+def start_async_ssh_server(host='localhost', port=2222, backlog=DEFAULT_BACKLOG, settings=None,
+                           state=None):
+    """Start the SSH server in asyncio mode"""
+    log.info("Starting SSH server on %s:%d", host, port)
+    log.info("Login credentials: username='admin', password='admin'")
+
+    if settings is None:
+        settings = TransportSettings()
+
+    server_socket = None
+    try:
+        server_socket = create_server_socket(host, port, backlog)
+        log.info("SSH server listening on %s:%d (asyncio, backlog=%d)", host, port, backlog)
+        log.info("To connect: ssh admin@%s -p %d", host, port)
+        log.info("Press Ctrl+C to stop the server")
+
+        asyncio.run(serve(server_socket, settings, state))
+    except KeyboardInterrupt:
+        log.info("Shutting down SSH server...")
+    except Exception as e:
+        log.error("Server error: %s", e)
+    finally:
+        if server_socket:
+            server_socket.close()
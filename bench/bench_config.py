@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for configuration parsing, rendering and path lookup
+
+Generates a synthetic production-sized configuration (interfaces with
+units and addresses plus policy prefix lists) and times parsing it into a
+tree, rendering it in full, resolving a `show configuration <path>` lookup
+and re-rendering after a single node changes.
+
+Usage: python bench/bench_config.py [--lines N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_tree import ConfigNode, parse_config
+
+
+def make_config(target_lines):
+    lines = ["## Last commit: 2025-11-08 14:25:33 UTC by admin", "interfaces {"]
+    ports = target_lines * 3 // 4 // 8
+    for i in range(ports):
+        lines += [
+            f"    ge-{i // 2000}/{(i // 40) % 50}/{i % 40} {{",
+            f'        description "port {i}";',
+            "        unit 0 {",
+            "            family inet {",
+            f"                address 10.{i // 256 % 256}.{i % 256}.1/24;",
+            "            }",
+            "        }",
+            "    }",
+        ]
+    lines += ["}", "policy-options {"]
+    i = 0
+    while len(lines) < target_lines - 1:
+        lines += [
+            f"    prefix-list pl-{i} {{",
+            f"        192.168.{i % 256}.0/24;",
+            f"        10.{i % 256}.0.0/16;",
+            "    }",
+        ]
+        i += 1
+    lines.append("}")
+    return "\n".join(lines), ports
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+
+    text, ports = make_config(args.lines)
+    print(f"{text.count(chr(10)) + 1} configuration lines")
+
+    root, parse_time = timed(lambda: parse_config(text))
+    _, render_time = timed(root.render)
+    _, cached_time = timed(root.render)
+    path = f"interfaces ge-{(ports - 1) // 2000}/{((ports - 1) // 40) % 50}/{(ports - 1) % 40}"
+    node, lookup_time = timed(lambda: root.lookup(path.split()))
+    inet_path = root.lookup_path((path + " unit 0 family inet").split())
+    inet_path[-1].add(ConfigNode("address 192.0.2.1/32"))
+    root.changed(inet_path)
+    _, rerender_time = timed(root.render)
+
+    print(f"parse               {parse_time * 1000:9.1f} ms")
+    print(f"render (cold)       {render_time * 1000:9.1f} ms")
+    print(f"render (memoized)   {cached_time * 1000:9.3f} ms")
+    print(f"path lookup         {lookup_time * 1000:9.3f} ms  ({path})")
+    print(f"render after change {rerender_time * 1000:9.1f} ms")
+    print(f"parse + render      {(parse_time + render_time) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Per-command latency: exec requests versus the interactive shell
+
+Starts a server (main.py) on a free local port and runs the same commands
+two ways, as automation tools do, each on a fresh connection:
+
+  exec   - `ssh device 'show version'`: send an exec request and read
+           until the channel closes
+  shell  - request a PTY and shell, wait for the banner and prompt, send
+           the command, read until the next prompt, send `exit`
+
+Latency is measured from connect to close, and also from the channel open
+to the end of the command output, leaving out the handshake that both
+paths share.
+
+Usage: python bench/bench_exec.py [--commands N] [--mode threaded|asyncio]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import paramiko
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = ["show version", "show interfaces", "show system uptime"]
+PROMPT = b"> "
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(mode):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "main.py", str(port), "--host", "127.0.0.1", "--mode", mode],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def connect(port):
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect("127.0.0.1", port, "admin", "admin", look_for_keys=False,
+                   allow_agent=False)
+    return client
+
+
+def read_until(channel, marker):
+    data = b""
+    while not data.endswith(marker):
+        chunk = channel.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def run_exec(client, command):
+    channel = client.get_transport().open_session()
+    channel.exec_command(command)
+    output = b""
+    while True:
+        chunk = channel.recv(65536)
+        if not chunk:
+            break
+        output += chunk
+    channel.recv_exit_status()
+    return output
+
+
+def run_shell(client, command):
+    channel = client.get_transport().open_session()
+    channel.get_pty()
+    channel.invoke_shell()
+    read_until(channel, PROMPT)
+    channel.sendall(command.encode() + b"\r")
+    output = read_until(channel, PROMPT)
+    channel.sendall(b"exit\r")
+    read_until(channel, b"Goodbye!\r\n")
+    return output
+
+
+def measure(label, port, runner, commands):
+    total = []
+    command_only = []
+    for i in range(commands):
+        start = time.perf_counter()
+        client = connect(port)
+        try:
+            opened = time.perf_counter()
+            runner(client, COMMANDS[i % len(COMMANDS)])
+            command_only.append(time.perf_counter() - opened)
+        finally:
+            client.close()
+        total.append(time.perf_counter() - start)
+    for name, samples in (("total", total), ("command", command_only)):
+        samples.sort()
+        print(f"{label:<6} {name:<8} median {statistics.median(samples) * 1000:7.2f} ms   "
+              f"p95 {samples[max(0, int(len(samples) * 0.95) - 1)] * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded")
+    args = parser.parse_args()
+
+    server, port = start_server(args.mode)
+    try:
+        measure("exec", port, run_exec, args.commands)
+        measure("shell", port, run_shell, args.commands)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
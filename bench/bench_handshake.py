@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+SSH handshake throughput for each host key type and algorithm setting
+
+For every setting, starts a single-process server (main.py) on a free local
+port and opens connections from several client processes at once, as a
+test harness reconnecting many clients does.  Each connection performs the
+key exchange and password authentication, then closes.  Reports
+handshakes/sec of wall time and handshakes per second of server CPU time,
+i.e. the rate one fully loaded core sustains.
+
+Usage: python bench/bench_handshake.py [--handshakes N] [--clients N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import paramiko
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = [
+    ("rsa", ["--host-keys", "rsa"]),
+    ("ecdsa", ["--host-keys", "ecdsa"]),
+    ("ed25519", ["--host-keys", "ed25519"]),
+    ("rsa, fast kex/ciphers", ["--host-keys", "rsa", "--kex", "fast", "--ciphers", "fast"]),
+    ("ed25519, fast kex/ciphers",
+     ["--host-keys", "ed25519", "--kex", "fast", "--ciphers", "fast"]),
+]
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(extra_args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "main.py", str(port), "--host", "127.0.0.1",
+         "--backlog", "1024"] + extra_args,
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def handshake(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    transport = paramiko.Transport(sock)
+    try:
+        transport.start_client(timeout=30)
+        transport.auth_password("admin", "admin")
+    finally:
+        transport.close()
+
+
+def client(port, count):
+    failures = 0
+    for _ in range(count):
+        try:
+            handshake(port)
+        except Exception:
+            failures += 1
+    return failures
+
+
+def run(label, extra_args, handshakes, clients):
+    server, port = start_server(extra_args)
+    try:
+        handshake(port)  # Load keys and warm up before measuring
+        per_client = max(1, handshakes // clients)
+        cpu_before = cpu_seconds(server.pid)
+        start = time.perf_counter()
+        with multiprocessing.Pool(clients) as pool:
+            failures = sum(pool.starmap(client, [(port, per_client)] * clients))
+        elapsed = time.perf_counter() - start
+        cpu = cpu_seconds(server.pid) - cpu_before
+    finally:
+        server.terminate()
+        server.wait()
+    done = per_client * clients - failures
+    print(f"{label:<26} {done / elapsed:8.1f} handshakes/sec   "
+          f"{done / cpu if cpu else float('inf'):8.1f} per server CPU-second   "
+          f"{failures} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--handshakes", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    for label, extra_args in SETTINGS:
+        run(label, extra_args, args.handshakes, args.clients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for interactive input processing
+
+Feeds a scripted, pipelined command stream (as produced by pasting a block
+of commands or by automation that does not wait for prompts) through the
+session input engine in recv-sized chunks, and reports commands/sec and the
+number of channel writes per command.  The per-byte engine this replaced is
+kept here as a baseline.
+
+Usage: python bench/bench_input.py [--commands N] [--chunk BYTES]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli import DeviceCLI
+from session import CLISession
+
+
+SCRIPT = [
+    "show version",
+    "show interfaces",
+    "show interface ge-0/0/0",
+    "show system uptime",
+    "show configuration system",
+]
+
+
+class CountingChannel:
+    """Stands in for a paramiko channel and counts writes"""
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def send(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+    sendall = send
+
+
+def legacy_process_input(channel, cli, data, buffer):
+    """Per-byte engine used before chunked processing"""
+    for byte in data:
+        char = chr(byte)
+        if char == '\r' or char == '\n':
+            if buffer.strip():
+                output = cli.process_command(buffer)
+                if output:
+                    channel.send(output.encode())
+                if not cli.running:
+                    return ""
+                channel.send(cli.get_prompt().encode())
+            else:
+                channel.send(cli.get_prompt().encode())
+            buffer = ""
+        elif char == '\x7f':
+            if buffer:
+                buffer = buffer[:-1]
+                channel.send(b'\b \b')
+        elif char.isprintable():
+            buffer += char
+            channel.send(char.encode())
+    return buffer
+
+
+def make_input(commands):
+    lines = [SCRIPT[i % len(SCRIPT)] for i in range(commands)]
+    return ("\r".join(lines) + "\r").encode()
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def run_legacy(pieces):
+    channel = CountingChannel()
+    cli = DeviceCLI()
+    buffer = ""
+    for piece in pieces:
+        buffer = legacy_process_input(channel, cli, piece, buffer)
+    return channel
+
+
+def run_chunked(pieces):
+    channel = CountingChannel()
+    session = CLISession(DeviceCLI())
+    for piece in pieces:
+        for out in session.feed(piece):
+            channel.sendall(out)
+    return channel
+
+
+def measure(name, func, pieces, commands, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        channel = func(pieces)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {commands / best:>12,.0f} cmds/s  "
+          f"{channel.writes / commands:>8.2f} writes/cmd  "
+          f"{channel.bytes / commands:>8.0f} bytes/cmd")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commands", type=int, default=5000)
+    parser.add_argument("--chunk", type=int, default=1024,
+                        help="size of each simulated recv() (default: 1024)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pieces = chunks(make_input(args.commands), args.chunk)
+    print(f"{args.commands} pipelined commands in {len(pieces)} chunks of {args.chunk} bytes")
+    measure("per-byte", run_legacy, pieces, args.commands, args.repeat)
+    measure("chunked", run_chunked, pieces, args.commands, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Load generator: concurrent scripted SSH sessions against the simulator
+
+Starts a server (main.py, with any extra server options) on a free local
+port, or targets one that is already running, and drives concurrent
+clients through a scripted session: connect and log in, open a shell, run
+the command mix, exit.  Clients run in separate processes so the client
+side does not share one interpreter lock.
+
+Reports handshake latency (TCP connect to authenticated), per-command
+p50/p99 latency, commands/sec and the server's CPU time and RSS (summed
+over its worker processes), and writes everything as JSON so runs can be
+compared across commits.  Everything runs over loopback.
+
+Usage: python bench/bench_load.py [--clients N] [--sessions N]
+           [--commands "show interfaces,show configuration"] [--repeat N]
+           [--target HOST:PORT --server-pid PID] [--output FILE]
+           [-- SERVER OPTIONS...]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import paramiko
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_COMMANDS = "show interfaces,show configuration"
+PROMPT = b"> "
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_server(server_args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "main.py", str(port), "--host", "127.0.0.1",
+         "--backlog", "1024"] + server_args,
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port("127.0.0.1", port):
+        server.terminate()
+        raise RuntimeError("server did not start")
+    return server, port
+
+
+# Server resource usage, from /proc
+
+def process_tree(pid):
+    """pid and all of its descendants"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def server_usage(pid):
+    """CPU seconds and RSS bytes of a server and its worker processes"""
+    cpu = 0.0
+    rss = 0
+    for process in process_tree(pid):
+        try:
+            with open(f"/proc/{process}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+# Client side
+
+def read_until(channel, marker):
+    data = b""
+    while not data.endswith(marker):
+        chunk = channel.recv(65536)
+        if not chunk:
+            raise EOFError("channel closed")
+        data += chunk
+    return data
+
+
+def run_session(host, port, commands, repeat):
+    """One scripted session; returns (handshake seconds, [(command, seconds)])"""
+    start = time.perf_counter()
+    sock = socket.create_connection((host, port))
+    transport = paramiko.Transport(sock)
+    try:
+        transport.start_client(timeout=30)
+        transport.auth_password("admin", "admin")
+        handshake = time.perf_counter() - start
+
+        channel = transport.open_session()
+        channel.get_pty(width=200, height=0)
+        channel.invoke_shell()
+        read_until(channel, PROMPT)
+        timings = []
+        for _ in range(repeat):
+            for command in commands:
+                sent = time.perf_counter()
+                channel.sendall(command.encode() + b"\r")
+                read_until(channel, PROMPT)
+                timings.append((command, time.perf_counter() - sent))
+        channel.sendall(b"exit\r")
+        channel.recv(65536)
+        return handshake, timings
+    finally:
+        transport.close()
+
+
+def client(host, port, commands, repeat, sessions):
+    handshakes = []
+    timings = []
+    failures = 0
+    for _ in range(sessions):
+        try:
+            handshake, session_timings = run_session(host, port, commands, repeat)
+        except Exception:
+            failures += 1
+            continue
+        handshakes.append(handshake)
+        timings.extend(session_timings)
+    return handshakes, timings, failures
+
+
+# Results
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def latency_summary(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3) if samples else None,
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3) if samples else None,
+        "max_ms": round(max(samples) * 1000, 3) if samples else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, host, port, server_pid):
+    commands = [command.strip() for command in args.commands.split(",") if command.strip()]
+    # Warm up: host key load, first-command caches
+    run_session(host, port, commands, 1)
+
+    usage_before = server_usage(server_pid) if server_pid else None
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.clients) as pool:
+        results = pool.starmap(client, [(host, port, commands, args.repeat, args.sessions)]
+                               * args.clients)
+    elapsed = time.perf_counter() - start
+    usage_after = server_usage(server_pid) if server_pid else None
+
+    handshakes = [sample for result in results for sample in result[0]]
+    timings = [sample for result in results for sample in result[1]]
+    failures = sum(result[2] for result in results)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "paramiko": paramiko.__version__,
+        "cpus": os.cpu_count(),
+        "parameters": {
+            "clients": args.clients,
+            "sessions_per_client": args.sessions,
+            "commands": commands,
+            "repeat": args.repeat,
+            "server_args": args.server_args,
+            "target": args.target,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "sessions": len(handshakes),
+        "failed_sessions": failures,
+        "commands_per_sec": round(len(timings) / elapsed, 1) if elapsed else None,
+        "handshake": latency_summary(handshakes),
+        "command": latency_summary([seconds for _, seconds in timings]),
+        "per_command": {command: latency_summary([seconds for name, seconds in timings
+                                                  if name == command])
+                        for command in commands},
+    }
+    if usage_before and usage_after:
+        report["server"] = {
+            "cpu_s": round(usage_after[0] - usage_before[0], 3),
+            "cpu_utilization": round((usage_after[0] - usage_before[0]) / elapsed, 3),
+            "rss_mb": round(usage_after[1] / 2**20, 1),
+            "processes": len(process_tree(server_pid)),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions ({report['failed_sessions']} failed) "
+          f"in {report['elapsed_s']} s, {report['commands_per_sec']} commands/sec")
+    rows = [("handshake", report["handshake"]), ("all commands", report["command"])]
+    rows += list(report["per_command"].items())
+    for label, summary in rows:
+        if summary["count"]:
+            print(f"  {label:<24} p50 {summary['p50_ms']:8.2f} ms   "
+                  f"p99 {summary['p99_ms']:8.2f} ms   n={summary['count']}")
+    server = report.get("server")
+    if server:
+        print(f"  server: {server['cpu_s']} CPU-s ({server['cpu_utilization']:.0%} of a core), "
+              f"{server['rss_mb']} MB RSS in {server['processes']} process(es)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[1],
+        epilog="Arguments after -- are passed to main.py, e.g. -- --mode asyncio --workers 4")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="concurrent client processes (default: 8)")
+    parser.add_argument("--sessions", type=int, default=20,
+                        help="sessions each client runs one after another (default: 20)")
+    parser.add_argument("--commands", default=DEFAULT_COMMANDS,
+                        help=f"comma-separated command mix (default: {DEFAULT_COMMANDS})")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="times the command mix is run per session (default: 1)")
+    parser.add_argument("--target", metavar="HOST:PORT",
+                        help="benchmark a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int,
+                        help="with --target: PID of the server, for CPU and RSS figures")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    argv = sys.argv[1:]
+    server_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, server_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    args.server_args = server_args
+
+    server = None
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        host, port, server_pid = host or "127.0.0.1", int(port), args.server_pid
+    else:
+        server, port = start_server(server_args)
+        host, server_pid = "127.0.0.1", server.pid
+    try:
+        report = run(args, host, port, server_pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
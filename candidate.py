@@ -0,0 +1,425 @@
+"""
+Candidate configuration, commit and rollback
+
+A session in configuration mode edits a `Candidate`: a copy-on-write view
+of the device's active configuration tree.  Only the nodes on the path to
+an edited statement are copied; every other subtree, with its memoized
+rendering, stays shared with the active tree, so a thousand sessions in
+configuration mode hold a few nodes each rather than a tree each.
+
+`Candidate.commit()` makes the candidate tree the active one with a single
+assignment and records the change as a structural diff in the device's
+`CommitHistory`.  Committed trees are never modified in place, so a diff
+keeps references to the subtrees it replaced instead of a snapshot, and
+comparing two trees skips every subtree they share.  Nodes keep no parent
+pointers, so a replaced tree is freed once the diffs that reference parts
+of it leave the history.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from config_tree import ENTRY_TAGS, ConfigNode
+
+
+# rollback 1 through 49 as on Junos; rollback 0 is the active configuration
+DEFAULT_ROLLBACK_DEPTH = 49
+
+# Keywords followed by a name that identifies one entry of a list, such as
+# `unit 0` or `server 10.0.0.1`.  Any other keyword given a single value is
+# a single-valued statement, which `set` replaces.
+LIST_KEYWORDS = frozenset((
+    "address", "area", "class", "community", "family", "file", "group", "host",
+    "interface", "neighbor", "policy-statement", "prefix-list", "route", "server",
+    "term", "unit", "user",
+))
+
+_WORD = re.compile(r'"(?:[^"\\]|\\.)*"|\[[^\]]*\]|[^\s"\[]+')
+
+# Serializes commits on all devices of this process; commits are rare and
+# short, so one lock is enough
+_commit_lock = threading.Lock()
+
+
+class ConfigEditError(Exception):
+    """Raised for a set, delete, rollback or commit that cannot be applied"""
+
+
+def split_statement(text):
+    """Split set/delete words, keeping quoted strings and [ lists ] whole"""
+    words = []
+    for word in _WORD.findall(text):
+        if word.startswith("["):
+            word = "[ " + " ".join(word[1:-1].split()) + " ]"
+        words.append(word)
+    return words
+
+
+def diff_trees(old, new, path=()):
+    """Yield (path, old node, new node) for each statement that differs
+
+    path holds the names of the containers above the statement; the old
+    node is None for an added statement and the new node None for a deleted
+    one.  Subtrees shared by both trees are skipped without being visited.
+    """
+    if old is new:
+        return
+    old_children = old.children or {}
+    new_children = new.children or {}
+    # Added leaves by keyword, so a changed value is reported as one change
+    added = {}
+    for name, child in new_children.items():
+        if name not in old_children and child.children is None:
+            added.setdefault(child.keyword, []).append(child)
+    replaced = set()
+    nested = []
+    for name, child in old_children.items():
+        other = new_children.get(name)
+        if other is child:
+            continue
+        if other is None and child.children is None and added.get(child.keyword):
+            other = added[child.keyword].pop(0)
+            replaced.add(other.name)
+        if other is None or (child.children is None) != (other.children is None):
+            yield (path, child, other)
+        elif other.name != name:
+            yield (path, child, other)
+        elif child.children is not None:
+            nested.append((child, other))
+    for name, child in new_children.items():
+        if name not in old_children and name not in replaced:
+            yield (path, None, child)
+    for child, other in nested:
+        yield from diff_trees(child, other, path + (child.name,))
+
+
+def render_diff(changes):
+    """Render changes in the style of `show | compare`"""
+    lines = []
+    current = None
+    for path, old, new in changes:
+        if path != current:
+            lines.append(f"[edit{''.join(' ' + name for name in path)}]\r\n")
+            current = path
+        for sign, node in (("-", old), ("+", new)):
+            if node is not None:
+                lines.extend(f"{sign}  {line}" for line in node.iter_lines())
+    return "".join(lines)
+
+
+def _replace_keyword(parent, keyword, node):
+    """Put node in place of the leaves with the given keyword, keeping its position"""
+    children = {}
+    placed = False
+    for name, child in parent.children.items():
+        if child.children is None and child.keyword == keyword:
+            if not placed:
+                children[node.name] = node
+                placed = True
+        else:
+            children[name] = child
+    if not placed:
+        children[node.name] = node
+    parent.children = children
+
+
+def _preceding(root, path, name):
+    """Names of the statements before `name` in the container at path, nearest first"""
+    node = root
+    for step in path:
+        node = node.children[step]
+    siblings = list(node.children)
+    return tuple(reversed(siblings[:siblings.index(name)]))
+
+
+def _restore(parent, node, preceding):
+    """Put a deleted statement back after the nearest statement that preceded it"""
+    after = next((name for name in preceding if name in parent.children), None)
+    if after is None:
+        parent.children = {node.name: node, **parent.children}
+        return
+    children = {}
+    for name, child in parent.children.items():
+        children[name] = child
+        if name == after:
+            children[node.name] = node
+    parent.children = children
+
+
+class Commit:
+    """One commit: when, by whom, and the diff from the previous configuration"""
+
+    __slots__ = ('time', 'user', 'changes', 'previous', 'positions')
+
+    def __init__(self, time, user, changes, previous=None, positions=None):
+        self.time = time
+        self.user = user
+        self.changes = changes
+        # Last-commit line of the configuration this commit replaced
+        self.previous = previous
+        # For each change, the names of the statements that preceded the
+        # replaced statement, so that undoing it restores its place
+        self.positions = positions if positions is not None else [()] * len(changes)
+
+
+class CommitHistory:
+    """The most recent commits of one device, newest first"""
+
+    def __init__(self, depth=DEFAULT_ROLLBACK_DEPTH):
+        self.commits = deque(maxlen=depth)
+
+    def __len__(self):
+        return len(self.commits)
+
+    def record(self, commit):
+        self.commits.appendleft(commit)
+
+    def undo_changes(self, number):
+        """Changes to reverse, newest first, to get back `number` commits
+
+        Each is (path, old node, new node, statements that preceded the old one).
+        """
+        if number > len(self.commits):
+            raise ConfigEditError(f"rollback {number} does not exist")
+        return [change + (preceding,) for commit in list(self.commits)[:number]
+                for change, preceding in zip(commit.changes, commit.positions)]
+
+
+class Candidate:
+    """One session's uncommitted configuration"""
+
+    def __init__(self, state):
+        self.state = state
+        self._reset(state.config)
+
+    def _reset(self, base):
+        self.base = base
+        self.root = base
+        # Nodes copied into this candidate, which may be edited in place
+        self._owned = set()
+        # Applied edits as (method, arguments), replayed over a newer active
+        # configuration if another session commits first
+        self._edits = []
+
+    @property
+    def modified(self):
+        return any(True for _ in diff_trees(self.base, self.root))
+
+    def changes(self):
+        return list(diff_trees(self.base, self.root))
+
+    # Editing
+
+    def _own(self, names):
+        """Copy the nodes along a path of statement names into the candidate"""
+        if self.root is self.base:
+            self.root = self.base.copy()
+            self._owned = {self.root}
+        node = self.root
+        for name in names:
+            child = node.children[name]
+            if child not in self._owned:
+                child = child.copy()
+                node.children[name] = child
+                self._owned.add(child)
+            node = child
+        return node
+
+    def _changed(self, names):
+        """Drop memoized renderings along an edited path of owned nodes"""
+        node = self.root
+        path = []
+        for name in names:
+            node = node.children[name]
+            path.append(node)
+        self.root.changed(path)
+
+    def set(self, words):
+        """Add or change the statement given by `set` words"""
+        self._set(words)
+        self._edits.append((Candidate._set, (words,)))
+
+    def delete(self, words):
+        """Remove the statement given by `delete` words"""
+        self._delete(words)
+        self._edits.append((Candidate._delete, (words,)))
+
+    def _set(self, words):
+        if not words:
+            raise ConfigEditError("missing statement")
+        # Follow the statements that already exist
+        node = self.root
+        names = []
+        i = 0
+        while i < len(words) and node.children is not None:
+            for j in range(len(words), i, -1):
+                found = node.children.get(" ".join(words[i:j]))
+                if found is not None:
+                    break
+            else:
+                break
+            if j == len(words):
+                return
+            if found.children is None:
+                break
+            names.append(found.name)
+            node = found
+            i = j
+
+        # Split the rest into new statements
+        statements = []
+        parent_keyword = node.keyword if names else None
+        while i < len(words):
+            remaining = len(words) - i
+            if parent_keyword in ENTRY_TAGS:
+                take = 1
+            elif words[i] in LIST_KEYWORDS and remaining >= 2:
+                take = 2
+            elif remaining <= 2:
+                take = remaining
+            else:
+                take = 1
+            name = " ".join(words[i:i + take])
+            i += take
+            statements.append((name, i < len(words), parent_keyword))
+            parent_keyword = words[i - take]
+
+        parent = self._own(names)
+        for name, container, parent_keyword in statements:
+            existing = parent.children.get(name)
+            names.append(name)
+            if container:
+                if existing is None or existing.children is None:
+                    existing = ConfigNode(name, {})
+                elif existing not in self._owned:
+                    existing = existing.copy()
+                parent.children[name] = existing
+                self._owned.add(existing)
+                parent = existing
+                continue
+            node = ConfigNode(name)
+            keyword = node.keyword
+            if (keyword != name and keyword not in LIST_KEYWORDS
+                    and parent_keyword not in ENTRY_TAGS):
+                _replace_keyword(parent, keyword, node)
+            else:
+                parent.children[name] = node
+            parent = node
+        self._changed(names[:-1])
+
+    def _delete(self, words):
+        path = self.root.lookup_path(words) if words else None
+        if not path:
+            raise ConfigEditError("statement not found")
+        names = [node.name for node in path[:-1]]
+        parent = self._own(names)
+        del parent.children[path[-1].name]
+        self._changed(names)
+
+    def _undo(self, changes):
+        for path, old, new, preceding in changes:
+            try:
+                parent = self._own(path)
+            except KeyError:
+                raise ConfigEditError(f"[edit {' '.join(path)}] no longer exists") from None
+            if new is not None and old is not None:
+                # Put the old statement back where the new one is
+                parent.children = {old.name if name == new.name else name:
+                                   old if name == new.name else child
+                                   for name, child in parent.children.items()}
+            else:
+                if new is not None:
+                    parent.children.pop(new.name, None)
+                if old is not None:
+                    _restore(parent, old, preceding)
+            self._changed(path)
+
+    def rollback(self, number=0):
+        """Replace the candidate with the configuration of `number` commits ago"""
+        changes = ()
+        if number:
+            history = self.state.history
+            if history is None:
+                raise ConfigEditError(f"rollback {number} does not exist")
+            changes = history.undo_changes(number)
+        self._reset(self.state.config)
+        if changes:
+            self._undo(changes)
+            self._edits.append((Candidate._undo, (changes,)))
+
+    def rollback_tree(self, number):
+        """The configuration of `number` commits ago, leaving the candidate alone"""
+        other = Candidate(self.state)
+        other.rollback(number)
+        return other.root
+
+    # Commit
+
+    def _rebase(self, active):
+        """Replay this candidate's edits over a newer active configuration"""
+        replay = Candidate(self.state)
+        replay._reset(active)
+        for method, args in self._edits:
+            method(replay, *args)
+        replay._edits = self._edits
+        return replay
+
+    def rebase(self):
+        """Bring the candidate up to date with commits made since it was started
+
+        Its edits are replayed over the active configuration, as commit
+        does, so comparing the candidate shows what a commit would change.
+        """
+        active = self.state.config
+        if active is self.base:
+            return
+        try:
+            replay = self._rebase(active)
+        except ConfigEditError as e:
+            raise ConfigEditError(f"configuration changed by another session: {e}") from None
+        self.base = replay.base
+        self.root = replay.root
+        self._owned = replay._owned
+
+    def commit(self, user="admin"):
+        """Make the candidate the active configuration
+
+        Returns the new Commit, or None when there is nothing to commit.
+        """
+        state = self.state
+        with _commit_lock:
+            self.rebase()
+            active = self.base
+            changes = list(diff_trees(active, self.root))
+            if not changes:
+                self._reset(active)
+                return None
+
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
+            root = self.root
+            root.last_commit = f"{stamp} by {user}"
+            root.version = active.version + 1
+            positions = [_preceding(active, path, old.name) if new is None else ()
+                         for path, old, new in changes]
+            commit = Commit(stamp, user, changes, active.last_commit, positions)
+            if state.history is None:
+                state.history = CommitHistory()
+            state.history.record(commit)
+            # Readers see either the old tree or the new one, never a mix
+            state.config = root
+            self._reset(root)
+
+        hostname = self._committed_hostname(changes)
+        if hostname:
+            state.hostname = hostname
+        else:
+            state.touch()
+        return commit
+
+    @staticmethod
+    def _committed_hostname(changes):
+        for path, _, new in changes:
+            if path == ("system",) and new is not None and new.keyword == "host-name":
+                return new.name.split(" ", 1)[1].strip('"') if " " in new.name else None
+        return None
@@ -1,332 +1,616 @@
+import calendar
+import time
+from candidate import Candidate, ConfigEditError, diff_trees, render_diff, split_statement
+from commands import (CACHE_DEVICE, CACHE_TEMPLATE, CACHE_TICK, Command, CommandError,
+                      CommandTrie)
+from device_state import DeviceState
+from faults import fault_injector
+from metrics import COMMAND_DISPATCH, COMMAND_RENDER
+from pipeline import (PipeError, apply_pipes, compare_target, compile_stages, display_format,
+                      paging_disabled, split_pipes, stage_completions)
+from render_cache import OUTPUT_CACHE
+from simclock import (PROTOCOLS_DELAY, format_ago, format_time, format_uptime,
+                      simulation_clock)
+from structured import iter_json, iter_rpc_reply_xml
+
+
+# Streamed output is encoded and written in chunks of about this many characters
+OUTPUT_CHUNK_SIZE = 32768
+
+# Ends the echoed command line before any output
+OUTPUT_START = "\r\n"
+OUTPUT_START_BYTES = OUTPUT_START.encode()
+
+# Largest `set cli screen-length`; 0 turns paging off
+MAX_SCREEN_LENGTH = 100000
+
+
+def _timed(pieces, name):
+    """Yield from pieces, recording the time spent producing them
+
+    Only the time inside the producer counts; the time the caller takes to
+    send each piece to a client is left out.
+    """
+    elapsed = 0.0
+    try:
+        started = time.perf_counter()
+        for piece in pieces:
+            elapsed += time.perf_counter() - started
+            yield piece
+            started = time.perf_counter()
+        elapsed += time.perf_counter() - started
+    finally:
+        COMMAND_RENDER.observe(elapsed, name)
+
+
+def _overlaps(path, prefix):
+    """Whether one statement path lies within the other"""
+    length = min(len(path), len(prefix))
+    return path[:length] == prefix[:length]
+
+
 class DeviceCLI:
     """Simple CLI interface for the simulated device"""
     
-    def __init__(self):
-        self.hostname = "JUNOS-MX"
+    def __init__(self, state=None):
+        # Sessions on the same device share one state object
+        self.state = state if state is not None else DeviceState()
         self.running = True
-        self.interface_status = {
-            "ge-0/0/0": "up",
-            "ge-0/0/1": "down", 
-            "ge-0/0/2": "up",
-            "lo0": "up"
-        }
+        # Whether the last command line was unknown, ambiguous or badly piped
+        self.failed = False
+        # The session's candidate configuration while in configuration mode
+        self.candidate = None
+        # Lines per page set with `set cli screen-length`; None follows the
+        # terminal's height
+        self.screen_length = None
+        
+    @property
+    def hostname(self):
+        return self.state.hostname
+        
+    @property
+    def interface_status(self):
+        return self.state.interface_status
+        
+    @property
+    def trie(self):
+        return CONFIGURE_TRIE if self.candidate is not None else COMMAND_TRIE
         
     def get_prompt(self):
+        if self.candidate is not None:
+            return f"\r\n[edit]\r\n{self.hostname}# "
         return f"{self.hostname}> "
         
-    def process_command(self, command):
-        """Process CLI commands and return output"""
+    def resolve(self, command, trie=None):
+        """Resolve a command line to a trie resolution, or to literal output"""
+        trie = trie or self.trie
         command = command.strip()
         
         if not command:
             return ""
-            
-        if command == "help" or command == "?":
-            return self.help_command()
-        elif command == "show version":
-            return self.show_version()
-        elif command == "show interfaces":
-            return self.show_interfaces()
-        elif command.startswith("show configuration"):
-            parts = command.split()
-            if len(parts) == 2:
-                return self.show_configuration()
-            elif len(parts) > 2:
-                section = " ".join(parts[2:])
-                return self.show_configuration_section(section)
-            return self.show_configuration()
-        elif command.startswith("show interface"):
-            parts = command.split()
-            if len(parts) > 2:
-                return self.show_interface_detail(parts[2])
-            return "Error: Interface name required\r\n"
-        elif command.startswith("show system"):
-            parts = command.split()
-            if len(parts) == 2:
-                return self.show_system_uptime()
-            elif len(parts) > 2:
-                subcommand = parts[2]
-                if subcommand == "uptime":
-                    return self.show_system_uptime()
-                elif subcommand == "information":
-                    return self.show_system_information()
-                elif subcommand == "processes":
-                    return self.show_system_processes()
-                elif subcommand == "storage":
-                    return self.show_system_storage()
-                else:
-                    return f"Unknown system subcommand: {subcommand}\r\nAvailable: uptime, information, processes, storage\r\n"
-            return self.show_system_uptime()
-        elif command == "exit" or command == "quit":
-            self.running = False
-            return "Goodbye!\r\n"
+        
+        if command.endswith("?"):
+            typed = command[:-1]
+            tokens = typed.split()
+            partial = "" if not typed or typed[-1].isspace() else tokens.pop()
+            return trie.completions(tokens, partial)
+        
+        resolution = trie.resolve(command.split())
+        if resolution.error:
+            return CommandError(resolution.error)
+        return resolution
+        
+    def iter_command(self, command):
+        """Yield the output of a command line as text pieces
+
+        Handlers may return a string or yield their output line by line;
+        pipe stages (`| match ...`) are applied lazily to the line stream.
+        """
+        resolution, stages, name = self._dispatch(command)
+        yield from _timed(self._iter_text(resolution, stages), name)
+        
+    def _iter_text(self, resolution, stages):
+        # The typed command line is echoed without its line end; every
+        # output starts on the next line, piped or not
+        yield OUTPUT_START
+        yield from self._iter_output(resolution, stages)
+        
+    def _iter_output(self, resolution, stages):
+        output = self._output(resolution, stages)
+        
+        if stages:
+            yield from apply_pipes(output, stages)
+        elif isinstance(output, str):
+            if output:
+                yield output
+        else:
+            yield from output
+        
+    def iter_command_bytes(self, command):
+        """Yield the encoded output of a command line in chunks
+
+        Output of cacheable commands is shared between sessions through
+        OUTPUT_CACHE until the device state changes, or between all devices
+        built from the same template when it depends on nothing else.
+        Other output is encoded and yielded as it is produced, in chunks of
+        about OUTPUT_CHUNK_SIZE characters.  With a fault injector, the
+        chunks may be interleaved with fault markers (faults.py).
+        """
+        yield from self.command_output(command)[0]
+        
+    def command_output(self, command, screen_length=0):
+        """Return the encoded output chunks of a command line and whether to page them
+
+        Output is paged when screen_length is set and the command line is
+        not piped through `| no-more`; it is then encoded piece by piece,
+        so a pager (pager.py) that stops reading also stops the command.
+        """
+        resolution, stages, name = self._dispatch(command)
+        paged = screen_length > 0 and not paging_disabled(stages)
+        chunk_size = 1 if paged else OUTPUT_CHUNK_SIZE
+        chunks = _timed(self._iter_bytes(resolution, stages, chunk_size), name)
+        injector = fault_injector()
+        if injector is not None:
+            chunks = injector.apply(self.hostname, tuple(name.split()), chunks)
+        return chunks, paged
+        
+    def _iter_bytes(self, resolution, stages, chunk_size=OUTPUT_CHUNK_SIZE):
+        # As in _iter_text, outside the pipes so it is never filtered away
+        yield OUTPUT_START_BYTES
+        if isinstance(resolution, str) and not stages:
+            if resolution:
+                yield resolution.encode()
+            return
+        if not stages and resolution.command.cache is not None:
+            yield self._cached_output(resolution)
+            return
+        
+        output = self._output(resolution, stages)
+        if stages:
+            output = apply_pipes(output, stages)
+        elif isinstance(output, str):
+            output = (output,)
+        
+        batch = []
+        size = 0
+        for piece in output:
+            batch.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield "".join(batch).encode()
+                batch = []
+                size = 0
+        if batch:
+            yield "".join(batch).encode()
+        
+    def _dispatch(self, command):
+        """Prepare a command line, recording the time taken under its command name"""
+        started = time.perf_counter()
+        resolution, stages = self._prepare(command)
+        self.failed = isinstance(resolution, CommandError)
+        name = "other" if isinstance(resolution, str) else " ".join(resolution.command.path)
+        COMMAND_DISPATCH.observe(time.perf_counter() - started, name)
+        return resolution, stages, name
+        
+    def _prepare(self, command, trie=None):
+        """Resolve a command line and compile its pipe stages"""
+        if "|" in command:
+            command, stage_texts = split_pipes(command)
+            if stage_texts[-1] == "?":
+                return stage_completions(), ()
+            try:
+                stages = compile_stages(stage_texts)
+            except PipeError as e:
+                return CommandError(f"{e}\r\n"), ()
+        else:
+            stages = ()
+        return self.resolve(command, trie), stages
+        
+    def _output(self, resolution, stages):
+        """Pick the output source for a resolved command and its pipe stages"""
+        if isinstance(resolution, str):
+            return resolution
+        entry, args = resolution.command, resolution.args
+        compare = compare_target(stages)
+        if compare is not None:
+            return self.compare_configuration(entry, args, compare)
+        display = display_format(stages)
+        if display:
+            if entry.data is not None:
+                elements = entry.data(self, *args)
+            else:
+                # No structured form: Junos wraps the text in <output>
+                elements = (("output", self._text(entry.handler(self, *args))),)
+            return iter_json(elements) if display == "json" else iter_rpc_reply_xml(elements)
+        if stages and entry.stream is not None:
+            return entry.stream(self, *args)
+        return entry.handler(self, *args)
+        
+    @staticmethod
+    def _text(output):
+        return output if isinstance(output, str) else "".join(output)
+        
+    def _cached_output(self, resolution):
+        entry = resolution.command
+        state = self.state
+        if entry.cache == CACHE_TEMPLATE:
+            key = (CACHE_TEMPLATE, state.template.key, entry.path, resolution.args)
+        elif entry.cache == CACHE_TICK:
+            key = (state.key, state.version, simulation_clock().ticks, entry.path,
+                   resolution.args)
         else:
-            return f"Unknown command: {command}\r\nType 'help' for available commands.\r\n"
+            key = (state.key, state.version, state.config.version, entry.path, resolution.args)
+        return OUTPUT_CACHE.get_or_render(
+            key, lambda: self._text(entry.handler(self, *resolution.args)).encode())
+        
+    def process_command(self, command):
+        """Process CLI commands and return output"""
+        return "".join(self.iter_command(command))
+        
+    def process_command_bytes(self, command):
+        """Process a CLI command and return encoded output"""
+        return b"".join(self.iter_command_bytes(command))
             
     def help_command(self):
-        return "\r\nAvailable commands:\r\n" + \
-               "  help                     - Show this help message\r\n" + \
-               "  show version             - Display device version information\r\n" + \
-               "  show interfaces          - Display interface status\r\n" + \
-               "  show interface <if>      - Display detailed interface information\r\n" + \
-               "  show configuration       - Display complete configuration\r\n" + \
-               "  show configuration <sec> - Display configuration section (system, interfaces)\r\n" + \
-               "  show system [uptime]     - Display system uptime\r\n" + \
-               "  show system information  - Display hardware inventory\r\n" + \
-               "  show system processes    - Display system processes\r\n" + \
-               "  show system storage      - Display storage information\r\n" + \
-               "  exit/quit               - Exit the session\r\n\r\n"
+        return self.trie.help_text()
+
+    def show_interface_or_detail(self, interface=None):
+        if interface:
+            return self.show_interface_detail(interface)
+        return self.show_interfaces()
+
+    def show_configuration_path(self, section=None):
+        if section:
+            return self.show_configuration_section(section)
+        return self.show_configuration()
+
+    def show_interfaces_data(self, interface=None):
+        if interface:
+            info = self.interface_status.get(interface)
+            if info is None:
+                return (("output", f"Error: Interface {interface} not found"),)
+            return (("interface-information", (("physical-interface", info.elements()),)),)
+        return (("interface-information", self.interface_status.iter_elements()),)
+
+    def show_interfaces_terse_data(self):
+        return (("interface-information", self.interface_status.iter_elements(terse=True)),)
+
+    def show_version_data(self):
+        profile = self.state.template.profile
+        return (("software-information", (
+            ("host-name", self.hostname),
+            ("product-model", profile.product),
+            ("product-name", profile.product),
+            ("junos-version", profile.release),
+            ("serial-number", profile.serial),
+        )),)
+
+    def show_system_uptime_data(self):
+        clock = simulation_clock()
+        configured, user = self._last_configured()
+        return (("system-uptime-information", (
+            ("current-time", (("date-time", format_time(clock.now)),)),
+            ("time-source", "LOCAL CLOCK"),
+            ("system-booted-time", (("date-time", format_time(clock.booted)),)),
+            ("protocols-started-time", (("date-time",
+                                         format_time(clock.booted + PROTOCOLS_DELAY)),)),
+            ("last-configured-time", (("date-time", configured), ("user", user))),
+            ("uptime-information", (
+                ("up-time", int(clock.now - clock.booted)),
+                ("load-average-1", f"{clock.load[0]:.2f}"),
+                ("load-average-5", f"{clock.load[1]:.2f}"),
+                ("load-average-15", f"{clock.load[2]:.2f}"),
+            )),
+        )),)
+
+    def _last_configured(self):
+        """Time and user of the last commit, from the configuration header"""
+        when, _, user = (self.state.config.last_commit or "").partition(" by ")
+        return when, user
+
+    def show_configuration_lines(self, section=None):
+        config = self.state.config
+        node = config.lookup(section.split()) if section else config
+        if node is None:
+            yield self.show_configuration_section(section)
+            return
+        yield config.header()
+        yield from node.iter_lines()
+        yield "\r\n"
+
+    def show_configuration_data(self, section=None):
+        config = self.state.config
+        if not section:
+            return config.iter_elements()
+        path = config.lookup_path(section.split())
+        if path is None:
+            return (("output", self.show_configuration_section(section).strip()),)
+        return config.iter_path_elements(path)
+
+    def exit_command(self):
+        self.running = False
+        return "Goodbye!\r\n"
+
+    def set_cli_screen_length(self, length):
+        if not length.isdigit() or int(length) > MAX_SCREEN_LENGTH:
+            return f"error: invalid screen length: {length} (0 to {MAX_SCREEN_LENGTH})\r\n"
+        self.screen_length = int(length)
+        return f"Screen length set to {self.screen_length}\r\n"
+
+    # Configuration mode
+
+    def configure(self, mode=None):
+        if mode not in (None, "private", "exclusive"):
+            return f"Unknown configure option: {mode}\r\n"
+        # Every session edits a private candidate over the shared active tree
+        self.candidate = Candidate(self.state)
+        return "Entering configuration mode\r\n"
+
+    def exit_configuration(self):
+        warning = ""
+        if self.candidate.modified:
+            warning = "warning: uncommitted changes will be discarded on exit\r\n"
+        self.candidate = None
+        return f"{warning}Exiting configuration mode\r\n"
+
+    def config_set(self, statement):
+        try:
+            self.candidate.set(split_statement(statement))
+        except ConfigEditError as e:
+            return f"error: {e}\r\n"
+        return ""
+
+    def config_delete(self, statement):
+        try:
+            self.candidate.delete(split_statement(statement))
+        except ConfigEditError as e:
+            return f"warning: {e}\r\n"
+        return ""
+
+    def config_show(self, statement=None):
+        root = self.candidate.root
+        if not statement:
+            return root.header() + root.render()
+        node = root.lookup(split_statement(statement))
+        if node is None:
+            return ""
+        return (node.render() if node.is_leaf else node.render_children())
+
+    def config_commit(self):
+        try:
+            self.candidate.commit()
+        except ConfigEditError as e:
+            return f"error: {e}\r\nerror: configuration check-out failed\r\n"
+        return "commit complete\r\n"
+
+    def config_commit_check(self):
+        return "configuration check succeeds\r\n"
+
+    def config_commit_and_quit(self):
+        output = self.config_commit()
+        if "error:" in output:
+            return output
+        self.candidate = None
+        return output + "Exiting configuration mode\r\n"
+
+    def config_rollback(self, number=None):
+        if number is not None and not number.isdigit():
+            return f"error: invalid rollback number: {number}\r\n"
+        try:
+            self.candidate.rollback(int(number or 0))
+        except ConfigEditError as e:
+            return f"error: {e}\r\n"
+        return "load complete\r\n"
+
+    def run_command(self, command):
+        """Run an operational-mode command from configuration mode"""
+        resolution, stages = self._prepare(command, COMMAND_TRIE)
+        # The `run` line itself already started the output
+        return self._iter_output(resolution, stages)
+
+    def compare_configuration(self, entry, args, number):
+        """`show | compare [rollback n]`: differences from the active or an older configuration"""
+        if entry.path not in (("show",), ("show", "configuration")):
+            return "error: compare is only available for configuration output\r\n"
+        try:
+            if self.candidate is not None:
+                # Against the active configuration, as commit would apply it
+                self.candidate.rebase()
+                current = self.candidate.root
+            else:
+                current = self.state.config
+            other = Candidate(self.state).rollback_tree(number) if number else self.state.config
+        except ConfigEditError as e:
+            return f"error: {e}\r\n"
+        changes = diff_trees(other, current)
+        if args and args[0]:
+            words = split_statement(args[0])
+            path = current.lookup_path(words) or other.lookup_path(words)
+            if not path:
+                return ""
+            # Changes inside the section, or to the statement holding it
+            prefix = tuple(node.name for node in path)
+            changes = [(names, old, new) for names, old, new in changes
+                       if _overlaps(names + ((old or new).name,), prefix)]
+        return render_diff(changes)
+
+    def show_system_commit(self):
+        history = self.state.history
+        commits = list(history.commits) if history is not None else []
+        lines = [f"{number:<4}{commit.time} by {commit.user} via cli\r\n"
+                 for number, commit in enumerate(commits)]
+        oldest = commits[-1].previous if commits else self.state.config.last_commit
+        if oldest:
+            lines.append(f"{len(commits):<4}{oldest} via cli\r\n")
+        return "".join(lines) + "\r\n"
 
     def show_version(self):
-        return "\r\nDevice Information:\r\n" + \
-               "  Model: MX480 Juniper Networks Router\r\n" + \
-               "  JUNOS Software Release: 22.4R1.10\r\n" + \
-               "  Build Date: November 9, 2025\r\n" + \
-               "  Serial Number: JN139E123456\r\n" + \
-               "  Uptime: 15 days, 3 hours, 42 minutes, 18 seconds\r\n" + \
-               "  Boot time: 2025-10-25 07:18:00 UTC\r\n\r\n"
+        profile = self.state.template.profile
+        clock = simulation_clock()
+        minutes, seconds = divmod(int(clock.now - clock.booted), 60)
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        return "Device Information:\r\n" + \
+               f"  Model: {profile.model} {profile.description}\r\n" + \
+               f"  JUNOS Software Release: {profile.release}\r\n" + \
+               f"  Build Date: {profile.build_date}\r\n" + \
+               f"  Serial Number: {profile.serial}\r\n" + \
+               f"  Uptime: {days} days, {hours} hours, {minutes} minutes, {seconds} seconds\r\n" + \
+               f"  Boot time: {format_time(clock.booted)}\r\n\r\n"
 
     def show_interfaces(self):
-        output = "\r\nInterface Status:\r\n"
-        output += "-" * 50 + "\r\n"
-        output += f"{'Interface':<15} {'Status':<8} {'Description':<25}\r\n"
-        output += "-" * 50 + "\r\n"
-        
-        for interface, status in self.interface_status.items():
-            desc = "Loopback Interface" if "lo" in interface else "Gigabit Ethernet"
-            output += f"{interface:<15} {status:<8} {desc:<25}\r\n"
-        
-        output += "\r\n"
-        return output
+        yield "Interface Status:\r\n"
+        yield "-" * 50 + "\r\n"
+        yield f"{'Interface':<15} {'Status':<8} {'Description':<25}\r\n"
+        yield "-" * 50 + "\r\n"
+        yield from self.interface_status.iter_status_lines()
+        yield "\r\n"
+
+    def show_interfaces_terse(self):
+        yield f"{'Interface':<23} {'Admin':<5} {'Link':<4}\r\n"
+        yield from self.interface_status.iter_terse_lines()
+        yield "\r\n"
         
     def show_interface_detail(self, interface):
-        if interface not in self.interface_status:
+        info = self.interface_status.get(interface)
+        if info is None:
             return f"Error: Interface {interface} not found\r\n"
+        in_bytes, out_bytes, in_packets, out_packets = info.table.traffic(info.row)
             
-        status = self.interface_status[interface]
-        return f"\r\nPhysical interface: {interface}\r\n" + \
-               f"  Interface type: Gigabit Ethernet\r\n" + \
-               f"  Administrative status: Enabled\r\n" + \
-               f"  Operational status: {status.capitalize()}\r\n" + \
+        return f"Physical interface: {interface}\r\n" + \
+               f"  Interface type: {info.description}\r\n" + \
+               f"  Administrative status: {'Enabled' if info.admin_up else 'Disabled'}\r\n" + \
+               f"  Operational status: {info.oper_status.capitalize()}\r\n" + \
                f"  Link-level type: Ethernet\r\n" + \
-               f"  MTU: 1514, MRU: 1522\r\n" + \
-               f"  Speed: 1000Mbps\r\n" + \
+               f"  MTU: {info.mtu}, MRU: {info.mtu + 8}\r\n" + \
+               f"  Speed: {info.speed}Mbps\r\n" + \
                f"  Duplex: Full-duplex\r\n" + \
-               f"  Hardware address: 00:1f:12:34:56:78\r\n" + \
-               f"  Last flapped: Never\r\n" + \
-               f"  Statistics last cleared: Never\r\n\r\n"
+               f"  Hardware address: {info.mac}\r\n" + \
+               f"  Last flapped: {info.last_flapped}\r\n" + \
+               f"  Statistics last cleared: Never\r\n" + \
+               f"  Traffic statistics:\r\n" + \
+               f"   Input  bytes  : {in_bytes:>20}\r\n" + \
+               f"   Output bytes  : {out_bytes:>20}\r\n" + \
+               f"   Input  packets: {in_packets:>20}\r\n" + \
+               f"   Output packets: {out_packets:>20}\r\n\r\n"
 
     def show_system_uptime(self):
-        return "\r\nCurrent time: 2025-11-09 14:30:42 UTC\r\n" + \
+        clock = simulation_clock()
+        now = clock.now
+        protocols = clock.booted + PROTOCOLS_DELAY
+        configured, user = self._last_configured()
+        if configured:
+            try:
+                age = now - calendar.timegm(time.strptime(configured, "%Y-%m-%d %H:%M:%S UTC"))
+                configured += f" ({format_ago(max(0, age))} ago)"
+            except ValueError:
+                pass
+            configured = f"Last configured: {configured} by {user}\r\n"
+        load = ", ".join(f"{value:.2f}" for value in clock.load)
+        clock_time = time.strftime("%I:%M%p", time.gmtime(now)).lstrip("0").rjust(7)
+        return f"Current time: {format_time(now)}\r\n" + \
                "Time Source:  LOCAL CLOCK \r\n" + \
-               "System booted: 2025-10-25 07:18:00 UTC (2w1d 07:12 ago)\r\n" + \
-               "Protocols started: 2025-10-25 07:19:32 UTC (2w1d 07:11 ago)\r\n" + \
-               "Last configured: 2025-11-08 14:25:33 UTC (1d 00:05 ago) by admin\r\n" + \
-               " 2:30PM  up 15 days,  7:12, 1 user, load averages: 0.23, 0.18, 0.15\r\n\r\n"
+               f"System booted: {format_time(clock.booted)} " \
+               f"({format_ago(now - clock.booted)} ago)\r\n" + \
+               f"Protocols started: {format_time(protocols)} " \
+               f"({format_ago(now - protocols)} ago)\r\n" + \
+               configured + \
+               f"{clock_time}  {format_uptime(now - clock.booted)}, 1 user, " \
+               f"load averages: {load}\r\n\r\n"
+
+    def _profile_output(self, command):
+        output = self.state.template.profile.output(command)
+        if output is None:
+            return f"error: '{command}' is not supported on this platform\r\n"
+        return output + "\r\n"
 
     def show_system_information(self):
-        return "\r\nHardware inventory:\r\n" + \
-               "Item             Version  Part number  Serial number     Description\r\n" + \
-               "Chassis                                JN139E123456      MX480\r\n" + \
-               "Midplane         REV 05   750-031001   ABCD123456        MX480 Backplane\r\n" + \
-               "FPM Board        REV 04   750-031002   EFGH789012        Front Panel Display\r\n" + \
-               "Routing Engine 0 REV 03   750-031003   MNOP345678        RE-S-1800x4\r\n" + \
-               "CB 0             REV 01   750-031004   QRST901234        Enhanced MX SCB\r\n" + \
-               "CB 1             REV 01   750-031004   UVWX567890        Enhanced MX SCB\r\n" + \
-               "MIC 0/0/0        REV 02   750-031005   ABCD111111        4x 10GE XFP\r\n" + \
-               "MIC 0/1/0        REV 01   750-031006   EFGH222222        20x 1GE RJ45\r\n" + \
-               "Fan Tray         REV 01   740-021822   MNOP333333        Enhanced Fan Tray\r\n" + \
-               "PEM 0            REV 03   740-021823   QRST444444        2500W AC Power Entry Module\r\n" + \
-               "PEM 1            REV 03   740-021823   UVWX555555        2500W AC Power Entry Module\r\n\r\n"
+        return self._profile_output("show system information")
 
     def show_system_processes(self):
-        return "\r\nlast pid: 15234;  load averages:  0.23,  0.18,  0.15    up 15+07:12:18  14:30:42\r\n" + \
-               "80 processes:  2 running, 75 sleeping, 3 waiting\r\n" + \
-               "CPU states: 12.5% user,  0.0% nice,  4.2% system,  2.1% interrupt, 81.2% idle\r\n" + \
-               "Mem: 148M Active, 89M Inact, 892M Wired, 52M Cache, 199M Buf, 2820M Free\r\n\r\n" + \
-               "  PID USERNAME    THR PRI NICE   SIZE    RES STATE   C   TIME    WCPU COMMAND\r\n" + \
-               " 1234 root          1  20    0   148M  28984K select  0  12:45  0.00% chassisd\r\n" + \
-               " 1345 root          1  20    0    89M  15672K select  0   8:23  0.00% dcd\r\n" + \
-               " 1456 root          1  20    0   234M  45328K select  0  45:12  0.00% rpd\r\n" + \
-               " 1567 root          1  20    0    67M  12456K select  0   2:34  0.00% mgd\r\n" + \
-               " 1678 root          1  20    0    45M   8923K select  0   1:23  0.00% alarmd\r\n\r\n"
+        return self._profile_output("show system processes")
 
     def show_system_storage(self):
-        return "\r\nFilesystem           1K-blocks      Used Available Capacity  Mounted on\r\n" + \
-               "/dev/da0s1a             495703    174567    281486    38%    /\r\n" + \
-               "devfs                        1         1         0   100%    /dev\r\n" + \
-               "/dev/da0s1e             495703    123456    332597    27%    /config\r\n" + \
-               "/dev/da0s1f            3952588   1234567   2401765    34%    /var\r\n" + \
-               "/dev/da0s1d             495703     89012    367041    20%    /var/tmp\r\n" + \
-               "procfs                       8         8         0   100%    /proc\r\n\r\n"
+        return self._profile_output("show system storage")
 
     def show_configuration(self):
-        return "\r\n## Last commit: 2025-11-08 14:25:33 UTC by admin\r\n" + \
-               "version 22.4R1.10;\r\n" + \
-               "system {\r\n" + \
-               "    host-name JUNOS-MX;\r\n" + \
-               "    domain-name lab.local;\r\n" + \
-               "    time-zone UTC;\r\n" + \
-               "    authentication-order [ radius password ];\r\n" + \
-               "    root-authentication {\r\n" + \
-               "        encrypted-password \"$6$ABC123...\";\r\n" + \
-               "    }\r\n" + \
-               "    name-server {\r\n" + \
-               "        8.8.8.8;\r\n" + \
-               "        8.8.4.4;\r\n" + \
-               "    }\r\n" + \
-               "    login {\r\n" + \
-               "        user admin {\r\n" + \
-               "            uid 2000;\r\n" + \
-               "            class super-user;\r\n" + \
-               "            authentication {\r\n" + \
-               "                encrypted-password \"$6$DEF456...\";\r\n" + \
-               "            }\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "    services {\r\n" + \
-               "        ssh {\r\n" + \
-               "            root-login allow;\r\n" + \
-               "            protocol-version v2;\r\n" + \
-               "        }\r\n" + \
-               "        netconf {\r\n" + \
-               "            ssh;\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "    syslog {\r\n" + \
-               "        user * {\r\n" + \
-               "            any emergency;\r\n" + \
-               "        }\r\n" + \
-               "        file messages {\r\n" + \
-               "            any notice;\r\n" + \
-               "            authorization info;\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "    ntp {\r\n" + \
-               "        server 0.pool.ntp.org;\r\n" + \
-               "        server 1.pool.ntp.org;\r\n" + \
-               "    }\r\n" + \
-               "}\r\n" + \
-               "interfaces {\r\n" + \
-               "    ge-0/0/0 {\r\n" + \
-               "        description \"WAN Interface\";\r\n" + \
-               "        unit 0 {\r\n" + \
-               "            family inet {\r\n" + \
-               "                address 192.168.1.1/24;\r\n" + \
-               "            }\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "    ge-0/0/1 {\r\n" + \
-               "        description \"LAN Interface\";\r\n" + \
-               "        disable;\r\n" + \
-               "    }\r\n" + \
-               "    ge-0/0/2 {\r\n" + \
-               "        description \"DMZ Interface\";\r\n" + \
-               "        unit 0 {\r\n" + \
-               "            family inet {\r\n" + \
-               "                address 10.0.1.1/24;\r\n" + \
-               "            }\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "    lo0 {\r\n" + \
-               "        unit 0 {\r\n" + \
-               "            family inet {\r\n" + \
-               "                address 127.0.0.1/32;\r\n" + \
-               "            }\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "}\r\n" + \
-               "routing-options {\r\n" + \
-               "    static {\r\n" + \
-               "        route 0.0.0.0/0 next-hop 192.168.1.254;\r\n" + \
-               "    }\r\n" + \
-               "}\r\n" + \
-               "protocols {\r\n" + \
-               "    ospf {\r\n" + \
-               "        area 0.0.0.0 {\r\n" + \
-               "            interface ge-0/0/2.0;\r\n" + \
-               "        }\r\n" + \
-               "    }\r\n" + \
-               "}\r\n\r\n"
+        config = self.state.config
+        return config.header() + config.render() + "\r\n"
 
     def show_configuration_section(self, section):
-        if section == "system":
-            return "\r\n## Last commit: 2025-11-08 14:25:33 UTC by admin\r\n" + \
-                   "system {\r\n" + \
-                   "    host-name JUNOS-MX;\r\n" + \
-                   "    domain-name lab.local;\r\n" + \
-                   "    time-zone UTC;\r\n" + \
-                   "    authentication-order [ radius password ];\r\n" + \
-                   "    root-authentication {\r\n" + \
-                   "        encrypted-password \"$6$ABC123...\";\r\n" + \
-                   "    }\r\n" + \
-                   "    name-server {\r\n" + \
-                   "        8.8.8.8;\r\n" + \
-                   "        8.8.4.4;\r\n" + \
-                   "    }\r\n" + \
-                   "    login {\r\n" + \
-                   "        user admin {\r\n" + \
-                   "            uid 2000;\r\n" + \
-                   "            class super-user;\r\n" + \
-                   "            authentication {\r\n" + \
-                   "                encrypted-password \"$6$DEF456...\";\r\n" + \
-                   "            }\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "    services {\r\n" + \
-                   "        ssh {\r\n" + \
-                   "            root-login allow;\r\n" + \
-                   "            protocol-version v2;\r\n" + \
-                   "        }\r\n" + \
-                   "        netconf {\r\n" + \
-                   "            ssh;\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "    syslog {\r\n" + \
-                   "        user * {\r\n" + \
-                   "            any emergency;\r\n" + \
-                   "        }\r\n" + \
-                   "        file messages {\r\n" + \
-                   "            any notice;\r\n" + \
-                   "            authorization info;\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "    ntp {\r\n" + \
-                   "        server 0.pool.ntp.org;\r\n" + \
-                   "        server 1.pool.ntp.org;\r\n" + \
-                   "    }\r\n" + \
-                   "}\r\n\r\n"
-        elif section == "interfaces":
-            return "\r\n## Last commit: 2025-11-08 14:25:33 UTC by admin\r\n" + \
-                   "interfaces {\r\n" + \
-                   "    ge-0/0/0 {\r\n" + \
-                   "        description \"WAN Interface\";\r\n" + \
-                   "        unit 0 {\r\n" + \
-                   "            family inet {\r\n" + \
-                   "                address 192.168.1.1/24;\r\n" + \
-                   "            }\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "    ge-0/0/1 {\r\n" + \
-                   "        description \"LAN Interface\";\r\n" + \
-                   "        disable;\r\n" + \
-                   "    }\r\n" + \
-                   "    ge-0/0/2 {\r\n" + \
-                   "        description \"DMZ Interface\";\r\n" + \
-                   "        unit 0 {\r\n" + \
-                   "            family inet {\r\n" + \
-                   "                address 10.0.1.1/24;\r\n" + \
-                   "            }\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "    lo0 {\r\n" + \
-                   "        unit 0 {\r\n" + \
-                   "            family inet {\r\n" + \
-                   "                address 127.0.0.1/32;\r\n" + \
-                   "            }\r\n" + \
-                   "        }\r\n" + \
-                   "    }\r\n" + \
-                   "}\r\n\r\n"
-        else:
-            return f"\r\nConfiguration section '{section}' not found or not implemented.\r\n" + \
-                   "Available sections: system, interfaces\r\n\r\n"
\ No newline at end of file
+        config = self.state.config
+        node = config.lookup(section.split())
+        if node is None:
+            return f"Configuration section '{section}' not found or not implemented.\r\n" + \
+                   f"Available sections: {', '.join(config.sections())}\r\n\r\n"
+        return config.header() + node.render() + "\r\n"
+
+COMMANDS = (
+    Command("help", "Show this help message", DeviceCLI.help_command),
+    Command("show version", "Display device version information", DeviceCLI.show_version,
+            cache=CACHE_TICK, data=DeviceCLI.show_version_data),
+    Command("show interfaces", "Display interface status", DeviceCLI.show_interface_or_detail,
+            arg="if", arg_help="Display detailed interface information",
+            data=DeviceCLI.show_interfaces_data),
+    Command("show interfaces terse", "Display interface status in brief",
+            DeviceCLI.show_interfaces_terse, data=DeviceCLI.show_interfaces_terse_data),
+    Command("show interface", "Display detailed interface information",
+            DeviceCLI.show_interface_detail, arg="if", arg_required=True, hidden=True,
+            missing_arg="Error: Interface name required\r\n", cache=CACHE_TICK,
+            data=DeviceCLI.show_interfaces_data),
+    Command("show configuration", "Display configuration, or one section (system, interfaces)",
+            DeviceCLI.show_configuration_path, arg="sec", rest=True,
+            arg_help="Configuration section to display", cache=CACHE_DEVICE,
+            stream=DeviceCLI.show_configuration_lines, data=DeviceCLI.show_configuration_data),
+    Command("show system", "Display system uptime", DeviceCLI.show_system_uptime,
+            usage="show system [uptime]", data=DeviceCLI.show_system_uptime_data),
+    Command("show system uptime", "Display system uptime", DeviceCLI.show_system_uptime, usage="",
+            data=DeviceCLI.show_system_uptime_data),
+    Command("show system information", "Display hardware inventory",
+            DeviceCLI.show_system_information, cache=CACHE_TEMPLATE),
+    Command("show system processes", "Display system processes", DeviceCLI.show_system_processes,
+            cache=CACHE_TEMPLATE),
+    Command("show system storage", "Display storage information", DeviceCLI.show_system_storage,
+            cache=CACHE_TEMPLATE),
+    Command("show system commit", "Display pending commits and commit history",
+            DeviceCLI.show_system_commit),
+    Command("set cli screen-length", "Set number of lines on screen (0 disables paging)",
+            DeviceCLI.set_cli_screen_length, arg="length", arg_required=True,
+            missing_arg="error: missing screen length\r\n"),
+    Command("configure", "Manipulate software configuration information", DeviceCLI.configure,
+            arg="mode", arg_help="private or exclusive (every session has a private candidate)"),
+    Command("exit", "Exit the session", DeviceCLI.exit_command, usage="exit/quit"),
+    Command("quit", "Exit the session", DeviceCLI.exit_command, hidden=True, usage=""),
+)
+
+COMMAND_TRIE = CommandTrie(COMMANDS, descriptions={
+    ("show",): "Show information about the device",
+    ("set",): "Set CLI properties",
+    ("set", "cli"): "Set CLI properties",
+})
+
+CONFIGURE_COMMANDS = (
+    Command("help", "Show this help message", DeviceCLI.help_command),
+    Command("set", "Set a parameter", DeviceCLI.config_set, arg="statement", arg_required=True,
+            rest=True, missing_arg="error: missing statement\r\n"),
+    Command("delete", "Delete a data element", DeviceCLI.config_delete, arg="statement",
+            arg_required=True, rest=True, missing_arg="error: missing statement\r\n"),
+    Command("show", "Show the candidate configuration (| compare for changes)",
+            DeviceCLI.config_show, arg="statement", rest=True),
+    Command("commit", "Commit current set of changes", DeviceCLI.config_commit),
+    Command("commit check", "Check correctness of syntax; do not apply changes",
+            DeviceCLI.config_commit_check),
+    Command("commit and-quit", "Quit configuration mode if commit succeeds",
+            DeviceCLI.config_commit_and_quit),
+    Command("rollback", "Roll back to previous committed configuration",
+            DeviceCLI.config_rollback, arg="number"),
+    Command("run", "Run an operational-mode command", DeviceCLI.run_command, arg="command",
+            arg_required=True, rest=True, missing_arg="error: missing command\r\n"),
+    Command("exit", "Exit configuration mode", DeviceCLI.exit_configuration, usage="exit/quit"),
+    Command("exit configuration-mode", "Exit configuration mode",
+            DeviceCLI.exit_configuration, usage=""),
+    Command("quit", "Exit configuration mode", DeviceCLI.exit_configuration, hidden=True,
+            usage=""),
+)
+
+CONFIGURE_TRIE = CommandTrie(CONFIGURE_COMMANDS)
@@ -0,0 +1,201 @@
+"""
+Command registry and token trie for the device CLI
+
+Commands are declared once as `Command` entries and compiled into a trie
+of keywords.  Each trie node also carries a table of every unambiguous
+abbreviation of its children, so resolving a command line costs one dict
+lookup per token regardless of how many commands are registered.
+"""
+
+
+CACHE_DEVICE = "device"
+CACHE_TEMPLATE = "template"
+CACHE_TICK = "tick"
+
+
+class Command:
+    """One CLI command: keyword path, help text and handler
+
+    `handler` is called as handler(cli) or, when the command takes an
+    argument, handler(cli, argument).  With `rest=True` all remaining tokens
+    are joined into the argument.  Hidden commands only match when typed in
+    full and are left out of completion listings; pass usage="" to leave a
+    command out of `help` as well.
+
+    `cache` says what the output depends on besides the argument:
+    CACHE_DEVICE output is reused until the device state changes,
+    CACHE_TICK output also only until the simulation clock ticks, and
+    CACHE_TEMPLATE output is shared by all devices built from one template.
+
+    `stream` is an optional handler with the same arguments that yields the
+    output line by line; it is used instead of `handler` when the output is
+    piped, so filters never wait for a fully rendered (or cached) text.
+    `data` yields the output as structured elements for `| display xml` and
+    `| display json`.
+    """
+
+    __slots__ = ('path', 'help', 'handler', 'arg', 'arg_required', 'rest',
+                 'arg_help', 'usage', 'hidden', 'missing_arg', 'cache',
+                 'stream', 'data')
+
+    def __init__(self, path, help, handler, arg=None, arg_required=False, rest=False,
+                 arg_help=None, usage=None, hidden=False, missing_arg=None, cache=None,
+                 stream=None, data=None):
+        self.path = tuple(path.split())
+        self.help = help
+        self.handler = handler
+        self.arg = arg
+        self.arg_required = arg_required
+        self.rest = rest
+        self.arg_help = arg_help or help
+        self.usage = self._default_usage() if usage is None else usage
+        self.hidden = hidden
+        self.missing_arg = missing_arg or f"Error: {arg} required\r\n"
+        self.cache = cache
+        self.stream = stream
+        self.data = data
+
+    def _default_usage(self):
+        usage = " ".join(self.path)
+        if self.arg:
+            usage += f" <{self.arg}>" if self.arg_required else f" [<{self.arg}>]"
+        return usage
+
+
+class TrieNode:
+    __slots__ = ('keyword', 'help', 'children', 'abbreviations', 'command')
+
+    def __init__(self, keyword=None):
+        self.keyword = keyword
+        self.help = None
+        self.children = {}
+        # prefix -> child keyword, or a tuple of candidates when ambiguous
+        self.abbreviations = {}
+        self.command = None
+
+    def lookup(self, token):
+        """Return the child keyword for an exact or abbreviated token"""
+        if token in self.children:
+            return token
+        return self.abbreviations.get(token)
+
+    def completions(self):
+        return sorted((keyword, child) for keyword, child in self.children.items()
+                      if not (child.command and child.command.hidden))
+
+
+class CommandError(str):
+    """Error text for a command line that could not be resolved or piped
+
+    A str, so it is shown like any other literal output; callers that need
+    to know whether the command failed test for this type.
+    """
+
+
+class Resolution:
+    """Outcome of resolving a command line against the trie"""
+
+    __slots__ = ('command', 'args', 'node', 'error')
+
+    def __init__(self, command=None, args=(), node=None, error=None):
+        self.command = command
+        self.args = args
+        self.node = node
+        self.error = error
+
+
+class CommandTrie:
+    """Keyword trie compiled from a sequence of `Command` entries"""
+
+    def __init__(self, commands, descriptions=None):
+        self.commands = tuple(commands)
+        self.root = TrieNode()
+        descriptions = descriptions or {}
+        for command in self.commands:
+            node = self.root
+            for depth, keyword in enumerate(command.path):
+                child = node.children.get(keyword)
+                if child is None:
+                    child = node.children[keyword] = TrieNode(keyword)
+                    child.help = descriptions.get(command.path[:depth + 1])
+                node = child
+            if node.command is not None:
+                raise ValueError(f"duplicate command: {' '.join(command.path)}")
+            node.command = command
+            node.help = command.help
+        self._compile(self.root)
+
+    def _compile(self, node):
+        candidates = {}
+        for keyword, child in node.children.items():
+            if child.command is None or not child.command.hidden:
+                for end in range(1, len(keyword)):
+                    candidates.setdefault(keyword[:end], []).append(keyword)
+            self._compile(child)
+        node.abbreviations = {
+            prefix: keywords[0] if len(keywords) == 1 else tuple(sorted(keywords))
+            for prefix, keywords in candidates.items()
+        }
+
+    def resolve(self, tokens):
+        """Walk the trie for a tokenized command line"""
+        node = self.root
+        for i, token in enumerate(tokens):
+            keyword = node.lookup(token)
+            if isinstance(keyword, tuple):
+                return Resolution(node=node, error=(
+                    f"Ambiguous command: {token}\r\n"
+                    f"Possible completions: {', '.join(keyword)}\r\n"))
+            if keyword is None:
+                command = node.command
+                if command is not None and command.arg:
+                    args = tokens[i:] if command.rest else tokens[i:i + 1]
+                    if command.rest or len(tokens) == i + 1:
+                        return Resolution(command, (" ".join(args),), node)
+                if command is not None and node.children:
+                    return Resolution(node=node, error=(
+                        f"Unknown {node.keyword} subcommand: {token}\r\n"
+                        f"Available: {', '.join(k for k, _ in node.completions())}\r\n"))
+                return Resolution(node=node, error=(
+                    f"Unknown command: {' '.join(tokens)}\r\n"
+                    "Type 'help' for available commands.\r\n"))
+            node = node.children[keyword]
+
+        command = node.command
+        if command is None:
+            return Resolution(node=node, error=(
+                f"Incomplete command: {' '.join(tokens)}\r\n"
+                f"Possible completions: {', '.join(k for k, _ in node.completions())}\r\n"))
+        if command.arg and command.arg_required:
+            return Resolution(node=node, error=command.missing_arg)
+        return Resolution(command, (), node)
+
+    def completions(self, tokens, partial=""):
+        """Render the `?` listing for the words typed so far"""
+        node = self.root
+        for token in tokens:
+            keyword = node.lookup(token)
+            if keyword is None or isinstance(keyword, tuple):
+                return f"Unknown command: {' '.join(tokens)}\r\n"
+            node = node.children[keyword]
+
+        lines = ["Possible completions:"]
+        command = node.command
+        if command is not None and command.arg and not partial:
+            lines.append(f"  {'<' + command.arg + '>':<22} {command.arg_help}")
+        for keyword, child in node.completions():
+            if keyword.startswith(partial):
+                lines.append(f"  {keyword:<22} {child.help or ''}".rstrip())
+        if command is not None and not command.arg_required and not partial:
+            lines.append(f"  {'<[Enter]>':<22} Execute this command")
+        if len(lines) == 1:
+            return f"No completions for '{partial}'\r\n"
+        return "\r\n".join(lines) + "\r\n\r\n"
+
+    def help_text(self):
+        """Render the `help` listing from the registry"""
+        lines = ["Available commands:"]
+        for command in self.commands:
+            if command.usage:
+                lines.append(f"  {command.usage:<28} - {command.help}")
+        return "\r\n".join(lines) + "\r\n\r\n"
@@ -0,0 +1,351 @@
+"""
+Hierarchical Junos configuration
+
+The configuration is parsed from curly-brace text into a tree of
+`ConfigNode`s and all `show configuration` output is rendered from it.
+Each node memoizes its rendered text per indentation level; changing a node
+drops the memo of that node and its ancestors only, so unchanged subtrees
+are never rendered twice.  Nodes do not point to their parents: unchanged
+subtrees are shared by every configuration version that contains them, so
+ancestors are found by walking down from the top instead.
+"""
+
+import os
+import re
+
+
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "configs", "default.conf")
+
+INDENT = "    "
+
+# Whitespace between tokens is skipped by findall()
+_TOKEN = re.compile(r'''
+    /\*.*?\*/ | \#[^\n]*           # comments
+  | "(?:[^"\\]|\\.)*"               # quoted strings
+  | \[[^\]]*\]                      # [ value lists ]
+  | [{};]
+  | [^\s{};"\[]+                   # words
+''', re.S | re.X)
+
+_LAST_COMMIT = re.compile(r'##\s*Last commit:\s*(.*)')
+
+_XML_NAME = re.compile(r'[A-Za-z_][\w.-]*$')
+
+# Containers whose children are named entries rather than keywords
+ENTRY_TAGS = {
+    "interfaces": "interface",
+    "groups": "group",
+    "name-server": "name",
+    "policy-statement": "term",
+    "prefix-list": "prefix-list-item",
+}
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+
+def _chain_name(name, children):
+    yield ("name", _unquote(name))
+    yield from children
+
+
+class ConfigError(Exception):
+    """Raised when configuration text cannot be parsed"""
+
+
+class ConfigNode:
+    """A container (`name { ... }`) or leaf (`name;`) statement"""
+
+    __slots__ = ('name', 'children', '_rendered')
+
+    def __init__(self, name, children=None):
+        self.name = name
+        # None for leaf statements, name -> ConfigNode for containers
+        self.children = children
+        self._rendered = None
+
+    @property
+    def is_leaf(self):
+        return self.children is None
+
+    @property
+    def keyword(self):
+        return self.name.split(" ", 1)[0]
+
+    def child(self, name):
+        return self.children.get(name) if self.children else None
+
+    def add(self, node):
+        """Add (or merge into) a child statement and return the stored node
+
+        Memoized renderings above this node are dropped by calling
+        `changed()` on the top of the tree with the path to it.
+        """
+        existing = self.children.get(node.name)
+        if existing is not None:
+            if node.children and existing.children is not None:
+                for grandchild in list(node.children.values()):
+                    existing.add(grandchild)
+            return existing
+        self.children[node.name] = node
+        self._rendered = None
+        return node
+
+    def remove(self, name):
+        node = self.children.pop(name)
+        self._rendered = None
+        return node
+
+    def copy(self):
+        """Shallow copy sharing the children, for copy-on-write editing"""
+        return ConfigNode(self.name, None if self.children is None else dict(self.children))
+
+    def changed(self, path=()):
+        """Drop memoized renderings of this node and of the edited path below it
+
+        path holds the nodes from below this one down to the edited node, as
+        returned by `lookup_path`.
+        """
+        self._rendered = None
+        for node in path:
+            node._rendered = None
+
+    def render(self, depth=0):
+        """Return this statement as configuration text at the given depth"""
+        rendered = self._rendered
+        if rendered is None:
+            rendered = self._rendered = {}
+        text = rendered.get(depth)
+        if text is None:
+            pad = INDENT * depth
+            if self.children is None:
+                text = f"{pad}{self.name};\r\n"
+            else:
+                text = f"{pad}{self.name} {{\r\n{self.render_children(depth + 1)}{pad}}}\r\n"
+            rendered[depth] = text
+        return text
+
+    def render_children(self, depth=0):
+        return "".join(child.render(depth) for child in self.children.values())
+
+    def iter_lines(self, depth=0):
+        """Yield this statement line by line without building the whole text"""
+        pad = INDENT * depth
+        if self.children is None:
+            yield f"{pad}{self.name};\r\n"
+            return
+        yield f"{pad}{self.name} {{\r\n"
+        for child in self.children.values():
+            yield from child.iter_lines(depth + 1)
+        yield f"{pad}}}\r\n"
+
+    def iter_elements(self, parent_keyword=None, content=None):
+        """Yield this statement as structured (tag, content) elements
+
+        Follows the shape of Junos XML configuration closely enough for
+        tooling: `user admin { ... }` becomes <user><name>admin</name>...,
+        `host-name R1;` becomes <host-name>R1</host-name> and `disable;`
+        becomes <disable/>.  `content` replaces the elements of a
+        container's children.
+        """
+        entry_tag = ENTRY_TAGS.get(parent_keyword)
+        if entry_tag is not None or not _XML_NAME.match(self.keyword):
+            # A named entry of a list such as interfaces or name-server
+            if self.children is None:
+                yield ("name", _unquote(self.name))
+            else:
+                if content is None:
+                    content = self._child_elements()
+                yield (entry_tag or "name", _chain_name(self.name, content))
+            return
+        parts = self.name.split(" ", 1)
+        keyword = parts[0]
+        value = parts[1] if len(parts) > 1 else None
+        if self.children is not None:
+            if content is None:
+                content = self._child_elements(keyword)
+            yield (keyword, content if value is None else _chain_name(value, content))
+        elif value is None:
+            yield (keyword, None)
+        elif value.startswith("[") and value.endswith("]"):
+            for item in value[1:-1].split():
+                yield (keyword, _unquote(item))
+        else:
+            yield (keyword, _unquote(value))
+
+    def _child_elements(self, keyword=None):
+        keyword = keyword or self.keyword
+        for child in self.children.values():
+            yield from child.iter_elements(keyword)
+
+    def iter_path_elements(self, path):
+        """Yield the elements of the last node of path nested inside the others'
+
+        path holds the nodes from below this one, as returned by
+        `lookup_path`.  From the top of the tree this is the
+        `<configuration>` document filtered down to one node, as returned
+        for `show configuration system services | display xml`.
+        """
+        elements = None
+        for index in range(len(path) - 1, -1, -1):
+            parent_keyword = path[index - 1].keyword if index else None
+            elements = path[index].iter_elements(parent_keyword, elements)
+        return self.iter_elements(content=elements)
+
+    def lookup(self, tokens):
+        """Find the node addressed by a path of words, or None"""
+        path = self.lookup_path(tokens)
+        if path is None:
+            return None
+        return path[-1] if path else self
+
+    def lookup_path(self, tokens):
+        """The nodes from below this one down to the addressed node, or None"""
+        node = self
+        path = []
+        i = 0
+        while i < len(tokens):
+            if not node.children:
+                return None
+            found = None
+            # Statement names may span several words ("user admin")
+            for j in range(len(tokens), i, -1):
+                found = node.children.get(" ".join(tokens[i:j]))
+                if found is not None:
+                    i = j
+                    break
+            if found is None:
+                # Leaves can be addressed by their keyword ("host-name")
+                matches = [child for child in node.children.values()
+                           if child.is_leaf and child.keyword == tokens[i]]
+                if len(matches) != 1:
+                    return None
+                found = matches[0]
+                i += 1
+            node = found
+            path.append(node)
+        return path
+
+    def iter_nodes(self):
+        yield self
+        if self.children:
+            for child in self.children.values():
+                yield from child.iter_nodes()
+
+
+class ConfigRoot(ConfigNode):
+    """Top of a configuration tree, with commit metadata and a change version"""
+
+    __slots__ = ('last_commit', 'version')
+
+    def __init__(self, last_commit=None):
+        super().__init__(None, {})
+        self.last_commit = last_commit
+        self.version = 0
+
+    def copy(self):
+        root = ConfigRoot(self.last_commit)
+        root.children = dict(self.children)
+        root.version = self.version
+        return root
+
+    def changed(self, path=()):
+        super().changed(path)
+        self.version += 1
+
+    def header(self):
+        if self.last_commit:
+            return f"## Last commit: {self.last_commit}\r\n"
+        return ""
+
+    def render(self, depth=0):
+        rendered = self._rendered
+        if rendered is None:
+            rendered = self._rendered = {}
+        text = rendered.get(depth)
+        if text is None:
+            text = rendered[depth] = self.render_children(depth)
+        return text
+
+    def iter_lines(self, depth=0):
+        for child in self.children.values():
+            yield from child.iter_lines(depth)
+
+    def iter_elements(self, parent_keyword=None, content=None):
+        yield ("configuration", self._child_elements() if content is None else content)
+
+    def _child_elements(self, keyword=None):
+        for child in self.children.values():
+            yield from child.iter_elements(None)
+
+    def sections(self):
+        return [name for name, node in self.children.items() if not node.is_leaf]
+
+
+def parse_config(text):
+    """Parse Junos curly-brace configuration text into a ConfigRoot"""
+    root = ConfigRoot()
+    stack = [root]
+    words = []
+    for token in _TOKEN.findall(text):
+        first = token[0]
+        if first == '{':
+            if not words:
+                raise ConfigError("block without a name")
+            name = " ".join(words)
+            parent = stack[-1]
+            node = parent.children.get(name)
+            if node is None or node.children is None:
+                node = ConfigNode(name, {})
+                parent.children[name] = node
+            stack.append(node)
+            words = []
+        elif first == ';':
+            if words:
+                name = " ".join(words)
+                children = stack[-1].children
+                if name not in children:
+                    children[name] = ConfigNode(name)
+                words = []
+        elif first == '}':
+            if words or len(stack) == 1:
+                raise ConfigError(f"unexpected '}}' after {' '.join(words) or 'top level'}")
+            stack.pop()
+        elif first == '#' or token.startswith('/*'):
+            if root.last_commit is None and len(stack) == 1:
+                commit = _LAST_COMMIT.match(token)
+                if commit:
+                    root.last_commit = commit.group(1).strip()
+        elif first == '[':
+            words.append("[ " + " ".join(token[1:-1].split()) + " ]")
+        else:
+            words.append(token)
+    if words or len(stack) != 1:
+        raise ConfigError("unexpected end of configuration")
+    return root
+
+
+def load_config(path=DEFAULT_CONFIG_FILE):
+    with open(path) as f:
+        return parse_config(f.read())
+
+
+_default_config = None
+
+
+def default_config():
+    """The startup configuration, parsed once per process"""
+    global _default_config
+    if _default_config is None:
+        _default_config = load_config()
+    return _default_config
+
+
+def set_default_config(config):
+    """Use config as the startup configuration for devices created later"""
+    global _default_config
+    _default_config = config
@@ -0,0 +1,205 @@
+"""
+Control API for scripting device state
+
+`start_control_server()` serves a small JSON API over HTTP from a daemon
+thread, bound to loopback by default, that reads and changes the
+`DeviceState` objects the SSH sessions are working on.  Changes are
+applied to those shared objects, so every live session sees them with its
+next command and cached output is invalidated through the device
+versions, without restarting the process.
+
+    GET  /devices           {"version": N, "devices": ["dev0000", ...]}
+    GET  /devices/NAME      hostname, device version and interface statuses
+    POST /transaction       apply a batch of changes, all or nothing
+
+A transaction body lists changes; device and interface names may be
+fnmatch patterns, and `{device}` in a hostname is replaced by the device
+name:
+
+    {"if_version": 3,
+     "changes": [
+       {"devices": "dev00*", "interfaces": {"xe-0/0/*": "down"}},
+       {"devices": "*", "hostname": "lab-{device}"}
+     ]}
+
+Every change is checked before any is applied; an invalid transaction
+changes nothing and gets a 400 reply.  Transactions are serialized and
+each one that applies advances the store version; with `if_version`, a
+transaction is refused with 409 if another one was applied in between.
+A device gets one new version for all of its interface changes in a
+transaction, however many there are.  A hostname change is committed to
+the device's configuration (`set system host-name`) by user "control",
+as a commit from configuration mode would be, so it shows in `show
+configuration` and `show system commit` as well as in the prompt.
+"""
+
+import fnmatch
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+log = logging.getLogger(__name__)
+
+STATUSES = ("up", "down")
+
+# Author of the configuration commits that change hostnames
+CONTROL_USER = "control"
+
+# Largest accepted request body
+MAX_BODY = 16 * 2**20
+
+
+class TransactionError(Exception):
+    """Raised for a transaction that cannot be applied; nothing was changed"""
+
+
+class VersionConflict(TransactionError):
+    """Raised when a transaction's if_version is not the current version"""
+
+
+def _match(names, pattern):
+    """Names in a collection matching an fnmatch pattern; a plain name is looked up"""
+    if not any(char in pattern for char in "*?["):
+        return [pattern] if pattern in names else []
+    return fnmatch.filter(names, pattern)
+
+
+class DeviceStore:
+    """The device states of this process by name, changed in versioned transactions"""
+
+    def __init__(self, devices):
+        # name -> DeviceState; the same objects the sessions use
+        self.devices = devices
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def names(self):
+        return list(self.devices)
+
+    def describe(self, name):
+        """Hostname, version and interface statuses of one device, or None"""
+        state = self.devices.get(name)
+        if state is None:
+            return None
+        return {"name": name, "hostname": state.hostname, "version": state.version,
+                "interfaces": dict(state.interface_status.items())}
+
+    def _plan(self, changes):
+        """Resolve changes to {device name: (hostname, [(interface, status)])}"""
+        if not isinstance(changes, list):
+            raise TransactionError("changes must be a list")
+        plan = {}
+        for number, change in enumerate(changes, 1):
+            if not isinstance(change, dict):
+                raise TransactionError(f"change {number}: expected an object")
+            unknown = set(change) - {"devices", "hostname", "interfaces"}
+            if unknown:
+                raise TransactionError(f"change {number}: unknown field {sorted(unknown)[0]}")
+            pattern = change.get("devices", "*")
+            hostname = change.get("hostname")
+            interfaces = change.get("interfaces") or {}
+            if not isinstance(pattern, str):
+                raise TransactionError(f"change {number}: devices must be a name or pattern")
+            if hostname is not None and (not isinstance(hostname, str) or not hostname.strip()
+                                         or any(char.isspace() for char in hostname)):
+                raise TransactionError(f"change {number}: invalid hostname {hostname!r}")
+            if not isinstance(interfaces, dict):
+                raise TransactionError(f"change {number}: interfaces must map names to status")
+            for status in interfaces.values():
+                if status not in STATUSES:
+                    raise TransactionError(f"change {number}: invalid status {status!r}")
+            matched = _match(self.devices, pattern)
+            if not matched:
+                raise TransactionError(f"change {number}: no device matches {pattern}")
+            for name in matched:
+                new_hostname, statuses = plan.get(name, (None, []))
+                if hostname is not None:
+                    new_hostname = hostname.replace("{device}", name)
+                table = self.devices[name].interface_status
+                for interface, status in interfaces.items():
+                    targets = _match(table, interface)
+                    if not targets:
+                        raise TransactionError(
+                            f"change {number}: no interface matches {interface} on {name}")
+                    statuses.extend((target, status) for target in targets)
+                plan[name] = (new_hostname, statuses)
+        return plan
+
+    def apply(self, changes, if_version=None):
+        """Apply a transaction; returns (store version, devices changed, interface updates)"""
+        if if_version is not None and (not isinstance(if_version, int)
+                                       or isinstance(if_version, bool)):
+            raise TransactionError("if_version must be an integer")
+        with self._lock:
+            if if_version is not None and if_version != self.version:
+                raise VersionConflict(
+                    f"store is at version {self.version}, not {if_version}")
+            plan = self._plan(changes)
+            for name, (hostname, statuses) in plan.items():
+                self.devices[name].update(hostname, statuses, CONTROL_USER)
+            self.version += 1
+            return self.version, len(plan), sum(len(statuses) for _, statuses in plan.values())
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def _reply(self, status, document):
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/devices":
+            self._reply(200, {"version": self.store.version, "devices": self.store.names()})
+            return
+        if path.startswith("/devices/"):
+            device = self.store.describe(path[len("/devices/"):])
+            if device is not None:
+                self._reply(200, device)
+                return
+        self._reply(404, {"error": f"not found: {path}"})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path != "/transaction":
+            self._reply(404, {"error": f"not found: {path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not 0 < length <= MAX_BODY:
+                raise TransactionError("missing or oversized request body")
+            body = json.loads(self.rfile.read(length))
+            if not isinstance(body, dict):
+                raise TransactionError("expected a JSON object")
+            version, devices, interfaces = self.store.apply(body.get("changes"),
+                                                            body.get("if_version"))
+        except VersionConflict as e:
+            self._reply(409, {"error": str(e)})
+            return
+        except (TransactionError, ValueError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        log.info("Control transaction %d: %d devices, %d interface updates",
+                 version, devices, interfaces)
+        self._reply(200, {"version": version, "devices": devices, "interfaces": interfaces})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_control_server(port, devices, host="127.0.0.1"):
+    """Serve the control API for devices (name -> DeviceState) from a daemon thread"""
+    store = DeviceStore(devices)
+    handler = type("ControlHandler", (_ControlHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="control", daemon=True)
+    thread.start()
+    return server
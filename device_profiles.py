@@ -0,0 +1,174 @@
+"""
+Device profiles: model facts and captured command output per platform
+
+A profile is either one data file (`profiles/<name>.json`, or `.yaml` when
+PyYAML is installed) holding the model facts and an `outputs` table of
+command -> text, or a directory of captured output (`profiles/<name>/`)
+with the facts in `profile.json` and one text file per command, named
+after it (`show_system_storage.txt`).  Captured text uses plain newlines.
+
+A `ProfileLibrary` only lists the profile names when the server starts.
+A profile is parsed the first time a device uses it and then shared
+read-only by every device and session in the process; the output files
+of a directory profile are read the first time each command is run.
+Rendered output is then cached per template like any other
+template-level output.
+"""
+
+import json
+import logging
+import os
+import threading
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+DEFAULT_PROFILE = "mx480"
+
+FACTS_FILE = "profile.json"
+DATA_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+class ProfileError(Exception):
+    """Raised for a missing or malformed profile"""
+
+
+def _load_data(path):
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        if yaml is None:
+            raise ProfileError(f"{path}: YAML profiles need PyYAML")
+        return yaml.safe_load(f)
+
+
+def _output_file(command):
+    return command.replace(" ", "_") + ".txt"
+
+
+def _to_crlf(text):
+    if isinstance(text, list):
+        text = "\n".join(text)
+    return "\r\n".join(text.rstrip("\n").split("\n")) + "\r\n"
+
+
+class Profile:
+    """Facts and command output of one device model"""
+
+    def __init__(self, name, facts, outputs=None, directory=None):
+        self.name = name
+        self.model = facts.get("model", name.upper())
+        self.description = facts.get("description", "Juniper Networks Router")
+        self.product = facts.get("product", name)
+        self.release = facts.get("release", "22.4R1.10")
+        self.build_date = facts.get("build_date", "")
+        self.serial = facts.get("serial", "")
+        self.directory = directory
+        # command -> CRLF text, or None for a command the profile lacks
+        self._outputs = {command: _to_crlf(text) for command, text in (outputs or {}).items()}
+        self._lock = threading.Lock()
+
+    def output(self, command):
+        """Captured output of a command, or None when the profile has none"""
+        try:
+            return self._outputs[command]
+        except KeyError:
+            pass
+        text = None
+        if self.directory is not None:
+            path = os.path.join(self.directory, _output_file(command))
+            try:
+                with open(path) as f:
+                    text = _to_crlf(f.read())
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            return self._outputs.setdefault(command, text)
+
+
+class ProfileLibrary:
+    """Profiles found in a set of directories, each parsed on first use"""
+
+    def __init__(self, directories=(DEFAULT_PROFILE_DIR,)):
+        self.directories = list(directories)
+        self._paths = None
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        paths = {}
+        for directory in self.directories:
+            try:
+                entries = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                log.warning("Profile directory %s not found", directory)
+                continue
+            for entry in entries:
+                path = os.path.join(directory, entry)
+                name, extension = os.path.splitext(entry)
+                if extension in DATA_EXTENSIONS:
+                    paths.setdefault(name, path)
+                elif os.path.isfile(os.path.join(path, FACTS_FILE)):
+                    paths.setdefault(entry, path)
+        return paths
+
+    def names(self):
+        if self._paths is None:
+            self._paths = self._scan()
+        return sorted(self._paths)
+
+    def get(self, name):
+        """The profile called name, parsed once per process"""
+        profile = self._profiles.get(name)
+        if profile is not None:
+            return profile
+        with self._lock:
+            profile = self._profiles.get(name)
+            if profile is None:
+                profile = self._profiles[name] = self._parse(name)
+        return profile
+
+    def _parse(self, name):
+        if self._paths is None:
+            self._paths = self._scan()
+        path = self._paths.get(name)
+        if path is None:
+            raise ProfileError(f"unknown profile {name!r} (available: {', '.join(self.names())})")
+        try:
+            if os.path.isdir(path):
+                return Profile(name, _load_data(os.path.join(path, FACTS_FILE)), directory=path)
+            data = _load_data(path)
+            return Profile(name, data, data.get("outputs"))
+        except (OSError, ValueError, AttributeError) as e:
+            raise ProfileError(f"{path}: {e}") from None
+
+    def add_directory(self, directory):
+        """Search directory before the ones already known"""
+        self.directories.insert(0, directory)
+        self._paths = None
+
+
+_library = None
+
+
+def profile_library():
+    """The profiles available to this process"""
+    global _library
+    if _library is None:
+        _library = ProfileLibrary()
+    return _library
+
+
+def set_profile_library(library):
+    global _library
+    _library = library
+
+
+def default_profile():
+    return profile_library().get(DEFAULT_PROFILE)
@@ -0,0 +1,140 @@
+"""
+Shared state of a simulated device
+
+Every session connected to the same device works on one `DeviceState`.
+The state carries a version number that is bumped on every change, which
+lets rendered output be cached and reused until the state it was rendered
+from changes.
+"""
+
+import itertools
+import threading
+from candidate import Candidate
+from config_tree import default_config
+from device_profiles import default_profile
+from interfaces import InterfaceTable
+from simclock import simulation_clock
+
+
+_state_ids = itertools.count(1)
+_template_ids = itertools.count(1)
+
+
+class DeviceTemplate:
+    """Data shared read-only by every device built from it
+
+    A template holds the initial interface table, the configuration tree
+    and the device profile (model, release, inventory, ...).  Output that
+    depends only on the template is cached once per template rather than
+    once per device.
+    """
+
+    __slots__ = ('key', 'hostname', 'interfaces', 'config', 'profile')
+
+    def __init__(self, hostname="JUNOS-MX", interface_status=None, config=None, profile=None):
+        self.key = next(_template_ids)
+        self.hostname = hostname
+        self.profile = profile if profile is not None else default_profile()
+        if interface_status is None:
+            interface_status = {
+                "ge-0/0/0": "up",
+                "ge-0/0/1": "down",
+                "ge-0/0/2": "up",
+                "lo0": "up"
+            }
+        self.interfaces = InterfaceTable.from_status(interface_status)
+        self.config = config
+
+    def build(self, hostname=None):
+        """Create the state of one device from this template"""
+        return DeviceState(hostname or self.hostname, template=self)
+
+    def with_profile(self, profile):
+        """A template sharing this one's interfaces and configuration, for another model"""
+        template = DeviceTemplate.__new__(DeviceTemplate)
+        template.key = next(_template_ids)
+        template.hostname = self.hostname
+        template.interfaces = self.interfaces
+        template.config = self.config
+        template.profile = profile
+        return template
+
+
+class DeviceState:
+    """Hostname, interface table, configuration and a change version for one device
+
+    The configuration tree keeps its own version, which advances whenever a
+    node in it changes.
+    """
+
+    __slots__ = ('key', 'version', 'template', 'interface_status', 'config',
+                 'history', '_hostname', '_lock')
+
+    def __init__(self, hostname="JUNOS-MX", interface_status=None, config=None,
+                 template=None):
+        self.key = next(_state_ids)
+        self.version = 0
+        self._lock = threading.Lock()
+        self._hostname = hostname
+        if template is None:
+            if interface_status is None and config is None:
+                template = default_template()
+            else:
+                template = DeviceTemplate(hostname, interface_status, config)
+        self.template = template
+        if interface_status is None:
+            self.interface_status = template.interfaces.copy(owner=self)
+        else:
+            self.interface_status = InterfaceTable.from_status(interface_status, owner=self)
+        if config is None:
+            config = template.config if template.config is not None else default_config()
+        self.config = config
+        # CommitHistory, created by the first commit
+        self.history = None
+        simulation_clock().track(self)
+
+    def touch(self):
+        """Record a change so previously rendered output is not reused"""
+        with self._lock:
+            self.version += 1
+
+    @property
+    def hostname(self):
+        return self._hostname
+
+    @hostname.setter
+    def hostname(self, value):
+        self._hostname = value
+        self.touch()
+
+    def update(self, hostname=None, interface_status=(), user="admin"):
+        """Change the hostname and interface statuses
+
+        interface_status holds (name, status) pairs of existing interfaces;
+        they are set together, as one new version.  A new hostname is
+        committed to the configuration as `set system host-name`, exactly
+        as from configuration mode, so the configuration and the prompt
+        always agree.
+        """
+        if interface_status:
+            self.interface_status.set_oper_many(interface_status)
+        if hostname is not None and hostname != self._hostname:
+            candidate = Candidate(self)
+            candidate.set(["system", "host-name", hostname])
+            candidate.commit(user)
+
+    def set_interface_status(self, name, status):
+        if name not in self.interface_status:
+            raise KeyError(f"Interface {name} not found")
+        self.interface_status[name] = status
+
+
+_default_template = None
+
+
+def default_template():
+    """The template devices are built from unless told otherwise"""
+    global _default_template
+    if _default_template is None:
+        _default_template = DeviceTemplate()
+    return _default_template
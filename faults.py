@@ -0,0 +1,184 @@
+"""
+Fault and latency injection
+
+With `--faults FILE`, command output is delayed, replaced by errors,
+dripped out slowly or cut off by a dropped connection, and logins fail,
+at rates set per command and per device, so that client timeouts and
+retries get exercised.  FILE is JSON:
+
+    {
+      "seed": 1,
+      "auth_failure_rate": 0.01,
+      "rules": [
+        {"command": "show configuration", "devices": "dev00*",
+         "latency": 0.3, "jitter": 0.2,
+         "error_rate": 0.01, "error": "error: configuration database locked",
+         "disconnect_rate": 0.005,
+         "drip_rate": 0.05, "drip_bytes": 256, "drip_interval": 0.05}
+      ]
+    }
+
+The first rule whose `command` is a prefix of the resolved command
+("show configuration" matches `sh conf system`; "*" or no command matches
+everything) and whose `devices` pattern (fnmatch, default all) matches the
+device's hostname applies.  Latency is `latency` plus up to `jitter`
+seconds.
+
+The CLI does not wait itself: faults travel in the output stream as
+`Pause` and `Disconnect` markers between the chunks, and the front end
+that sends the output acts on them, so the asyncio front end delays a
+session with a loop timer instead of blocking anything.
+"""
+
+import fnmatch
+import json
+import random
+import threading
+from metrics import REGISTRY
+
+
+DEFAULT_ERROR = "error: command failed: resource temporarily unavailable"
+
+FAULTS_INJECTED = REGISTRY.counter(
+    "faults_injected_total", "Faults injected into sessions, by kind", ("kind",))
+
+
+class Pause:
+    """Output marker: wait this long before sending what follows"""
+
+    __slots__ = ('seconds',)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class Disconnect:
+    """Output marker: drop the connection without sending anything more"""
+
+    __slots__ = ()
+
+
+DISCONNECT = Disconnect()
+
+
+class InjectedDisconnect(Exception):
+    """Raised by a front end that dropped a connection for a Disconnect marker"""
+
+
+class FaultRule:
+    """Latency and fault rates for the commands and devices it matches"""
+
+    __slots__ = ('command', 'devices', 'latency', 'jitter', 'error_rate', 'error',
+                 'disconnect_rate', 'drip_rate', 'drip_bytes', 'drip_interval')
+
+    def __init__(self, command="*", devices="*", latency=0.0, jitter=0.0, error_rate=0.0,
+                 error=DEFAULT_ERROR, disconnect_rate=0.0, drip_rate=0.0, drip_bytes=256,
+                 drip_interval=0.05):
+        self.command = None if command in (None, "*") else tuple(command.split())
+        self.devices = devices or "*"
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error = error if error.endswith("\r\n") else error + "\r\n"
+        self.disconnect_rate = disconnect_rate
+        self.drip_rate = drip_rate
+        self.drip_bytes = max(1, drip_bytes)
+        self.drip_interval = drip_interval
+        if not all(0 <= rate <= 1 for rate in (error_rate, disconnect_rate, drip_rate)):
+            raise ValueError("rates must be between 0 and 1")
+
+    def matches(self, hostname, command):
+        if self.command is not None and command[:len(self.command)] != self.command:
+            return False
+        return self.devices == "*" or fnmatch.fnmatchcase(hostname, self.devices)
+
+
+class FaultInjector:
+    """Draws the faults for each command from the first matching rule"""
+
+    def __init__(self, rules=(), auth_failure_rate=0.0, seed=None):
+        self.rules = list(rules)
+        self.auth_failure_rate = auth_failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Read an injector from a JSON file; raises ValueError if it is invalid"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            rules = [FaultRule(**rule) for rule in data.get("rules", ())]
+            return cls(rules, data.get("auth_failure_rate", 0.0), data.get("seed"))
+        except (OSError, TypeError, AttributeError) as e:
+            raise ValueError(f"{path}: {e}") from None
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random()
+
+    def fail_auth(self):
+        """Whether to refuse a login with valid credentials"""
+        if self.auth_failure_rate and self._draw() < self.auth_failure_rate:
+            FAULTS_INJECTED.inc("auth_failure")
+            return True
+        return False
+
+    def apply(self, hostname, command, chunks):
+        """Wrap the encoded output of a command with the faults drawn for it
+
+        command is the resolved keyword path; chunks is returned unchanged
+        when no rule matches.
+        """
+        for rule in self.rules:
+            if rule.matches(hostname, command):
+                return self._inject(rule, chunks)
+        return chunks
+
+    def _inject(self, rule, chunks):
+        delay = rule.latency + (rule.jitter * self._draw() if rule.jitter else 0.0)
+        if delay > 0:
+            yield Pause(delay)
+        if rule.error_rate and self._draw() < rule.error_rate:
+            FAULTS_INJECTED.inc("error")
+            # In place of the output, on the line it would have started
+            yield b"\r\n" + rule.error.encode()
+            return
+        # Cut the connection somewhere in the first chunk of output
+        cut = None
+        if rule.disconnect_rate and self._draw() < rule.disconnect_rate:
+            FAULTS_INJECTED.inc("disconnect")
+            cut = self._draw()
+        drip = rule.drip_rate and self._draw() < rule.drip_rate
+        if drip:
+            FAULTS_INJECTED.inc("drip")
+        for chunk in chunks:
+            if cut is not None:
+                if not chunk.strip(b"\r\n"):
+                    # The line end that starts every command's output comes
+                    # as a chunk of its own; cut in the output after it
+                    yield chunk
+                    continue
+                chunk = chunk[:1 + int((len(chunk) - 1) * cut)]
+            if drip:
+                for start in range(0, len(chunk), rule.drip_bytes):
+                    yield chunk[start:start + rule.drip_bytes]
+                    yield Pause(rule.drip_interval)
+            elif chunk:
+                yield chunk
+            if cut is not None:
+                yield DISCONNECT
+                return
+
+
+_injector = None
+
+
+def fault_injector():
+    """The injector of this process, or None when no faults are injected"""
+    return _injector
+
+
+def set_fault_injector(injector):
+    global _injector
+    _injector = injector
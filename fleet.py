@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Fleet mode: many simulated devices in one process
+
+Every device is a small `DeviceState` built from a shared `DeviceTemplate`,
+so configuration, version and inventory data exist once no matter how many
+devices are simulated.  Clients reach a device either through its own port
+(base port + device index) or through a single port by logging in as
+user@device, e.g. `ssh admin@dev0042@localhost -p 2222`.
+"""
+
+import asyncio
+import logging
+from device_state import default_template
+from ssh_server import DEFAULT_BACKLOG, create_server_socket, serve_forever, serve_listeners
+from ssh_transport import TransportSettings
+
+
+log = logging.getLogger(__name__)
+
+
+class Fleet:
+    """Named device states built from one template, or one per device profile
+
+    With several profiles, devices are assigned to them in turn.
+    """
+
+    def __init__(self, count, prefix="dev", template=None, profiles=None):
+        self.template = template if template is not None else default_template()
+        templates = [self.template.with_profile(profile) for profile in profiles or ()]
+        templates = templates or [self.template]
+        width = max(4, len(str(count - 1)))
+        self.names = [f"{prefix}{i:0{width}d}" for i in range(count)]
+        self.devices = {name: templates[i % len(templates)].build(name)
+                        for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.devices)
+
+    def get(self, name):
+        return self.devices.get(name)
+
+
+def open_device_listeners(fleet, host, base_port, backlog):
+    """Bind one listening socket per device on consecutive ports"""
+    listeners = {}
+    try:
+        for offset, name in enumerate(fleet.names):
+            server_socket = create_server_socket(host, base_port + offset, backlog)
+            listeners[server_socket] = fleet.devices[name]
+    except Exception:
+        for server_socket in listeners:
+            server_socket.close()
+        raise
+    return listeners
+
+
+def start_fleet_server(host='localhost', port=2222, count=100, per_port=False,
+                       mode="threaded", backlog=DEFAULT_BACKLOG, prefix="dev", settings=None,
+                       profiles=None, fleet=None):
+    """Start an SSH server simulating count devices, or the devices of fleet"""
+    if fleet is None:
+        fleet = Fleet(count, prefix, profiles=profiles)
+    count = len(fleet)
+    log.info("Starting SSH server for a fleet of %d devices", count)
+    log.info("Login credentials: username='admin', password='admin'")
+
+    if settings is None:
+        settings = TransportSettings()
+
+    listeners = {}
+    try:
+        if per_port:
+            listeners = open_device_listeners(fleet, host, port, backlog)
+            log.info("Devices listening on %s:%d-%d", host, port, port + count - 1)
+            log.info("To connect: ssh admin@%s -p %d  (%s)", host, port, fleet.names[0])
+        else:
+            listeners = {create_server_socket(host, port, backlog): None}
+            log.info("Fleet listening on %s:%d", host, port)
+            log.info("To connect: ssh admin@%s@%s -p %d", fleet.names[0], host, port)
+        log.info("Press Ctrl+C to stop the server")
+
+        if mode == "asyncio":
+            from async_server import serve_listeners as serve_listeners_async
+            asyncio.run(serve_listeners_async(listeners, settings,
+                                              None if per_port else fleet))
+        elif per_port:
+            serve_listeners(listeners, settings)
+        else:
+            serve_forever(next(iter(listeners)), settings, fleet=fleet)
+    except KeyboardInterrupt:
+        log.info("Shutting down SSH server...")
+    except Exception as e:
+        log.error("Server error: %s", e)
+    finally:
+        for server_socket in listeners:
+            server_socket.close()
@@ -0,0 +1,289 @@
+"""
+Compact interface table
+
+Interfaces are stored column-wise: names and descriptions in lists, and
+status, MTU, speed, MAC address and traffic counters in parallel `array`s,
+with a dict from name to row.  A table with 100k interfaces costs a few
+hundred bytes per row instead of a dict of objects per interface.
+
+Traffic counters are not updated as time passes: each row keeps the
+counter values at its last state change and a byte rate, and reads add
+rate x time up at the simulation clock's current tick (`simclock.py`).
+
+Tables copied from a template share the name and description columns until
+interfaces are added or removed, so per-device copies only duplicate the
+numeric arrays.
+
+The table also behaves as a name -> "up"/"down" mapping of operational
+status, which is how the rest of the CLI has always seen interface state.
+"""
+
+from array import array
+from simclock import format_ago, format_time, simulation_clock
+
+
+UP = 1
+DOWN = 0
+
+_STATUS_NAMES = {UP: "up", DOWN: "down"}
+_STATUS_VALUES = {"up": UP, "down": DOWN}
+
+BASE_MAC = 0x001f12345678
+
+# Bytes per packet, to derive packet counters from byte counters
+AVERAGE_PACKET_SIZE = 700
+
+_NUMERIC_COLUMNS = (
+    ('admin', 'B'), ('oper', 'B'), ('mtu', 'I'), ('speed', 'I'), ('mac', 'Q'),
+    ('in_bytes', 'Q'), ('out_bytes', 'Q'), ('in_packets', 'Q'), ('out_packets', 'Q'),
+    ('in_rate', 'Q'), ('out_rate', 'Q'), ('flapped', 'd'),
+)
+
+
+def format_mac(value):
+    raw = f"{value:012x}"
+    return ":".join(raw[i:i + 2] for i in range(0, 12, 2))
+
+
+def default_description(name):
+    return "Loopback Interface" if name.startswith("lo") else "Gigabit Ethernet"
+
+
+def default_rates(row, speed):
+    """Input and output bytes/sec: 1-11% of line rate, varying by row"""
+    line_rate = speed * 125000
+    return (line_rate * (10 + row * 7919 % 100) // 1000,
+            line_rate * (10 + row * 104729 % 100) // 1000)
+
+
+class Interface:
+    """Read-only view of one row of an InterfaceTable"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    name = property(lambda self: self.table.names[self.row])
+    description = property(lambda self: self.table.descriptions[self.row])
+    admin_up = property(lambda self: self.table.admin[self.row] == UP)
+    oper_status = property(lambda self: _STATUS_NAMES[self.table.oper[self.row]])
+    mtu = property(lambda self: self.table.mtu[self.row])
+    speed = property(lambda self: self.table.speed[self.row])
+    mac = property(lambda self: format_mac(self.table.mac[self.row]))
+    in_bytes = property(lambda self: self.table.traffic(self.row)[0])
+    out_bytes = property(lambda self: self.table.traffic(self.row)[1])
+    in_packets = property(lambda self: self.table.traffic(self.row)[2])
+    out_packets = property(lambda self: self.table.traffic(self.row)[3])
+
+    @property
+    def last_flapped(self):
+        flapped = self.table.flapped[self.row]
+        if not flapped:
+            return "Never"
+        return f"{format_time(flapped)} ({format_ago(simulation_clock().now - flapped)} ago)"
+
+    def elements(self):
+        """Structured `show interfaces <name>` data"""
+        in_bytes, out_bytes, in_packets, out_packets = self.table.traffic(self.row)
+        return (
+            ("name", self.name),
+            ("admin-status", "up" if self.admin_up else "down"),
+            ("oper-status", self.oper_status),
+            ("description", self.description),
+            ("link-level-type", "Ethernet"),
+            ("mtu", self.mtu),
+            ("speed", f"{self.speed}mbps"),
+            ("current-physical-address", self.mac),
+            ("interface-flapped", self.last_flapped),
+            ("traffic-statistics", (
+                ("input-bytes", in_bytes),
+                ("output-bytes", out_bytes),
+                ("input-packets", in_packets),
+                ("output-packets", out_packets),
+            )),
+        )
+
+
+class InterfaceTable:
+    """Interfaces of one device, stored as parallel columns"""
+
+    __slots__ = ('names', 'index', 'descriptions', '_shared', '_owner') + \
+        tuple(name for name, _ in _NUMERIC_COLUMNS)
+
+    def __init__(self, owner=None):
+        self.names = []
+        self.index = {}
+        self.descriptions = []
+        self._shared = False
+        self._owner = owner
+        for column, typecode in _NUMERIC_COLUMNS:
+            setattr(self, column, array(typecode))
+
+    @classmethod
+    def from_status(cls, statuses, owner=None):
+        """Build a table from a name -> "up"/"down" mapping"""
+        table = cls()
+        for name, status in statuses.items():
+            table.add(name, oper=status)
+        table._owner = owner
+        return table
+
+    def copy(self, owner=None):
+        """Copy for another device; name columns stay shared until changed"""
+        table = InterfaceTable.__new__(InterfaceTable)
+        table.names = self.names
+        table.index = self.index
+        table.descriptions = self.descriptions
+        # Both tables copy the name columns before changing them
+        self._shared = True
+        table._shared = True
+        table._owner = owner
+        for column, _ in _NUMERIC_COLUMNS:
+            setattr(table, column, getattr(self, column)[:])
+        return table
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner.touch()
+
+    def _unshare(self):
+        if self._shared:
+            self.names = list(self.names)
+            self.index = dict(self.index)
+            self.descriptions = list(self.descriptions)
+            self._shared = False
+
+    def add(self, name, description=None, oper="up", admin=True, mtu=1514, speed=1000,
+            mac=None):
+        if name in self.index:
+            raise KeyError(f"Interface {name} already exists")
+        self._unshare()
+        row = len(self.names)
+        self.names.append(name)
+        self.index[name] = row
+        self.descriptions.append(description or default_description(name))
+        self.admin.append(UP if admin else DOWN)
+        self.oper.append(_STATUS_VALUES[oper])
+        self.mtu.append(mtu)
+        self.speed.append(speed)
+        self.mac.append(BASE_MAC + row if mac is None else mac)
+        for column in ('in_bytes', 'out_bytes', 'in_packets', 'out_packets'):
+            getattr(self, column).append(0)
+        in_rate, out_rate = default_rates(row, speed)
+        self.in_rate.append(in_rate)
+        self.out_rate.append(out_rate)
+        self.flapped.append(0.0)
+        self._changed()
+        return row
+
+    def add_range(self, names, **attributes):
+        """Add many interfaces, notifying the owner once"""
+        owner, self._owner = self._owner, None
+        try:
+            for name in names:
+                self.add(name, **attributes)
+        finally:
+            self._owner = owner
+        self._changed()
+
+    def get(self, name):
+        row = self.index.get(name)
+        return None if row is None else Interface(self, row)
+
+    def set_oper(self, name, status):
+        row = self.index[name]
+        value = _STATUS_VALUES[status]
+        if self.oper[row] != value:
+            # Bank the traffic so far; counters run again from now if up
+            traffic = self.traffic(row)
+            self.in_bytes[row], self.out_bytes[row] = traffic[0], traffic[1]
+            self.in_packets[row], self.out_packets[row] = traffic[2], traffic[3]
+            self.flapped[row] = simulation_clock().now
+            self.oper[row] = value
+        self._changed()
+
+    def set_oper_many(self, statuses):
+        """Set many operational statuses from (name, status) pairs, notifying the owner once"""
+        owner, self._owner = self._owner, None
+        try:
+            for name, status in statuses:
+                self.set_oper(name, status)
+        finally:
+            self._owner = owner
+        self._changed()
+
+    def traffic(self, row):
+        """(input bytes, output bytes, input packets, output packets) at the current tick"""
+        in_bytes, out_bytes = self.in_bytes[row], self.out_bytes[row]
+        in_packets, out_packets = self.in_packets[row], self.out_packets[row]
+        if self.oper[row] == UP:
+            clock = simulation_clock()
+            elapsed = clock.now - (self.flapped[row] or clock.started)
+            if elapsed > 0:
+                received = int(self.in_rate[row] * elapsed)
+                sent = int(self.out_rate[row] * elapsed)
+                in_bytes += received
+                out_bytes += sent
+                in_packets += received // AVERAGE_PACKET_SIZE
+                out_packets += sent // AVERAGE_PACKET_SIZE
+        return in_bytes, out_bytes, in_packets, out_packets
+
+    # Mapping of name -> operational status, as the dict it replaces
+
+    def __getitem__(self, name):
+        return _STATUS_NAMES[self.oper[self.index[name]]]
+
+    def __setitem__(self, name, status):
+        if name in self.index:
+            self.set_oper(name, status)
+        else:
+            self.add(name, oper=status)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def items(self):
+        oper = self.oper
+        return [(name, _STATUS_NAMES[oper[row]]) for row, name in enumerate(self.names)]
+
+    def iter_status_lines(self):
+        """Yield `show interfaces` rows"""
+        names, descriptions, oper = self.names, self.descriptions, self.oper
+        for row in range(len(names)):
+            yield f"{names[row]:<15} {_STATUS_NAMES[oper[row]]:<8} {descriptions[row]:<25}\r\n"
+
+    def iter_terse_lines(self):
+        """Yield `show interfaces terse` rows"""
+        names, admin, oper = self.names, self.admin, self.oper
+        for row in range(len(names)):
+            yield (f"{names[row]:<23} {_STATUS_NAMES[admin[row]]:<5} "
+                   f"{_STATUS_NAMES[oper[row]]:<4}\r\n")
+
+    def iter_elements(self, terse=False):
+        """Yield one structured `physical-interface` element per row"""
+        names, descriptions, admin, oper = self.names, self.descriptions, self.admin, self.oper
+        for row in range(len(names)):
+            fields = [("name", names[row]),
+                      ("admin-status", _STATUS_NAMES[admin[row]]),
+                      ("oper-status", _STATUS_NAMES[oper[row]])]
+            if not terse:
+                fields.append(("description", descriptions[row]))
+            yield ("physical-interface", fields)
+
+
+def chassis_port_names(count, prefix="ge", pics=4, ports=40):
+    """Generate `count` port names laid out as FPC/PIC/port"""
+    per_fpc = pics * ports
+    for i in range(count):
+        yield f"{prefix}-{i // per_fpc}/{(i // ports) % pics}/{i % ports}"
@@ -0,0 +1,70 @@
+"""
+Leveled, non-blocking logging
+
+Modules log through `logging.getLogger(__name__)` as usual.  Records are
+put on an unbounded queue by the calling thread and formatted and written
+by a single listener thread, so a session thread never waits on stdout or
+a terminal.  Per-connection events are logged at DEBUG and cost only a
+level check at the default INFO level.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+
+DEFAULT_LEVEL = "info"
+LEVELS = ("debug", "info", "warning", "error")
+FORMAT = "%(asctime)s %(levelname)-7s %(message)s"
+
+_listener = None
+_listener_pid = None
+_stream = None
+
+
+def configure_logging(level=DEFAULT_LEVEL, stream=None):
+    """Route all logging through a queue to one writer thread"""
+    global _listener, _listener_pid, _stream
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+    _stream = stream if stream is not None else sys.stdout
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(_stream)
+    output.setFormatter(logging.Formatter(FORMAT))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # paramiko logs every connection and every client reset; the front ends
+    # already log the failures that matter, so its messages are kept for
+    # debug runs
+    paramiko_level = logging.NOTSET if root.level <= logging.DEBUG else logging.CRITICAL
+    logging.getLogger("paramiko").setLevel(paramiko_level)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener_pid = os.getpid()
+    _listener.start()
+
+
+def flush_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+def _after_fork_in_child():
+    # The writer thread does not survive fork() and the queue may have been
+    # locked by another thread at the time, so a forked worker starts afresh
+    if _listener is not None:
+        configure_logging(logging.getLogger().level, _stream)
+
+
+atexit.register(flush_logging)
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -4,16 +4,199 @@ Simple SSH Device Simulator
 A basic SSH server that simulates a network device with CLI interface.
 """
 
-import sys
-from ssh_server import start_ssh_server
+import argparse
+import logging
+from admission import (DEFAULT_MAX_SESSIONS, DEFAULT_SEND_TIMEOUT, AdmissionControl,
+                       set_admission_control)
+from device_profiles import DEFAULT_PROFILE, ProfileError, profile_library
+from logger import DEFAULT_LEVEL, LEVELS, configure_logging
+from simclock import DEFAULT_TICK, Flap, SimulationClock, set_simulation_clock
+from ssh_server import DEFAULT_BACKLOG, start_ssh_server
+from ssh_transport import (DEFAULT_HOST_KEY_TYPES, FAST_CIPHERS, FAST_KEX, HOST_KEY_TYPES,
+                           TransportSettings, parse_list)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated JUNOS device over SSH")
+    parser.add_argument("port", nargs="?", type=int, default=2222,
+                        help="TCP port to listen on (default: 2222)")
+    parser.add_argument("--host", default="localhost",
+                        help="address to bind (default: localhost)")
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded",
+                        help="server front end: one thread per client, or a single event loop")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help=f"listen queue length (default: {DEFAULT_BACKLOG})")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_SESSIONS,
+                        help="refuse clients beyond this many open sessions per process "
+                             f"(default: {DEFAULT_MAX_SESSIONS})")
+    parser.add_argument("--max-per-ip", type=int, metavar="N",
+                        help="refuse clients beyond N open sessions from one source address")
+    parser.add_argument("--idle-timeout", type=float, metavar="SECONDS",
+                        help="close sessions with no input or output for this long")
+    parser.add_argument("--send-timeout", type=float, default=DEFAULT_SEND_TIMEOUT,
+                        metavar="SECONDS",
+                        help="drop clients that accept no output for this long "
+                             f"(default: {DEFAULT_SEND_TIMEOUT})")
+    parser.add_argument("--config", metavar="FILE",
+                        help="Junos configuration file to serve (default: configs/default.conf)")
+    parser.add_argument("--profile", metavar="NAME[,NAME...]",
+                        help=f"device model to simulate (default: {DEFAULT_PROFILE}); with --fleet, "
+                             "devices are spread over the listed profiles")
+    parser.add_argument("--profile-dir", action="append", default=[], metavar="DIR",
+                        help="also look for profiles in DIR; may be repeated")
+    parser.add_argument("--list-profiles", action="store_true",
+                        help="list the available device profiles and exit")
+    parser.add_argument("--interfaces", type=int, default=0, metavar="N",
+                        help="add N generated 10G ports (xe-0/0/0, ...) to every device")
+    parser.add_argument("--fleet", type=int, metavar="N",
+                        help="simulate N devices; log in as admin@<device> (dev0000, dev0001, ...)")
+    parser.add_argument("--fleet-ports", action="store_true",
+                        help="with --fleet: give each device its own port starting at PORT")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of server processes to fork (default: 1, no forking)")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="with --workers: each worker binds the port with SO_REUSEPORT "
+                             "instead of sharing one inherited socket")
+    parser.add_argument("--host-keys", default=",".join(DEFAULT_HOST_KEY_TYPES),
+                        metavar="TYPES",
+                        help="host key types to offer, in preference order "
+                             f"({', '.join(HOST_KEY_TYPES)}; default: "
+                             f"{','.join(DEFAULT_HOST_KEY_TYPES)})")
+    parser.add_argument("--kex", metavar="LIST",
+                        help="key exchange methods to offer, comma-separated, or 'fast' "
+                             "(default: paramiko's list)")
+    parser.add_argument("--ciphers", metavar="LIST",
+                        help="ciphers to offer, comma-separated, or 'fast' "
+                             "(default: paramiko's list)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve metrics at http://127.0.0.1:PORT/metrics (with --workers, "
+                             "worker n uses PORT + n)")
+    parser.add_argument("--control-port", type=int, metavar="PORT",
+                        help="serve the device control API at http://127.0.0.1:PORT/ "
+                             "(see control.py; not with --workers)")
+    parser.add_argument("--tick", type=float, default=DEFAULT_TICK, metavar="SECONDS",
+                        help="simulation clock interval for uptime, load averages and "
+                             f"interface counters (default: {DEFAULT_TICK})")
+    parser.add_argument("--flap", action="append", default=[], metavar="NAME:PERIOD:DOWN",
+                        help="take interface NAME down for DOWN seconds every PERIOD seconds "
+                             "on every device; may be repeated")
+    parser.add_argument("--faults", metavar="FILE",
+                        help="inject latency, errors, disconnects, slow output and login "
+                             "failures as described in FILE (JSON, see faults.py)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="append the input and output of every shell session to FILE "
+                             "for replay.py (with --workers, FILE.<pid> per worker)")
+    parser.add_argument("--log-level", choices=LEVELS, default=DEFAULT_LEVEL,
+                        help=f"least severe messages to log; debug logs every connection "
+                             f"(default: {DEFAULT_LEVEL})")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    # You can change the host and port here
-    HOST = 'localhost'
-    PORT = 2222
+    args = parse_args()
+    configure_logging(args.log_level)
+    log = logging.getLogger("main")
+    
+    if args.fleet and args.workers > 1:
+        raise SystemExit("--fleet cannot be used with --workers: every worker would "
+                         "simulate its own copy of the fleet")
+    
+    clock = SimulationClock(args.tick)
+    try:
+        for flap in args.flap:
+            clock.add_flap(Flap.parse(flap))
+    except ValueError as e:
+        raise SystemExit(f"Invalid --flap: {e}")
+    set_simulation_clock(clock)
+    
+    if args.faults:
+        from faults import FaultInjector, set_fault_injector
+        try:
+            set_fault_injector(FaultInjector.load(args.faults))
+        except ValueError as e:
+            raise SystemExit(f"Invalid --faults: {e}")
+        log.info("Injecting faults from %s", args.faults)
+    
+    if args.record:
+        from recorder import Recorder, set_session_recorder
+        try:
+            set_session_recorder(Recorder(args.record))
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Invalid --record: {e}")
+        log.info("Recording sessions to %s", args.record)
+    
+    library = profile_library()
+    for directory in args.profile_dir:
+        library.add_directory(directory)
+    if args.list_profiles:
+        print("\n".join(library.names()))
+        raise SystemExit(0)
+    try:
+        profiles = [library.get(name) for name in parse_list(args.profile) or ()]
+    except ProfileError as e:
+        raise SystemExit(f"Invalid --profile: {e}")
+    if profiles:
+        from device_state import default_template
+        default_template().profile = profiles[0]
+    
+    if args.config:
+        from config_tree import ConfigError, load_config, set_default_config
+        try:
+            set_default_config(load_config(args.config))
+        except (ConfigError, OSError, UnicodeDecodeError) as e:
+            raise SystemExit(f"Invalid --config: {e}")
+    
+    if args.interfaces:
+        from device_state import default_template
+        from interfaces import chassis_port_names
+        default_template().interfaces.add_range(
+            chassis_port_names(args.interfaces, "xe"), description="10 Gigabit Ethernet",
+            speed=10000)
+    
+    try:
+        settings = TransportSettings(parse_list(args.host_keys),
+                                     parse_list(args.kex, FAST_KEX),
+                                     parse_list(args.ciphers, FAST_CIPHERS))
+    except ValueError as e:
+        raise SystemExit(f"Invalid transport settings: {e}")
+    log.info("SSH transport: %s", settings.describe())
+    
+    set_admission_control(AdmissionControl(args.max_connections, args.max_per_ip,
+                                           args.idle_timeout, args.send_timeout))
+    
+    if args.metrics_port is not None and args.workers <= 1:
+        from metrics import start_metrics_server
+        start_metrics_server(args.metrics_port)
+        log.info("Metrics at http://127.0.0.1:%d/metrics", args.metrics_port)
     
-    if len(sys.argv) > 1:
-        PORT = int(sys.argv[1])
+    # Devices are created here when the control API needs to reach them
+    state = fleet = None
+    if args.control_port is not None:
+        if args.workers > 1:
+            raise SystemExit("--control-port cannot be used with --workers: every worker "
+                             "has its own device state")
+        from control import start_control_server
+        if args.fleet:
+            from fleet import Fleet
+            fleet = Fleet(args.fleet, profiles=profiles)
+            devices = fleet.devices
+        else:
+            from device_state import DeviceState
+            state = DeviceState()
+            devices = {state.hostname: state}
+        start_control_server(args.control_port, devices)
+        log.info("Control API at http://127.0.0.1:%d/", args.control_port)
     
-    start_ssh_server(HOST, PORT)
\ No newline at end of file
+    if args.fleet:
+        from fleet import start_fleet_server
+        start_fleet_server(args.host, args.port, args.fleet, args.fleet_ports, args.mode,
+                           args.backlog, settings=settings, profiles=profiles, fleet=fleet)
+    elif args.workers > 1:
+        from workers import start_worker_pool
+        start_worker_pool(args.host, args.port, args.workers, args.backlog,
+                          args.reuse_port, args.mode, settings, args.metrics_port)
+    elif args.mode == "asyncio":
+        from async_server import start_async_ssh_server
+        start_async_ssh_server(args.host, args.port, args.backlog, settings, state)
+    else:
+        start_ssh_server(args.host, args.port, args.backlog, settings, state)
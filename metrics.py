@@ -0,0 +1,260 @@
+"""
+In-process metrics and their HTTP exposition
+
+Counters, gauges and histograms live in one registry per process and are
+rendered in the Prometheus text format on request.  Updating a metric is a
+dictionary lookup and an addition under a per-metric lock, so hot paths
+(every command, every chunk sent) can afford it.  Components that already
+keep their own counters, such as admission control and the output cache,
+register a collector that reports them at scrape time instead of updating
+a second copy.
+
+`start_metrics_server()` serves the registry at /metrics from a daemon
+thread, bound to loopback by default.
+"""
+
+import bisect
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Upper bounds in seconds; covers cached output (~10us) to multi-second
+# renders of very large tables
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for metrics with an optional fixed set of label names"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value) for rendering"""
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield "", label_values, (), value
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets
+
+    Observations are appended to a queue, which is atomic and takes no
+    lock, and are sorted into buckets in batches: when enough have piled up
+    or when the histogram is rendered.
+    """
+
+    kind = "histogram"
+
+    # Pending observations that trigger sorting into buckets
+    FOLD_THRESHOLD = 1024
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._pending = deque()
+
+    def observe(self, value, *label_values):
+        pending = self._pending
+        pending.append((value, label_values))
+        if len(pending) >= self.FOLD_THRESHOLD:
+            self._fold()
+
+    def _fold(self):
+        pending = self._pending
+        buckets = self.buckets
+        with self._lock:
+            while pending:
+                try:
+                    value, label_values = pending.popleft()
+                except IndexError:
+                    break
+                series = self._values.get(label_values)
+                if series is None:
+                    # Per-bucket counts (plus +Inf), sum, count
+                    series = self._values[label_values] = [0] * (len(buckets) + 1) + [0.0, 0]
+                series[bisect.bisect_left(buckets, value)] += 1
+                series[-2] += value
+                series[-1] += 1
+
+    def samples(self):
+        self._fold()
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._values.items()]
+        bounds = self.buckets + (float("inf"),)
+        for label_values, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, series):
+                cumulative += bucket_count
+                yield "_bucket", label_values, (("le", _format_value(float(bound))),), cumulative
+            yield "_sum", label_values, (), series[-2]
+            yield "_count", label_values, (), series[-1]
+
+
+class Registry:
+    """Metrics of one process, plus collectors evaluated at scrape time"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"duplicate metric: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def register_collector(self, collector):
+        """Add a callable returning (name, kind, help, value) tuples
+
+        value is a number, or a dict mapping label-value tuples to numbers
+        for a metric with labels, in which case the tuple also carries the
+        label names as a fifth item.
+        """
+        with self._lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, label_values, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}"
+                             f"{_format_labels(metric.labels, label_values, extra)} "
+                             f"{_format_value(value)}")
+        for collector in collectors:
+            for name, kind, help, value, *labels in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if isinstance(value, dict):
+                    for label_values, sample in value.items():
+                        lines.append(f"{name}{_format_labels(labels[0], label_values)} "
+                                     f"{_format_value(sample)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics updated by the SSH front ends and the CLI
+
+AUTH_ATTEMPTS = REGISTRY.counter(
+    "ssh_auth_attempts_total", "Password authentication attempts", ("result",))
+SESSIONS = REGISTRY.counter(
+    "ssh_sessions_total", "Channels started, by kind", ("kind",))
+BYTES_SENT = REGISTRY.counter(
+    "ssh_channel_bytes_sent_total", "Bytes written to session channels")
+BYTES_RECEIVED = REGISTRY.counter(
+    "ssh_channel_bytes_received_total", "Bytes read from session channels")
+COMMAND_DISPATCH = REGISTRY.histogram(
+    "cli_command_dispatch_seconds",
+    "Time to resolve a command line and compile its pipes", ("command",))
+COMMAND_RENDER = REGISTRY.histogram(
+    "cli_command_render_seconds",
+    "Time spent producing command output, excluding time spent sending it", ("command",))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve registry at http://host:port/metrics from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    return server
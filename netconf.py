@@ -0,0 +1,307 @@
+"""
+NETCONF over SSH (the `netconf` subsystem)
+
+`NetconfSession` is the protocol engine for one subsystem channel, driven
+like `CLISession`: received bytes go in through `feed()` and the bytes to
+send come back out as a generator.  Messages are framed with the RFC 6242
+end-of-message marker (`]]>]]>`) until both hellos advertise base:1.1, and
+with chunked framing after that.
+
+Replies are built from the same device state and structured data as
+`| display xml` in the CLI and serialized element by element, so a
+get-config of a large configuration is written to the channel in chunks
+instead of being assembled in memory first.
+"""
+
+import itertools
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape, quoteattr
+from config_tree import ENTRY_TAGS
+from structured import JUNOS_NAMESPACE, iter_xml
+
+
+BASE_NAMESPACE = "urn:ietf:params:xml:ns:netconf:base:1.0"
+BASE_1_0 = "urn:ietf:params:netconf:base:1.0"
+BASE_1_1 = "urn:ietf:params:netconf:base:1.1"
+
+CAPABILITIES = (
+    BASE_1_0,
+    BASE_1_1,
+    "urn:ietf:params:netconf:capability:candidate:1.0",
+    "urn:ietf:params:xml:ns:netconf:capability:candidate:1.0",
+    "http://xml.juniper.net/netconf/junos/1.0",
+    "http://xml.juniper.net/dmi/system/1.0",
+)
+
+END_OF_MESSAGE = b"]]>]]>"
+
+# Serialized reply text is handed to the channel in pieces of about this size
+# (one chunk each with chunked framing)
+REPLY_CHUNK_SIZE = 32768
+
+# Input that has not formed a complete message within this many bytes is
+# rejected rather than buffered without limit
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Elements of configuration lists, named by a <name> child
+_ENTRY_ELEMENTS = set(ENTRY_TAGS.values())
+
+_session_ids = itertools.count(1)
+
+
+class NetconfError(Exception):
+    """A malformed message or framing error that ends the session"""
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _children(element):
+    return [child for child in element if isinstance(child.tag, str)]
+
+
+def _find(element, name):
+    """First child with the given local name, in any namespace"""
+    for child in _children(element):
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _find_text(element, name):
+    child = _find(element, name)
+    return child.text.strip() if child is not None and child.text else None
+
+
+def _error(tag, message, error_type="application"):
+    return (f"<rpc-error>\n<error-type>{error_type}</error-type>\n"
+            f"<error-tag>{tag}</error-tag>\n<error-severity>error</error-severity>\n"
+            f"<error-message>{escape(message)}</error-message>\n</rpc-error>\n",)
+
+
+class NetconfSession:
+    """NETCONF protocol engine for one subsystem channel"""
+
+    def __init__(self, cli):
+        # RPCs read the same device state and data handlers as the CLI
+        self.cli = cli
+        self.session_id = next(_session_ids)
+        self.running = True
+        self.chunked = False
+        self._hello_received = False
+        self._buffer = bytearray()
+
+    def hello(self):
+        """The server hello, sent as soon as the subsystem starts"""
+        capabilities = "".join(f"<capability>{capability}</capability>"
+                               for capability in CAPABILITIES)
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<hello xmlns="{BASE_NAMESPACE}"><capabilities>{capabilities}</capabilities>'
+                f'<session-id>{self.session_id}</session-id></hello>\n').encode() \
+            + END_OF_MESSAGE
+
+    def feed(self, data):
+        """Process received bytes and yield the bytes to send back"""
+        self._buffer += data
+        for message in self._messages():
+            yield from self._handle(message)
+            if not self.running:
+                return
+        if len(self._buffer) > MAX_MESSAGE_SIZE:
+            raise NetconfError("message too large")
+
+    # Framing
+
+    def _messages(self):
+        while self.running:
+            message = self._chunked_message() if self.chunked else self._eom_message()
+            if message is None:
+                return
+            yield message
+
+    def _eom_message(self):
+        end = self._buffer.find(END_OF_MESSAGE)
+        if end < 0:
+            return None
+        message = bytes(self._buffer[:end])
+        del self._buffer[:end + len(END_OF_MESSAGE)]
+        return message
+
+    def _chunked_message(self):
+        # \n#<size>\n<data> ... \n##\n; nothing is consumed until the whole
+        # message has arrived
+        buffer = self._buffer
+        parts = []
+        position = 0
+        while True:
+            if len(buffer) < position + 4:
+                return None
+            if buffer[position:position + 2] != b"\n#":
+                raise NetconfError("invalid chunk header")
+            if buffer[position + 2:position + 4] == b"#\n":
+                del buffer[:position + 4]
+                return b"".join(parts)
+            header_end = buffer.find(b"\n", position + 2)
+            if header_end < 0:
+                if len(buffer) - position > 12:
+                    raise NetconfError("invalid chunk header")
+                return None
+            size = buffer[position + 2:header_end]
+            if not size.isdigit() or size.startswith(b"0"):
+                raise NetconfError("invalid chunk size")
+            start = header_end + 1
+            end = start + int(size)
+            if len(buffer) < end:
+                return None
+            parts.append(bytes(buffer[start:end]))
+            position = end
+
+    def _frame(self, pieces):
+        """Encode reply text in REPLY_CHUNK_SIZE pieces with the session's framing"""
+        batch = []
+        size = 0
+        for piece in pieces:
+            batch.append(piece)
+            size += len(piece)
+            if size >= REPLY_CHUNK_SIZE:
+                yield self._frame_chunk("".join(batch).encode())
+                batch = []
+                size = 0
+        if batch:
+            yield self._frame_chunk("".join(batch).encode())
+        yield b"\n##\n" if self.chunked else END_OF_MESSAGE
+
+    def _frame_chunk(self, data):
+        if self.chunked:
+            return b"\n#%d\n" % len(data) + data
+        return data
+
+    # Messages
+
+    def _handle(self, message):
+        try:
+            root = ElementTree.fromstring(message)
+        except ElementTree.ParseError as e:
+            if not self._hello_received:
+                raise NetconfError(f"malformed hello: {e}")
+            yield from self._frame(self._reply(
+                {}, _error("malformed-message", f"Malformed XML: {e}", "rpc")))
+            return
+
+        tag = _local_name(root.tag)
+        if not self._hello_received:
+            if tag != "hello":
+                raise NetconfError("expected hello")
+            self._hello_received = True
+            capabilities = {(element.text or "").strip() for element in root.iter()
+                            if _local_name(element.tag) == "capability"}
+            self.chunked = BASE_1_1 in capabilities
+            return
+        if tag != "rpc":
+            yield from self._frame(self._reply(
+                root.attrib, _error("unknown-element", f"Unexpected element {tag}", "protocol")))
+            return
+
+        operations = _children(root)
+        if len(operations) != 1:
+            yield from self._frame(self._reply(
+                root.attrib, _error("missing-element", "rpc needs exactly one operation", "rpc")))
+            return
+        operation = operations[0]
+        handler = RPCS.get(_local_name(operation.tag))
+        if handler is None:
+            yield from self._frame(self._reply(root.attrib, _error(
+                "operation-not-supported",
+                f"Unsupported operation {_local_name(operation.tag)}", "protocol")))
+            return
+        yield from self._frame(self._reply(root.attrib, handler(self, operation)))
+
+    def _reply(self, attributes, body):
+        attributes = dict(attributes)
+        attributes.setdefault("xmlns", BASE_NAMESPACE)
+        attributes.setdefault("xmlns:junos", JUNOS_NAMESPACE)
+        opening = "".join(f" {name}={quoteattr(value)}" for name, value in attributes.items())
+        yield f"<rpc-reply{opening}>\n"
+        yield from body
+        yield "</rpc-reply>\n"
+
+    # Operations
+
+    def get_config(self, operation):
+        config = self.cli.state.config
+        source = _find(operation, "source")
+        if source is not None and not any(_local_name(child.tag) in ("running", "candidate")
+                                          for child in _children(source)):
+            return _error("invalid-value", "Unknown configuration source")
+
+        elements = config.iter_elements()
+        subtree = self._filter_subtree(operation)
+        if subtree is not None:
+            path = config.lookup_path(subtree)
+            elements = config.iter_path_elements(path) if path is not None \
+                else (("configuration", ()),)
+        return self._data(elements)
+
+    def get_interface_information(self, operation):
+        name = _find_text(operation, "interface-name")
+        if name:
+            return iter_xml(self.cli.show_interfaces_data(name), newline="\n")
+        if _find(operation, "terse") is not None:
+            return iter_xml(self.cli.show_interfaces_terse_data(), newline="\n")
+        return iter_xml(self.cli.show_interfaces_data(), newline="\n")
+
+    def get_software_information(self, operation):
+        return iter_xml(self.cli.show_version_data(), newline="\n")
+
+    def close_session(self, operation):
+        self.running = False
+        return ("<ok/>\n",)
+
+    def _data(self, elements):
+        yield "<data>\n"
+        yield from iter_xml(elements, 1, "\n")
+        yield "</data>\n"
+
+    @staticmethod
+    def _filter_subtree(operation):
+        """Configuration path selected by a subtree filter, or None for no filter
+
+        Supports the common form that selects one branch of the tree, e.g.
+        <configuration><system><services/></system></configuration>, with
+        list entries picked by <name>.
+        """
+        subtree = _find(operation, "filter")
+        selection = _children(subtree) if subtree is not None else None
+        if not selection:
+            return None
+        element = selection[0]
+        if _local_name(element.tag) != "configuration":
+            return None
+        tokens = []
+        children = _children(element)
+        while len(children) == 1:
+            element = children[0]
+            tag = _local_name(element.tag)
+            children = [child for child in _children(element)
+                        if _local_name(child.tag) != "name"]
+            name = _find_text(element, "name")
+            if name:
+                # A list entry such as <interface><name>ge-0/0/0</name>: the
+                # configuration statement is the entry's name
+                if tag in _ENTRY_ELEMENTS:
+                    tokens.append(name)
+                else:
+                    tokens.extend((tag, name))
+            else:
+                tokens.append(tag)
+        return tokens
+
+
+RPCS = {
+    "get-config": NetconfSession.get_config,
+    "get-interface-information": NetconfSession.get_interface_information,
+    "get-software-information": NetconfSession.get_software_information,
+    "close-session": NetconfSession.close_session,
+}
+
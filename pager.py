@@ -0,0 +1,76 @@
+"""
+Output paging (---(more)---)
+
+Interactive sessions page long output to the terminal's height, or to the
+length set with `set cli screen-length`, as Junos does.  A paged command
+produces its output one piece per line (`DeviceCLI.command_output`), and
+the pager pulls pieces only until the current screen is full, so reading
+one screen of a 100,000-interface listing renders one screen.  Quitting
+closes the command's generator, which stops it at once.
+"""
+
+
+MORE_PROMPT = b"---(more)---"
+
+# Overwrites the more prompt with the output that follows it
+CLEAR_PROMPT = b"\r" + b" " * len(MORE_PROMPT) + b"\r"
+
+
+class Pager:
+    """Shows the encoded output chunks of one command a screen at a time"""
+
+    __slots__ = ('screen_length', '_chunks', '_next')
+
+    def __init__(self, chunks, screen_length):
+        self.screen_length = screen_length
+        self._chunks = iter(chunks)
+        # Output pulled from the command but not shown yet
+        self._next = None
+
+    @property
+    def page_lines(self):
+        # The last line of the screen holds the more prompt
+        return max(1, self.screen_length - 1)
+
+    def show(self, lines):
+        """Yield the next `lines` lines, then the more prompt if output remains
+
+        Fault markers (faults.py) are passed through.  Returns True once
+        the output is complete.
+        """
+        chunks = self._chunks
+        while True:
+            piece = self._next
+            if piece is None:
+                piece = next(chunks, None)
+                if piece is None:
+                    return True
+            else:
+                self._next = None
+            if piece.__class__ is not bytes:
+                yield piece
+                continue
+            if not piece:
+                continue
+            if not lines:
+                self._next = piece
+                yield MORE_PROMPT
+                return False
+            end = 0
+            while lines:
+                found = piece.find(b"\n", end)
+                if found < 0:
+                    break
+                end = found + 1
+                lines -= 1
+            if not lines and end < len(piece):
+                self._next = piece[end:]
+                piece = piece[:end]
+            yield piece
+
+    def close(self):
+        """Stop the command without producing the rest of its output"""
+        self._next = None
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
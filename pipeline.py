@@ -0,0 +1,233 @@
+"""
+Output pipes (`command | match <regex> | count`, `| display xml`, ...)
+
+Command output flows through pipe stages as a stream of lines, so a
+filter never needs the complete output in memory and matching lines reach
+the client while the command is still producing the rest.  Each stage is
+compiled once per command line (regular expressions included) into a
+function from a line iterator to a line iterator.
+
+`display xml` and `display json` are not line filters: they select the
+structured form of the command's output, which later stages then filter
+like any other text.  `compare` likewise replaces configuration output
+with its differences from the active or a rollback configuration.
+"""
+
+import re
+from collections import deque
+
+
+class PipeError(Exception):
+    """Raised for an unknown or malformed pipe stage"""
+
+
+class Stage:
+    """A compiled pipe stage"""
+
+    __slots__ = ('name', 'apply', 'display', 'compare')
+
+    def __init__(self, name, apply=None, display=None, compare=None):
+        self.name = name
+        # Function of a line iterator, None for stages that pass lines through
+        self.apply = apply
+        # "xml" or "json" for display stages
+        self.display = display
+        # Rollback number to compare against (0 for the active configuration)
+        self.compare = compare
+
+
+def split_pipes(command):
+    """Split a command line into the command and its pipe stages
+
+    A `|` inside double quotes belongs to the stage argument.
+    """
+    parts = []
+    current = []
+    quoted = False
+    for char in command:
+        if char == '"':
+            quoted = not quoted
+        if char == '|' and not quoted:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return parts[0], parts[1:]
+
+
+def iter_lines(output):
+    """Yield output line by line (with line endings) from a str or iterable of str"""
+    if isinstance(output, str):
+        output = (output,)
+    partial = ""
+    for piece in output:
+        if partial:
+            piece = partial + piece
+            partial = ""
+        if piece.endswith("\n") and piece.count("\n") == 1:
+            yield piece
+            continue
+        lines = piece.splitlines(keepends=True)
+        if lines and not lines[-1].endswith("\n"):
+            partial = lines.pop()
+        yield from lines
+    if partial:
+        yield partial
+
+
+def _match(lines, pattern):
+    search = pattern.search
+    for line in lines:
+        if search(line.rstrip("\r\n")):
+            yield line
+
+
+def _except(lines, pattern):
+    search = pattern.search
+    for line in lines:
+        if not search(line.rstrip("\r\n")):
+            yield line
+
+
+def _count(lines):
+    total = 0
+    for _ in lines:
+        total += 1
+    yield f"Count: {total} lines\r\n"
+
+
+def _last(lines, count):
+    yield from deque(lines, maxlen=count)
+
+
+def _pattern(argument, stage):
+    if len(argument) >= 2 and argument[0] == argument[-1] == '"':
+        argument = argument[1:-1]
+    if not argument:
+        raise PipeError(f"Missing pattern for {stage}")
+    try:
+        return re.compile(argument)
+    except re.error as e:
+        raise PipeError(f"Invalid regular expression: {e}")
+
+
+def _compile_match(argument):
+    pattern = _pattern(argument, "match")
+    return Stage("match", lambda lines: _match(lines, pattern))
+
+
+def _compile_except(argument):
+    pattern = _pattern(argument, "except")
+    return Stage("except", lambda lines: _except(lines, pattern))
+
+
+def _compile_count(argument):
+    if argument:
+        raise PipeError(f"Unexpected argument for count: {argument}")
+    return Stage("count", _count)
+
+
+def _compile_last(argument):
+    count = DEFAULT_LAST_LINES
+    if argument:
+        if not argument.isdigit() or int(argument) == 0:
+            raise PipeError(f"Invalid line count for last: {argument}")
+        count = int(argument)
+    return Stage("last", lambda lines: _last(lines, count))
+
+
+def _compile_no_more(argument):
+    return Stage("no-more")
+
+
+def _compile_display(argument):
+    formats = [name for name in DISPLAY_FORMATS if name.startswith(argument)] \
+        if argument else []
+    if len(formats) != 1:
+        raise PipeError(f"Unknown display format: {argument or '(none)'}\r\n"
+                        f"Possible completions: {', '.join(DISPLAY_FORMATS)}")
+    return Stage("display", display=formats[0])
+
+
+def _compile_compare(argument):
+    words = argument.split()
+    if not words:
+        return Stage("compare", compare=0)
+    if len(words) == 2 and "rollback".startswith(words[0]) and words[1].isdigit():
+        return Stage("compare", compare=int(words[1]))
+    raise PipeError(f"Invalid compare argument: {argument}\r\n"
+                    "Usage: compare [rollback <number>]")
+
+
+DEFAULT_LAST_LINES = 24
+
+DISPLAY_FORMATS = ("json", "xml")
+
+# name -> (compiler, help)
+STAGES = {
+    "compare": (_compile_compare, "Compare configuration changes with prior version"),
+    "count": (_compile_count, "Count occurrences"),
+    "display": (_compile_display, "Show additional kinds of information"),
+    "except": (_compile_except, "Show only text that does not match a pattern"),
+    "last": (_compile_last, "Display end of output only"),
+    "match": (_compile_match, "Show only text that matches a pattern"),
+    "no-more": (_compile_no_more, "Don't paginate output"),
+}
+
+
+def compile_stage(text):
+    """Turn one stage's text into a Stage"""
+    words = text.split(None, 1)
+    if not words:
+        raise PipeError("Missing pipe command")
+    name = words[0]
+    argument = words[1].strip() if len(words) > 1 else ""
+    if name not in STAGES:
+        candidates = [stage for stage in STAGES if stage.startswith(name)]
+        if len(candidates) != 1:
+            raise PipeError(f"Unknown pipe command: {name}")
+        name = candidates[0]
+    return STAGES[name][0](argument)
+
+
+def compile_stages(texts):
+    return [compile_stage(text) for text in texts]
+
+
+def stage_completions():
+    """Render the `| ?` listing"""
+    lines = ["Possible completions:"]
+    for name, (_, help) in STAGES.items():
+        lines.append(f"  {name:<22} {help}")
+    return "\r\n".join(lines) + "\r\n\r\n"
+
+
+def apply_pipes(output, stages):
+    """Run output through the compiled pipe stages, lazily"""
+    lines = iter_lines(output)
+    for stage in stages:
+        if stage.apply is not None:
+            lines = stage.apply(lines)
+    return lines
+
+
+def display_format(stages):
+    """The format selected by a display stage, if any"""
+    for stage in stages:
+        if stage.display:
+            return stage.display
+    return None
+
+
+def compare_target(stages):
+    """The rollback number selected by a compare stage, or None"""
+    for stage in stages:
+        if stage.compare is not None:
+            return stage.compare
+    return None
+
+
+def paging_disabled(stages):
+    """Whether a `no-more` stage turns paging off"""
+    return any(stage.name == "no-more" for stage in stages)
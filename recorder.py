@@ -0,0 +1,230 @@
+"""
+Session capture to an append-only binary log
+
+With `--record FILE`, every interactive session's input and output is
+appended to FILE as timestamped frames, for replay with `replay.py`.
+Sessions only pack a frame header and put it on a queue; a single writer
+thread per process joins queued frames and writes them in large batches,
+so a session never waits on the disk.  If the disk cannot keep up and
+more than MAX_PENDING bytes are queued, frames are dropped and counted
+rather than letting the queue grow without bound.
+
+Log format: MAGIC, then frames of a FRAME header (timestamp, session id,
+kind, payload length) followed by the payload.  OPEN frames carry the
+device hostname, CLOSE frames nothing.  Forked workers write to
+FILE.<pid>.  A server that appends to an existing log continues its
+session ids, so sessions of different runs stay apart on replay.
+"""
+
+import atexit
+import itertools
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SIMREC\x00\x01"
+
+# timestamp (seconds since the epoch), session id, kind, payload length
+FRAME = struct.Struct("<dIBI")
+
+OPEN, INPUT, OUTPUT, CLOSE = range(4)
+
+MAX_PENDING = 64 * 2**20
+
+# Most frames the writer joins into one write
+WRITE_BATCH = 256
+
+_STOP = object()
+
+
+class SessionCapture:
+    """Records the frames of one session"""
+
+    __slots__ = ('recorder', 'session_id')
+
+    def __init__(self, recorder, session_id):
+        self.recorder = recorder
+        self.session_id = session_id
+
+    def input(self, data):
+        self.recorder.write(self.session_id, INPUT, data)
+
+    def output(self, data):
+        self.recorder.write(self.session_id, OUTPUT, data)
+
+    def close(self):
+        self.recorder.write(self.session_id, CLOSE, b"")
+
+
+class Recorder:
+    """Append-only frame log written by a background thread"""
+
+    def __init__(self, path):
+        self.base_path = path
+        self.path = path
+        self.frames = 0
+        self.dropped = 0
+        self._start()
+
+    def _start(self):
+        # Appending to a log from an earlier run: continue its session ids,
+        # so replay does not merge sessions of different runs, and drop a
+        # frame left half-written by a crash
+        last_id, end = scan_log(self.path)
+        self._session_ids = itertools.count(last_id + 1)
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+        if end is not None and self._file.tell() > end:
+            self._file.truncate(end)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def open_session(self, hostname):
+        capture = SessionCapture(self, next(self._session_ids))
+        self.write(capture.session_id, OPEN, hostname.encode())
+        return capture
+
+    def write(self, session_id, kind, data):
+        size = FRAME.size + len(data)
+        with self._lock:
+            if self._pending + size > MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending += size
+            self.frames += 1
+        self._queue.put(FRAME.pack(time.time(), session_id, kind, len(data)) + data)
+
+    def _run(self):
+        records = self._queue
+        while True:
+            batch = [records.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            data = b"".join(batch)
+            try:
+                self._file.write(data)
+                self._file.flush()
+            except OSError as e:
+                log.error("Recording to %s failed: %s", self.path, e)
+            with self._lock:
+                self._pending -= len(data)
+            if stop:
+                return
+
+    def close(self):
+        """Write out queued frames and close the log"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._file.close()
+
+    def _after_fork_in_child(self):
+        # The writer thread does not survive fork(); each worker writes its
+        # own file so frames of different processes never interleave
+        self.path = f"{self.base_path}.{os.getpid()}"
+        self.frames = self.dropped = 0
+        self._start()
+
+
+def iter_frames(buffer):
+    """Yield (timestamp, session id, kind, payload) from a log in a buffer
+
+    Payloads are memoryview slices of buffer, so an mmap'ed log is read
+    without copying.  A truncated last frame is ignored.
+    """
+    view = memoryview(buffer)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a session recording")
+    offset = len(MAGIC)
+    end = len(view)
+    unpack = FRAME.unpack_from
+    while offset + FRAME.size <= end:
+        timestamp, session_id, kind, length = unpack(view, offset)
+        offset += FRAME.size
+        if offset + length > end:
+            break
+        yield timestamp, session_id, kind, view[offset:offset + length]
+        offset += length
+
+
+def scan_log(path):
+    """Highest session id in an existing log, and the end of its last whole frame
+
+    Returns (0, None) when there is no log yet; raises ValueError if the
+    file is not a session recording.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return 0, None
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0, None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a session recording")
+            highest = 0
+            end = len(MAGIC)
+            for _, session_id, _, payload in iter_frames(buffer):
+                highest = max(highest, session_id)
+                end += FRAME.size + len(payload)
+                # Slices of the map must be released before it is closed
+                payload.release()
+    return highest, end
+
+
+_recorder = None
+
+
+def session_recorder():
+    """The recorder of this process, or None when sessions are not recorded"""
+    return _recorder
+
+
+def set_session_recorder(recorder):
+    global _recorder
+    _recorder = recorder
+
+
+def flush_recording():
+    if _recorder is not None:
+        _recorder.close()
+
+
+def _after_fork_in_child():
+    if _recorder is not None:
+        _recorder._after_fork_in_child()
+
+
+def _collect():
+    if _recorder is None:
+        return ()
+    return (
+        ("recorder_frames_total", "counter", "Session frames queued for the recording",
+         _recorder.frames),
+        ("recorder_frames_dropped_total", "counter",
+         "Session frames dropped because the writer fell behind", _recorder.dropped),
+    )
+
+
+atexit.register(flush_recording)
+os.register_at_fork(after_in_child=_after_fork_in_child)
+REGISTRY.register_collector(_collect)
@@ -0,0 +1,75 @@
+"""
+Shared cache of rendered command output
+
+Entries are pre-encoded bytes keyed by device state, state version and the
+resolved command, so every session polling the same device reuses a single
+rendering.  A change to the device bumps its version; stale entries are
+never looked up again and age out of the LRU.
+"""
+
+import threading
+from collections import OrderedDict
+from metrics import REGISTRY
+
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class RenderCache:
+    """Thread-safe LRU of encoded command output with hit/miss counters"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        """Return cached bytes for key, rendering and storing them on a miss"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+OUTPUT_CACHE = RenderCache()
+
+
+def _collect():
+    stats = OUTPUT_CACHE.stats()
+    return (
+        ("render_cache_hits_total", "counter", "Output cache hits", stats["hits"]),
+        ("render_cache_misses_total", "counter", "Output cache misses", stats["misses"]),
+        ("render_cache_entries", "gauge", "Rendered outputs held in the cache",
+         stats["entries"]),
+    )
+
+
+REGISTRY.register_collector(_collect)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Replay recorded sessions against a server
+
+Reads logs written with `main.py --record FILE` and re-drives every
+recorded shell session against a server: each session connects when it
+originally started and sends its input with the original timing, scaled
+by --speed (2 replays twice as fast, 0 sends everything without waiting).
+Output is read and counted but not compared, since uptime and counters
+move between runs.  The logs are memory-mapped and input is sent straight
+from the mapping.
+
+Usage: python replay.py FILE [FILE...] [--target HOST:PORT] [--speed FACTOR]
+           [--user NAME] [--password PASSWORD] [--per-device]
+"""
+
+import argparse
+import logging
+import mmap
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+
+from recorder import CLOSE, INPUT, OPEN, iter_frames
+
+
+class RecordedSession:
+    """Input of one recorded session, as (timestamp, payload) pairs"""
+
+    __slots__ = ('hostname', 'opened', 'inputs', 'closed')
+
+    def __init__(self, hostname, opened):
+        self.hostname = hostname
+        self.opened = opened
+        self.inputs = []
+        self.closed = None
+
+
+def load_sessions(buffers):
+    """Recorded sessions of all logs, in order of their start"""
+    sessions = {}
+    for number, buffer in enumerate(buffers):
+        for timestamp, session_id, kind, payload in iter_frames(buffer):
+            key = (number, session_id)
+            if kind == OPEN:
+                sessions[key] = RecordedSession(bytes(payload).decode(), timestamp)
+                continue
+            session = sessions.get(key)
+            if session is None:
+                continue
+            if kind == INPUT:
+                session.inputs.append((timestamp, payload))
+            elif kind == CLOSE:
+                session.closed = timestamp
+    return sorted(sessions.values(), key=lambda session: session.opened)
+
+
+class Replay:
+    """Counters shared by the session threads"""
+
+    def __init__(self, host, port, user, password, per_device, speed):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.per_device = per_device
+        self.speed = speed
+        self.replayed = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def wait_until(self, start, origin, timestamp):
+        if self.speed:
+            delay = start + (timestamp - origin) / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def run_session(self, session, start, origin):
+        self.wait_until(start, origin, session.opened)
+        user = f"{self.user}@{session.hostname}" if self.per_device else self.user
+        transport = None
+        sent = received = 0
+        try:
+            transport = paramiko.Transport(socket.create_connection((self.host, self.port)))
+            transport.start_client(timeout=30)
+            transport.auth_password(user, self.password)
+            channel = transport.open_session()
+            channel.get_pty(width=200, height=0)
+            channel.invoke_shell()
+            reader = threading.Thread(target=self._drain, args=(channel,), daemon=True)
+            reader.start()
+            for timestamp, payload in session.inputs:
+                self.wait_until(start, origin, timestamp)
+                channel.sendall(payload)
+                sent += len(payload)
+            if session.closed is not None:
+                self.wait_until(start, origin, session.closed)
+            channel.shutdown_write()
+            reader.join(30)
+            received = reader.received
+            ok = True
+        except Exception as e:
+            print(f"session from {session.hostname}: {e}", file=sys.stderr)
+            ok = False
+        finally:
+            if transport is not None:
+                transport.close()
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+            if ok:
+                self.replayed += 1
+            else:
+                self.failed += 1
+
+    @staticmethod
+    def _drain(channel):
+        thread = threading.current_thread()
+        thread.received = 0
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                return
+            thread.received += len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("logs", nargs="+", metavar="FILE", help="recordings to replay")
+    parser.add_argument("--target", default="127.0.0.1:2222", metavar="HOST:PORT",
+                        help="server to replay against (default: 127.0.0.1:2222)")
+    parser.add_argument("--speed", type=float, default=1.0, metavar="FACTOR",
+                        help="timing scale: 1 is the original pace, 0 sends without "
+                             "waiting (default: 1)")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--per-device", action="store_true",
+                        help="log in as USER@<recorded hostname>, for fleet servers")
+    args = parser.parse_args()
+    # The server closes the connection after `exit`; paramiko would log the reset
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    files = [open(path, "rb") for path in args.logs]
+    maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) for f in files]
+    try:
+        sessions = load_sessions(maps)
+    except ValueError as e:
+        raise SystemExit(f"Cannot replay: {e}")
+    if not sessions:
+        raise SystemExit("No sessions recorded")
+    host, _, port = args.target.rpartition(":")
+    replay = Replay(host or "127.0.0.1", int(port), args.user, args.password,
+                    args.per_device, args.speed)
+
+    origin = sessions[0].opened
+    recorded = max(session.closed or session.opened for session in sessions) - origin
+    print(f"Replaying {len(sessions)} sessions recorded over {recorded:.1f} s "
+          f"at speed {args.speed:g}")
+    start = time.monotonic()
+    threads = [threading.Thread(target=replay.run_session, args=(session, start, origin))
+               for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    print(f"{replay.replayed} sessions replayed ({replay.failed} failed) in {elapsed:.1f} s, "
+          f"{replay.bytes_sent} bytes sent, {replay.bytes_received} bytes received")
+    # Sessions hold slices of the maps until they are released
+    del sessions
+    for m in maps:
+        m.close()
+    for f in files:
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
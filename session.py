@@ -0,0 +1,193 @@
+"""
+Terminal input handling for interactive CLI sessions
+
+Input is processed one received chunk at a time rather than byte by byte:
+the chunk is split into lines, each completed line is run through the CLI,
+and the echo, command output and prompts produced for the whole chunk are
+coalesced into as few channel writes as possible.  Fault markers from
+the CLI are passed through between the coalesced writes.
+
+Output longer than a screen stops at a more prompt (pager.py); keys typed
+there page through the rest of it instead of editing the command line.
+"""
+
+import re
+from pager import CLEAR_PROMPT, Pager
+
+
+# Output is coalesced up to this many bytes before being handed to the channel
+WRITE_CHUNK_SIZE = 32768
+
+_LINE_END = re.compile(r'\r\n|\r|\n')
+BACKSPACE = '\x7f'
+
+# Keys that abandon paged output
+QUIT_KEYS = 'qQ\x03'
+
+
+class Terminal:
+    """Size of a session's terminal, from its pty and window-change requests
+
+    A height of 0 (no pty, or a client that asked for none) turns paging off.
+    """
+
+    __slots__ = ('width', 'height')
+
+    def __init__(self, width=80, height=0):
+        self.width = width
+        self.height = height
+
+
+class CLISession:
+    """Line editor and command runner for one interactive session"""
+
+    def __init__(self, cli, terminal=None):
+        self.cli = cli
+        self.terminal = terminal if terminal is not None else Terminal()
+        # Pieces of the line being typed; joined only when the line completes
+        self._pending = []
+        self._after_cr = False
+        # Pager of output waiting at a more prompt
+        self._pager = None
+
+    @property
+    def buffer(self):
+        return "".join(self._pending)
+
+    @property
+    def screen_length(self):
+        length = self.cli.screen_length
+        return self.terminal.height if length is None else length
+
+    def prompt(self):
+        return self.cli.get_prompt().encode()
+
+    def feed(self, data):
+        """Process a received chunk and yield the bytes to send back"""
+        text = data.decode('latin-1')
+        # A CR that ended the previous chunk may be followed by its LF here
+        if self._after_cr and text.startswith('\n'):
+            text = text[1:]
+        self._after_cr = text.endswith('\r')
+
+        out = []
+        size = 0
+        for piece in self._process(text):
+            if piece.__class__ is not bytes:
+                # A fault marker (faults.py) for the front end
+                if out:
+                    yield b"".join(out)
+                    out = []
+                    size = 0
+                yield piece
+                continue
+            out.append(piece)
+            size += len(piece)
+            if size >= WRITE_CHUNK_SIZE:
+                yield b"".join(out)
+                out = []
+                size = 0
+
+        if out:
+            yield b"".join(out)
+
+    def _process(self, text):
+        """Yield the echo, output and prompts for received text"""
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if self._pager is not None:
+                pos = yield from self._page(text, pos)
+                continue
+            match = _LINE_END.search(text, pos)
+            segment = text[pos:match.start() if match else end]
+            if segment:
+                echo = self._edit(segment)
+                if echo:
+                    yield echo
+            if match is None:
+                return
+            pos = match.end()
+
+            line = "".join(self._pending)
+            self._pending = []
+            yield from self._run(line)
+            if not self.cli.running:
+                return
+
+    def _page(self, text, pos):
+        """Act on keys typed at a more prompt; return the position after them
+
+        Space shows the next screen, Enter the next line, and q (or
+        Ctrl-C) abandons the rest of the output.  Other keys are ignored.
+        """
+        pager = self._pager
+        end = len(text)
+        while pos < end:
+            key = text[pos]
+            pos += 1
+            if key == ' ':
+                # The window may have been resized since the last screen
+                pager.screen_length = self.screen_length or pager.screen_length
+                lines = pager.page_lines
+            elif key in '\r\n':
+                if key == '\r' and text.startswith('\n', pos):
+                    pos += 1
+                lines = 1
+            elif key in QUIT_KEYS:
+                pager.close()
+                self._pager = None
+                yield CLEAR_PROMPT
+                yield self.prompt()
+                break
+            else:
+                continue
+            yield CLEAR_PROMPT
+            if (yield from pager.show(lines)):
+                self._pager = None
+                yield self.prompt()
+                break
+        return pos
+
+    def _edit(self, segment):
+        """Apply typed characters to the pending line and return their echo"""
+        if BACKSPACE not in segment and segment.isprintable():
+            self._pending.append(segment)
+            return segment.encode('latin-1')
+
+        echo = []
+        for char in segment:
+            if char == BACKSPACE:
+                if self._pending:
+                    last = self._pending[-1]
+                    if len(last) > 1:
+                        self._pending[-1] = last[:-1]
+                    else:
+                        self._pending.pop()
+                    echo.append('\b \b')
+            elif char.isprintable():
+                self._pending.append(char)
+                echo.append(char)
+        return "".join(echo).encode('latin-1')
+
+    def _run(self, line):
+        """Yield the output and next prompt for a completed line
+
+        When the output fills the screen, the more prompt is yielded
+        instead of the next prompt and the session waits for paging keys.
+        """
+        if line.strip():
+            length = self.screen_length
+            chunks, paged = self.cli.command_output(line, length)
+            if paged:
+                pager = Pager(chunks, length)
+                # The output's leading line end finishes the command line and
+                # takes no screen line of its own
+                if not (yield from pager.show(pager.page_lines + 1)):
+                    self._pager = pager
+                    return
+            else:
+                yield from chunks
+            if not self.cli.running:
+                return
+        yield self.prompt()
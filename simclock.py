@@ -0,0 +1,189 @@
+"""
+Shared simulation clock
+
+One background thread per process ticks the simulation forward, once a
+second by default.  A tick only records the time and updates the three
+load averages; everything else that moves with time is computed when it
+is read.  Interface traffic counters are a base value plus rate x time
+since the interface last changed state (`interfaces.InterfaceTable`), so a
+tick costs the same with 10 interfaces or 100,000, and uptime is the tick
+time minus the boot time.
+
+Output that depends on the clock reads `now` and `ticks`, which stay put
+between ticks, so it can be cached until the next tick.
+
+Scripted link flaps (`add_flap()`) take an interface down for part of every
+period on every tracked device; they are the only per-device work a tick
+does, and only when an interface changes state.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+
+
+DEFAULT_TICK = 1.0
+
+# Where the simulated devices are in their lives when the clock starts
+BOOT_AGE = 15 * 86400 + 7 * 3600 + 12 * 60 + 42
+PROTOCOLS_DELAY = 92
+
+# Load average sampling, as in the kernel: exponential decay over 1, 5
+# and 15 minutes of a sampled run-queue length
+LOAD_PERIODS = (60, 300, 900)
+INITIAL_LOAD = (0.23, 0.18, 0.15)
+BASE_LOAD = 0.15
+LOAD_NOISE = 0.2
+
+
+class Flap:
+    """`interface` goes down for `down` seconds at the start of every `period`"""
+
+    __slots__ = ('interface', 'period', 'down')
+
+    def __init__(self, interface, period, down):
+        if period <= 0 or not 0 < down < period:
+            raise ValueError(f"flap of {interface}: need 0 < down < period")
+        self.interface = interface
+        self.period = period
+        self.down = down
+
+    @classmethod
+    def parse(cls, text):
+        """Parse `NAME:PERIOD:DOWN`, e.g. `ge-0/0/1:60:5`"""
+        name, sep, rest = text.rpartition(":")
+        interface, sep2, period = name.rpartition(":")
+        if not (sep and sep2 and interface):
+            raise ValueError(f"invalid flap {text!r}: expected NAME:PERIOD:DOWN")
+        return cls(interface, float(period), float(rest))
+
+    def status(self, elapsed):
+        return "down" if elapsed % self.period < self.down else "up"
+
+
+class SimulationClock:
+    """Simulated time, load averages and link flaps for every device in the process"""
+
+    def __init__(self, tick=DEFAULT_TICK, seed=None):
+        self.tick = tick
+        self.started = time.time()
+        self.now = self.started
+        self.ticks = 0
+        self.booted = self.started - BOOT_AGE
+        self.load = list(INITIAL_LOAD)
+        self.flaps = []
+        self._devices = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def elapsed(self):
+        return self.now - self.started
+
+    # Link flaps
+
+    def add_flap(self, flap):
+        self.flaps.append(flap)
+
+    def track(self, state):
+        """Apply the link flaps to a device; free when there are none"""
+        if self.flaps:
+            with self._lock:
+                self._devices.append(state)
+
+    def _apply_flaps(self, elapsed):
+        with self._lock:
+            devices = list(self._devices)
+        for flap in self.flaps:
+            status = flap.status(elapsed)
+            for state in devices:
+                table = state.interface_status
+                if flap.interface in table and table[flap.interface] != status:
+                    table[flap.interface] = status
+
+    # Ticking
+
+    def advance(self, now=None):
+        """Move the simulation to `now` (default: the wall clock)"""
+        now = time.time() if now is None else now
+        interval = now - self.now
+        sample = BASE_LOAD + self._random.random() * LOAD_NOISE
+        for i, period in enumerate(LOAD_PERIODS):
+            decay = math.exp(-interval / period)
+            self.load[i] = self.load[i] * decay + sample * (1 - decay)
+        if self.flaps:
+            self._apply_flaps(now - self.started)
+        self.now = now
+        self.ticks += 1
+
+    def start(self):
+        """Start the tick thread, if it is not already running in this process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="simulation-clock",
+                                            daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            self.advance()
+
+
+_clock = None
+
+
+def simulation_clock():
+    """The clock shared by every device in this process, started on first use"""
+    global _clock
+    if _clock is None:
+        _clock = SimulationClock()
+        _clock.start()
+    return _clock
+
+
+def set_simulation_clock(clock):
+    global _clock
+    _clock = clock
+    clock.start()
+
+
+# Formatting
+
+
+def format_time(seconds):
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(seconds))
+
+
+def format_ago(seconds):
+    """Junos-style age, e.g. `2w1d 07:12`"""
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 1440)
+    weeks, days = divmod(days, 7)
+    prefix = (f"{weeks}w" if weeks else "") + (f"{days}d" if weeks or days else "")
+    return f"{prefix} {minutes // 60:02d}:{minutes % 60:02d}".lstrip()
+
+
+def format_uptime(seconds):
+    """`up 15 days,  7:12` as printed by the uptime summary line"""
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 1440)
+    clock = f"{minutes // 60:2d}:{minutes % 60:02d}"
+    if days:
+        return f"up {days} day{'s' if days != 1 else ''}, {clock}"
+    return f"up {clock}"
+
+
+def _after_fork_in_child():
+    # The tick thread does not survive fork(); forked workers tick their own
+    if _clock is not None:
+        _clock._lock = threading.Lock()
+        _clock._thread = None
+        _clock.start()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,11 +1,35 @@
+import logging
 import paramiko
 import threading
+from faults import fault_injector
+from metrics import AUTH_ATTEMPTS
+from session import Terminal
+
+
+log = logging.getLogger(__name__)
+
+
+SUBSYSTEMS = ("netconf",)
 
 class DeviceSSHServer(paramiko.ServerInterface):
     """SSH Server Interface for the simulated device"""
     
-    def __init__(self):
-        self.event = threading.Event()
+    def __init__(self, event=None, fleet=None):
+        # The event is set once the client asks for a shell or sends an exec
+        # request; callers that cannot block on a threading.Event may supply
+        # their own object with the same set()/is_set() interface.
+        self.event = event if event is not None else threading.Event()
+        # Command line of an exec request (`ssh device 'show version'`),
+        # None for interactive shells
+        self.exec_command = None
+        # Name of the requested subsystem ("netconf"), if any
+        self.subsystem = None
+        # With a fleet, logins name their device as user@device and the
+        # matching device state is kept here after authentication
+        self.fleet = fleet
+        self.device = None
+        # Terminal size for paging; updated from paramiko's transport thread
+        self.terminal = Terminal()
         
     def check_channel_request(self, kind, chanid):
         if kind == 'session':
@@ -13,25 +37,63 @@ class DeviceSSHServer(paramiko.ServerInterface):
         return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
         
     def check_auth_password(self, username, password):
-        print(f"Authentication attempt: username='{username}'")
+        log.debug("Authentication attempt: username='%s'", username)
+        device = None
+        if self.fleet is not None:
+            username, _, device_name = username.partition('@')
+            device = self.fleet.get(device_name)
+            if device is None:
+                log.info("Authentication failed: unknown device '%s'", device_name)
+                AUTH_ATTEMPTS.inc("failure")
+                return paramiko.AUTH_FAILED
         if username == 'admin' and password == 'admin':
-            print("Authentication successful")
+            injector = fault_injector()
+            if injector is not None and injector.fail_auth():
+                log.debug("Authentication failed: injected fault")
+                AUTH_ATTEMPTS.inc("failure")
+                return paramiko.AUTH_FAILED
+            self.device = device
+            log.debug("Authentication successful")
+            AUTH_ATTEMPTS.inc("success")
             return paramiko.AUTH_SUCCESSFUL
-        print("Authentication failed")
+        log.info("Authentication failed for '%s'", username)
+        AUTH_ATTEMPTS.inc("failure")
         return paramiko.AUTH_FAILED
         
     def get_allowed_auths(self, username):
         return 'password'
         
     def check_channel_shell_request(self, channel):
-        print("Shell request received")
+        log.debug("Shell request received")
         self.event.set()
         return True
         
     def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
-        print(f"PTY request: terminal={term}, size={width}x{height}")
+        log.debug("PTY request: terminal=%s, size=%dx%d", term, width, height)
+        self.terminal.width = width
+        self.terminal.height = height
+        return True
+        
+    def check_channel_window_change_request(self, channel, width, height, pixelwidth,
+                                            pixelheight):
+        log.debug("Window change: size=%dx%d", width, height)
+        self.terminal.width = width
+        self.terminal.height = height
+        return True
+        
+    def check_channel_subsystem_request(self, channel, name):
+        log.debug("Subsystem request: %s", name)
+        if name not in SUBSYSTEMS or self.event.is_set():
+            return False
+        self.subsystem = name
+        self.event.set()
         return True
         
     def check_channel_exec_request(self, channel, command):
-        print(f"Exec request: {command}")
-        return False  # We only support shell sessions
\ No newline at end of file
+        command = command.decode('utf-8', 'replace').strip()
+        log.debug("Exec request: %s", command)
+        if self.event.is_set():
+            return False  # One shell or exec request per connection
+        self.exec_command = command
+        self.event.set()
+        return True
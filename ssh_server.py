@@ -3,166 +3,347 @@
 SSH Server implementation for the simulated device
 """
 
+import logging
 import paramiko
+import selectors
 import socket
 import threading
-import os
+import time
 from ssh_interface import DeviceSSHServer
+from admission import admission_control
 from cli import DeviceCLI
+from device_state import DeviceState
+from faults import DISCONNECT, InjectedDisconnect
+from metrics import BYTES_RECEIVED, BYTES_SENT, SESSIONS
+from netconf import NetconfError, NetconfSession
+from recorder import session_recorder
+from session import CLISession
+from ssh_transport import TransportSettings
 
 
-def handle_ssh_session(channel, cli):
+log = logging.getLogger(__name__)
+
+DEFAULT_BACKLOG = 128
+
+# Seconds to wait for a client to close its channel after an exec command
+EXEC_CLOSE_TIMEOUT = 5
+
+
+BANNER = b"\r\nWelcome to Simulated JUNOS Device\r\n"
+
+
+def send_bounded(channel, data, record=None):
+    """Send data, giving up if a slow reader keeps the window closed too long
+
+    Output is generated in bounded chunks and only as fast as it is sent,
+    so a stalled client holds at most one chunk plus the SSH window.
+    """
+    admission = admission_control()
+    channel.settimeout(admission.send_timeout)
+    try:
+        channel.sendall(data)
+        BYTES_SENT.inc(amount=len(data))
+    except socket.timeout:
+        admission.record_slow()
+        raise socket.timeout("send timed out")
+    finally:
+        channel.settimeout(None)
+    if record is not None:
+        record.touch()
+
+
+def handle_fault(channel, fault):
+    """Act on a fault marker from the output stream (see faults.py)
+
+    The session's own thread waits out a pause; the asyncio front end
+    uses a loop timer instead.
+    """
+    if fault is DISCONNECT:
+        channel.get_transport().close()
+        raise InjectedDisconnect()
+    time.sleep(fault.seconds)
+
+
+def handle_ssh_session(channel, cli, record=None, terminal=None):
     """Handle an SSH session with CLI interaction"""
-    channel.send(b"\r\nWelcome to Simulated JUNOS Device\r\n")
-    
-    # Send initial prompt
-    channel.send(cli.get_prompt().encode())
-    
-    buffer = ""
+    session = CLISession(cli, terminal)
+    recorder = session_recorder()
+    capture = recorder.open_session(cli.hostname) if recorder is not None else None
+    greeting = BANNER + session.prompt()
+    if capture is not None:
+        capture.output(greeting)
+    send_bounded(channel, greeting)
     
     while cli.running:
         try:
             # Read data from the channel
-            data = channel.recv(1024)
+            data = channel.recv(65536)
             if not data:
                 break
-                
-            # Handle incoming data
-            for byte in data:
-                char = chr(byte)
-                
-                if char == '\r' or char == '\n':
-                    if buffer.strip():
-                        # Process the command
-                        output = cli.process_command(buffer)
-                        if output:
-                            channel.send(output.encode())
-                        
-                        if not cli.running:
-                            break
-                            
-                        # Send new prompt
-                        channel.send(cli.get_prompt().encode())
-                    else:
-                        # Empty line, just send prompt
-                        channel.send(cli.get_prompt().encode())
-                    buffer = ""
-                elif char == '\x7f':  # Backspace
-                    if buffer:
-                        buffer = buffer[:-1]
-                        channel.send(b'\b \b')
-                elif char.isprintable():
-                    buffer += char
-                    channel.send(char.encode())
+            BYTES_RECEIVED.inc(amount=len(data))
+            if record is not None:
+                record.touch()
+            if capture is not None:
+                capture.input(data)
+            
+            for chunk in session.feed(data):
+                if chunk.__class__ is not bytes:
+                    handle_fault(channel, chunk)
+                    continue
+                if capture is not None:
+                    capture.output(chunk)
+                send_bounded(channel, chunk, record)
                     
+        except InjectedDisconnect:
+            log.debug("Session dropped by fault injection")
+            break
         except Exception as e:
-            print(f"Session error: {e}")
+            log.warning("Session error: %s", e)
             break
     
+    if capture is not None:
+        capture.close()
     channel.close()
 
 
-def create_host_key():
-    """Create or load a persistent RSA host key"""
-    key_file = "host_key.rsa"
+def handle_netconf_session(channel, cli, record=None):
+    """Handle a NETCONF subsystem channel"""
+    session = NetconfSession(cli)
+    send_bounded(channel, session.hello())
     
-    if os.path.exists(key_file):
-        # Load existing key
+    while session.running:
         try:
-            key = paramiko.RSAKey.from_private_key_file(key_file)
-            print(f"Loaded existing host key from {key_file}")
-            return key
+            data = channel.recv(65536)
+            if not data:
+                break
+            BYTES_RECEIVED.inc(amount=len(data))
+            if record is not None:
+                record.touch()
+            
+            for chunk in session.feed(data):
+                send_bounded(channel, chunk, record)
+                
+        except NetconfError as e:
+            log.info("NETCONF session %d closed: %s", session.session_id, e)
+            break
         except Exception as e:
-            print(f"Error loading host key: {e}")
-            print("Generating new host key...")
+            log.warning("Session error: %s", e)
+            break
     
-    # Generate new key and save it
-    key = paramiko.RSAKey.generate(2048)
+    channel.close()
+
+
+def run_exec_command(channel, cli, command):
+    """Send the output and exit status of an exec-request command, then EOF
+
+    The status is 1 when the command line could not be resolved or its
+    pipes could not be compiled, as well as when running it failed.
+    """
+    status = 0
     try:
-        key.write_private_key_file(key_file)
-        print(f"Generated and saved new host key to {key_file}")
+        for chunk in cli.iter_command_bytes(command):
+            if chunk.__class__ is not bytes:
+                handle_fault(channel, chunk)
+                continue
+            send_bounded(channel, chunk)
+        if cli.failed:
+            status = 1
+    except InjectedDisconnect:
+        log.debug("Exec session dropped by fault injection")
+        return
     except Exception as e:
-        print(f"Warning: Could not save host key: {e}")
-    
-    return key
+        log.warning("Exec error: %s", e)
+        status = 1
+    channel.send_exit_status(status)
+    channel.shutdown_write()
 
 
-def handle_client_connection(client_socket, host_key):
-    """Handle individual client connections"""
+def handle_exec_command(channel, cli, command):
+    """Run a single exec-request command and close the channel"""
+    try:
+        run_exec_command(channel, cli, command)
+        # The request's success reply may still be on its way; closing
+        # before it is sent makes clients report the channel as failed, so
+        # let the client close first
+        channel.settimeout(EXEC_CLOSE_TIMEOUT)
+        while channel.recv(65536):
+            pass
+    except Exception as e:
+        log.warning("Exec error: %s", e)
+    finally:
+        channel.close()
+
+
+def handle_client_connection(client_socket, settings, state=None, fleet=None, record=None):
+    """Handle individual client connections
+
+    record is the connection's admission record; it is released when the
+    connection ends and lets the idle reaper close the connection.
+    """
     transport = None
+    if record is not None:
+        record.closer = lambda: client_socket.shutdown(socket.SHUT_RDWR)
     try:
         # Set socket timeout to prevent hanging
         client_socket.settimeout(30)
+        # Small request/response packets must not wait for delayed ACKs
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         
-        transport = paramiko.Transport(client_socket)
-        transport.add_server_key(host_key)
+        # Host keys, algorithms and the JUNOS version string
+        transport = settings.create_transport(client_socket)
+        if record is not None:
+            record.closer = transport.close
         
-        # Set local version string to identify as JUNOS device
-        transport.local_version = "SSH-2.0-Juniper_22.4R1.10"
-        
-        server = DeviceSSHServer()
+        server = DeviceSSHServer(fleet=fleet)
         transport.start_server(server=server)
         
         # Wait for authentication with timeout
         channel = transport.accept(30)
         if channel is None:
-            print("No channel opened - authentication may have failed")
+            log.info("No channel opened - authentication may have failed")
+            return
+            
+        # The channel is accepted when opened; wait for its shell, exec or
+        # subsystem request
+        if not server.event.wait(30):
+            log.info("No shell, exec or subsystem request received")
             return
             
-        print("Client authenticated successfully")
+        log.debug("Client authenticated successfully")
         
         # Create CLI instance and handle session
-        cli = DeviceCLI()
-        handle_ssh_session(channel, cli)
+        cli = DeviceCLI(server.device or state)
+        if server.exec_command is not None:
+            SESSIONS.inc("exec")
+            handle_exec_command(channel, cli, server.exec_command)
+        elif server.subsystem == "netconf":
+            SESSIONS.inc("netconf")
+            handle_netconf_session(channel, cli, record)
+        else:
+            SESSIONS.inc("shell")
+            handle_ssh_session(channel, cli, record, server.terminal)
         
     except paramiko.SSHException as e:
-        print(f"SSH protocol error: {e}")
+        log.info("SSH protocol error: %s", e)
     except socket.timeout:
-        print("Connection timed out")
+        log.info("Connection timed out")
     except Exception as e:
-        print(f"Client connection error: {e}")
+        log.warning("Client connection error: %r", e)
     finally:
         try:
             if transport:
                 transport.close()
+            else:
+                client_socket.close()
         except:
             pass
+        if record is not None:
+            admission_control().release(record)
 
 
-def start_ssh_server(host='localhost', port=2222):
-    """Start the SSH server"""
-    print(f"Starting SSH server on {host}:{port}")
-    print("Login credentials: username='admin', password='admin'")
-    
-    # Create host key
-    host_key = create_host_key()
-    
-    # Create server socket
+def admit(client_socket, addr):
+    """Check a new connection against the session caps; None if refused"""
+    admission = admission_control()
+    record = admission.admit(addr)
+    if record is None:
+        log.info("Connection from %s rejected: %s", addr, admission.reason(addr))
+        client_socket.close()
+    else:
+        log.debug("Connection from %s", addr)
+    return record
+
+
+def create_server_socket(host, port, backlog=DEFAULT_BACKLOG, reuse_port=False):
+    """Create, bind and start listening on the server socket"""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
+    if reuse_port:
+        # Lets several worker processes bind the same port; the kernel
+        # spreads incoming connections across them
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     try:
         server_socket.bind((host, port))
-        server_socket.listen(5)
-        print(f"SSH server listening on {host}:{port}")
-        print(f"To connect: ssh admin@{host} -p {port}")
-        print("Press Ctrl+C to stop the server")
+        server_socket.listen(backlog)
+    except Exception:
+        server_socket.close()
+        raise
+    return server_socket
+
+
+def serve_forever(server_socket, settings, state=None, fleet=None):
+    """Accept clients on a listening socket, one handler thread each"""
+    # Without a fleet, all sessions served by this process share one device
+    if state is None and fleet is None:
+        state = DeviceState()
+    while True:
+        client_socket, addr = server_socket.accept()
+        record = admit(client_socket, addr)
+        if record is None:
+            continue
         
+        # Handle connection in a separate thread
+        thread = threading.Thread(
+            target=handle_client_connection,
+            args=(client_socket, settings, state, fleet, record)
+        )
+        thread.daemon = True
+        thread.start()
+
+
+def serve_listeners(listeners, settings):
+    """Accept clients on many listening sockets from a single thread
+
+    listeners maps each listening socket to the device state its clients
+    are connected to.
+    """
+    selector = selectors.DefaultSelector()
+    for server_socket, state in listeners.items():
+        server_socket.setblocking(False)
+        selector.register(server_socket, selectors.EVENT_READ, state)
+    try:
         while True:
-            client_socket, addr = server_socket.accept()
-            print(f"Connection from {addr}")
-            
-            # Handle connection in a separate thread
-            thread = threading.Thread(
-                target=handle_client_connection,
-                args=(client_socket, host_key)
-            )
-            thread.daemon = True
-            thread.start()
+            for key, _ in selector.select():
+                try:
+                    client_socket, addr = key.fileobj.accept()
+                except BlockingIOError:
+                    continue
+                record = admit(client_socket, addr)
+                if record is None:
+                    continue
+                client_socket.setblocking(True)
+                thread = threading.Thread(
+                    target=handle_client_connection,
+                    args=(client_socket, settings, key.data, None, record)
+                )
+                thread.daemon = True
+                thread.start()
+    finally:
+        selector.close()
+
+
+def start_ssh_server(host='localhost', port=2222, backlog=DEFAULT_BACKLOG, settings=None,
+                     state=None):
+    """Start the SSH server"""
+    log.info("Starting SSH server on %s:%d", host, port)
+    log.info("Login credentials: username='admin', password='admin'")
+    
+    # Load or create host keys
+    if settings is None:
+        settings = TransportSettings()
+    
+    server_socket = None
+    try:
+        server_socket = create_server_socket(host, port, backlog)
+        log.info("SSH server listening on %s:%d", host, port)
+        log.info("To connect: ssh admin@%s -p %d", host, port)
+        log.info("Press Ctrl+C to stop the server")
+        
+        serve_forever(server_socket, settings, state)
             
     except KeyboardInterrupt:
-        print("\nShutting down SSH server...")
+        log.info("Shutting down SSH server...")
     except Exception as e:
-        print(f"Server error: {e}")
+        log.error("Server error: %s", e)
     finally:
-        server_socket.close()
+        if server_socket:
+            server_socket.close()
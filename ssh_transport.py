@@ -0,0 +1,142 @@
+"""
+Host keys and SSH transport setup
+
+Every connection gets its own paramiko Transport, so the host key type and
+the key exchange dominate the CPU cost of a connection storm: signing the
+exchange hash with a 2048-bit RSA key costs far more than with Ed25519 or
+ECDSA.  Host keys of each type are generated once and persisted next to
+the RSA key, and the key types, key exchange methods and ciphers offered
+to clients can be restricted and ordered.
+"""
+
+import io
+import logging
+import os
+import socket
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+
+def _generate_ed25519():
+    # paramiko can load but not generate Ed25519 keys
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    data = private_key.private_bytes(serialization.Encoding.PEM,
+                                     serialization.PrivateFormat.OpenSSH,
+                                     serialization.NoEncryption())
+    return data
+
+
+# key type -> (key class, file, generator, host key algorithms)
+HOST_KEY_TYPES = {
+    "ed25519": (paramiko.Ed25519Key, "host_key.ed25519", _generate_ed25519,
+                ("ssh-ed25519",)),
+    "ecdsa": (paramiko.ECDSAKey, "host_key.ecdsa", lambda: paramiko.ECDSAKey.generate(),
+              ("ecdsa-sha2-nistp256",)),
+    "rsa": (paramiko.RSAKey, "host_key.rsa", lambda: paramiko.RSAKey.generate(2048),
+            ("rsa-sha2-512", "rsa-sha2-256", "ssh-rsa")),
+}
+
+DEFAULT_HOST_KEY_TYPES = ("rsa",)
+
+# SHA-1 RSA signatures, still all that some older clients can verify; only
+# offered by the paramiko releases that implement them (before 5.0)
+LEGACY_KEY_ALGORITHMS = ("ssh-rsa",)
+
+# Cheapest widely supported choices: elliptic-curve key exchange and AES in
+# GCM mode, which needs no separate MAC
+FAST_KEX = ("curve25519-sha256@libssh.org", "ecdh-sha2-nistp256")
+FAST_CIPHERS = ("aes128-gcm@openssh.com", "aes128-ctr")
+
+LOCAL_VERSION = "SSH-2.0-Juniper_22.4R1.10"
+
+log = logging.getLogger(__name__)
+
+
+def create_host_key(key_type="rsa"):
+    """Create or load a persistent host key of the given type"""
+    key_class, key_file, generate, _ = HOST_KEY_TYPES[key_type]
+
+    if os.path.exists(key_file):
+        # Load existing key
+        try:
+            key = key_class.from_private_key_file(key_file)
+            log.info("Loaded existing host key from %s", key_file)
+            return key
+        except Exception as e:
+            log.warning("Error loading host key: %s", e)
+            log.info("Generating new host key...")
+
+    # Generate new key and save it
+    key = generate()
+    try:
+        if isinstance(key, bytes):
+            with open(key_file, "wb") as f:
+                f.write(key)
+            os.chmod(key_file, 0o600)
+        else:
+            key.write_private_key_file(key_file)
+        log.info("Generated and saved new host key to %s", key_file)
+    except Exception as e:
+        log.warning("Could not save host key: %s", e)
+
+    if isinstance(key, bytes):
+        key = key_class.from_private_key(io.StringIO(key.decode()))
+    return key
+
+
+def parse_list(value, fast=()):
+    """Split a comma-separated option; "fast" stands for the tuned list"""
+    if not value:
+        return None
+    if value == "fast":
+        return tuple(fast)
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+class TransportSettings:
+    """Host keys, in preference order, and the algorithms offered to clients
+
+    The SSH client makes the final choice among what the server offers, so
+    the order sets preference only among clients' equally acceptable
+    options; listing a single key type or kex method enforces it.
+    """
+
+    def __init__(self, key_types=DEFAULT_HOST_KEY_TYPES, kex=None, ciphers=None):
+        unknown = [key_type for key_type in key_types if key_type not in HOST_KEY_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown host key type: {', '.join(unknown)} "
+                             f"(choose from {', '.join(HOST_KEY_TYPES)})")
+        self.key_types = tuple(key_types)
+        self.kex = tuple(kex) if kex else None
+        self.ciphers = tuple(ciphers) if ciphers else None
+        self.host_keys = [create_host_key(key_type) for key_type in self.key_types]
+        self.key_algorithms = tuple(algorithm for key_type in self.key_types
+                                    for algorithm in HOST_KEY_TYPES[key_type][3]
+                                    if algorithm not in LEGACY_KEY_ALGORITHMS
+                                    or algorithm in paramiko.Transport._key_info)
+        # Fail at startup, not on the first connection, on unknown names
+        with socket.socket() as unconnected:
+            self.apply(paramiko.Transport(unconnected))
+
+    def apply(self, transport):
+        """Add the host keys and algorithm restrictions to a new transport"""
+        for key in self.host_keys:
+            transport.add_server_key(key)
+        options = transport.get_security_options()
+        options.key_types = self.key_algorithms
+        if self.kex:
+            options.kex = self.kex
+        if self.ciphers:
+            options.ciphers = self.ciphers
+        transport.local_version = LOCAL_VERSION
+        return transport
+
+    def create_transport(self, client_socket):
+        return self.apply(paramiko.Transport(client_socket))
+
+    def describe(self):
+        return (f"host keys {', '.join(self.key_types)}; "
+                f"kex {', '.join(self.kex) if self.kex else 'default'}; "
+                f"ciphers {', '.join(self.ciphers) if self.ciphers else 'default'}")
+
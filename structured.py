@@ -0,0 +1,87 @@
+"""
+Structured (XML / JSON) output
+
+Structured output is described as elements: `(tag, content)` pairs where
+content is None for an empty element, a string or number for a text
+element, or an iterable (possibly a generator) of child elements.  The
+emitters below walk that description lazily and yield one line at a time,
+so large replies are serialized while they are produced.
+
+JSON follows the Junos `| display json` layout: every element becomes
+`"tag" : [ ... ]`, with consecutive elements of the same tag grouped into
+one list and text wrapped as `{"data" : "..."}`.
+"""
+
+import json
+from xml.sax.saxutils import escape
+
+
+JUNOS_NAMESPACE = "http://xml.juniper.net/junos/22.4R1/junos"
+
+INDENT = "    "
+
+
+def is_text(content):
+    return isinstance(content, (str, int, float))
+
+
+def iter_xml(elements, depth=0, newline="\r\n"):
+    """Yield XML lines for a sequence of elements"""
+    for tag, content in elements:
+        pad = INDENT * depth
+        if content is None:
+            yield f"{pad}<{tag}/>{newline}"
+        elif is_text(content):
+            yield f"{pad}<{tag}>{escape(str(content))}</{tag}>{newline}"
+        else:
+            yield f"{pad}<{tag}>{newline}"
+            yield from iter_xml(content, depth + 1, newline)
+            yield f"{pad}</{tag}>{newline}"
+
+
+def _json_value(content, depth, comma, newline):
+    pad = INDENT * depth
+    if content is None:
+        yield f"{pad}null{comma}{newline}"
+    elif is_text(content):
+        yield f'{pad}{{"data" : {json.dumps(str(content))}}}{comma}{newline}'
+    else:
+        yield f"{pad}{{{newline}"
+        yield from _json_members(content, depth + 1, newline)
+        yield f"{pad}}}{comma}{newline}"
+
+
+def _json_members(elements, depth, newline):
+    # Consecutive elements with the same tag share one list; one element of
+    # lookahead tells whether a list (or the object) continues
+    pad = INDENT * depth
+    iterator = iter(elements)
+    current = next(iterator, None)
+    while current is not None:
+        tag = current[0]
+        yield f'{pad}"{tag}" : [{newline}'
+        while True:
+            following = next(iterator, None)
+            same = following is not None and following[0] == tag
+            yield from _json_value(current[1], depth, "," if same else "", newline)
+            current = following
+            if not same:
+                break
+        yield f"{pad}]{',' if current is not None else ''}{newline}"
+
+
+def iter_json(elements, newline="\r\n"):
+    """Yield Junos-style JSON lines for a sequence of top-level elements"""
+    yield f"{{{newline}"
+    yield from _json_members(elements, 1, newline)
+    yield f"}}{newline}"
+
+
+def iter_rpc_reply_xml(elements, newline="\r\n"):
+    """Wrap elements in the <rpc-reply> envelope used by `| display xml`"""
+    yield f'<rpc-reply xmlns:junos="{JUNOS_NAMESPACE}">{newline}'
+    yield from iter_xml(elements, 1, newline)
+    yield f"{INDENT}<cli>{newline}"
+    yield f"{INDENT * 2}<banner></banner>{newline}"
+    yield f"{INDENT}</cli>{newline}"
+    yield f"</rpc-reply>{newline}"
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from async_server import run_exec_command_async
+from cli import DeviceCLI
+from device_state import DeviceState
+from faults import FaultInjector, FaultRule, set_fault_injector
+
+
+class Channel:
+    """Just enough of a paramiko channel for sending exec output"""
+
+    def __init__(self, window_open=True):
+        self.window_open = window_open
+        self.closed = False
+        self.sent = []
+        self.exit_status = None
+        self.finished = None
+
+    def send_ready(self):
+        return self.window_open
+
+    def send(self, data):
+        self.sent.append(data)
+        return len(data)
+
+    def send_exit_status(self, status):
+        self.exit_status = status
+
+    def shutdown_write(self):
+        self.finished = time.monotonic()
+
+
+@pytest.fixture
+def latency():
+    set_fault_injector(FaultInjector([FaultRule("show configuration", latency=0.3)]))
+    yield
+    set_fault_injector(None)
+
+
+def run_exec(*sessions):
+    async def main():
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(run_exec_command_async(channel, DeviceCLI(DeviceState()),
+                                                      command, loop)
+                               for channel, command in sessions))
+    started = time.monotonic()
+    asyncio.run(main())
+    return started
+
+
+def test_exec_output_and_status():
+    ok, bad = Channel(), Channel()
+    run_exec((ok, "show version"), (bad, "show bogus"))
+    assert b"".join(ok.sent).startswith(b"\r\nDevice Information:")
+    assert ok.exit_status == 0
+    assert bad.exit_status == 1
+
+
+def test_injected_latency_holds_no_thread(latency):
+    sessions = [(Channel(), "show configuration") for _ in range(20)]
+    fast = Channel()
+    started = run_exec(*sessions, (fast, "show version"))
+    assert fast.finished - started < 0.2
+    assert all(0.3 <= channel.finished - started < 1.0 for channel, _ in sessions)
+
+
+def test_slow_reader_does_not_stall_other_sessions():
+    slow, fast = Channel(window_open=False), Channel()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        blocked = asyncio.ensure_future(
+            run_exec_command_async(slow, DeviceCLI(DeviceState()), "show version", loop))
+        await run_exec_command_async(fast, DeviceCLI(DeviceState()), "show version", loop)
+        assert not blocked.done()
+        slow.window_open = True
+        await blocked
+
+    asyncio.run(main())
+    assert fast.exit_status == 0 and slow.exit_status == 0
+    assert fast.finished < slow.finished
@@ -0,0 +1,137 @@
+import gc
+
+import pytest
+
+from candidate import (DEFAULT_ROLLBACK_DEPTH, Candidate, ConfigEditError, diff_trees,
+                       render_diff, split_statement)
+from cli import DeviceCLI
+from config_tree import ConfigRoot
+from device_state import DeviceState
+
+
+def text(root):
+    return "".join(root.iter_lines())
+
+
+def edit(candidate, statement, delete=False):
+    words = split_statement(statement)
+    candidate.delete(words) if delete else candidate.set(words)
+
+
+def test_split_statement_keeps_quotes_and_lists_whole():
+    assert split_statement('interfaces ge-0/0/0 description "WAN link"') == \
+        ["interfaces", "ge-0/0/0", "description", '"WAN link"']
+    assert split_statement("system authentication-order [radius   password]") == \
+        ["system", "authentication-order", "[ radius password ]"]
+
+
+def test_changed_value_is_one_change():
+    candidate = Candidate(DeviceState())
+    assert not candidate.modified
+    edit(candidate, "system host-name lab1")
+    edit(candidate, "system services ssh", delete=True)
+    assert render_diff(candidate.changes()) == (
+        "[edit system]\r\n"
+        "-  host-name JUNOS-MX;\r\n"
+        "+  host-name lab1;\r\n"
+        "[edit system services]\r\n"
+        "-  ssh {\r\n"
+        "-      root-login allow;\r\n"
+        "-      protocol-version v2;\r\n"
+        "-  }\r\n")
+
+
+def test_edits_copy_only_the_edited_path():
+    state = DeviceState()
+    candidate = Candidate(state)
+    edit(candidate, "system host-name lab1")
+    assert candidate.root is not state.config
+    assert candidate.root.children["system"] is not state.config.children["system"]
+    assert candidate.root.children["interfaces"] is state.config.children["interfaces"]
+    assert list(diff_trees(state.config, state.config)) == []
+
+
+def test_commit_records_history_and_hostname():
+    state = DeviceState()
+    before = text(state.config)
+    candidate = Candidate(state)
+    edit(candidate, "system host-name lab1")
+    commit = candidate.commit("alice")
+    assert commit.user == "alice"
+    assert state.hostname == "lab1"
+    assert len(state.history) == 1
+    assert not candidate.modified
+    assert text(state.config) == before.replace("host-name JUNOS-MX;", "host-name lab1;")
+    assert Candidate(state).commit() is None
+
+
+def test_rollback_restores_earlier_commits():
+    state = DeviceState()
+    original = text(state.config)
+    candidate = Candidate(state)
+    edit(candidate, "system host-name lab1")
+    candidate.commit()
+    edit(candidate, "system services ssh", delete=True)
+    edit(candidate, "system ntp server 2.pool.ntp.org")
+    candidate.commit()
+    after_first = text(candidate.rollback_tree(1))
+
+    candidate.rollback(2)
+    assert text(candidate.root) == original
+    candidate.commit()
+    assert text(state.config) == original
+    assert state.hostname == "JUNOS-MX"
+    assert text(Candidate(state).rollback_tree(2)) == after_first
+
+    with pytest.raises(ConfigEditError):
+        candidate.rollback(len(state.history) + 1)
+
+
+def test_commit_replays_edits_over_another_sessions_commit():
+    state = DeviceState()
+    first, second = Candidate(state), Candidate(state)
+    edit(first, "system host-name lab1")
+    edit(second, "system domain-name example.net")
+    first.commit()
+    second.commit()
+    assert "host-name lab1;" in text(state.config)
+    assert "domain-name example.net;" in text(state.config)
+
+
+def test_commit_refused_when_another_session_removed_the_edited_statement():
+    state = DeviceState()
+    first, second = Candidate(state), Candidate(state)
+    edit(first, "system services ssh", delete=True)
+    edit(second, "system services ssh", delete=True)
+    first.commit()
+    with pytest.raises(ConfigEditError, match="another session"):
+        second.commit()
+
+
+def test_compare_in_a_stale_candidate_shows_what_commit_would_change():
+    state = DeviceState()
+    first, second = DeviceCLI(state), DeviceCLI(state)
+    for cli in (first, second):
+        cli.process_command("configure")
+    first.process_command("set system host-name R1")
+    second.process_command("set system domain-name example.net")
+    first.process_command("commit")
+    compare = "".join(second.process_command("show | compare"))
+    assert compare.endswith("\n[edit system]\r\n-  domain-name lab.local;\r\n"
+                            "+  domain-name example.net;\r\n")
+    assert "host-name" not in compare
+    assert render_diff(second.candidate.commit().changes) in compare
+    assert "host-name R1;" in text(state.config)
+
+
+def test_replaced_configurations_are_freed():
+    state = DeviceState()
+    candidate = Candidate(state)
+    edit(candidate, "system services telnet connection-limit 5")
+    candidate.commit()
+    for number in range(DEFAULT_ROLLBACK_DEPTH + 10):
+        edit(candidate, f"system host-name R{number}")
+        candidate.commit()
+    gc.collect()
+    roots = [item for item in gc.get_objects() if isinstance(item, ConfigRoot)]
+    assert len(roots) < 5
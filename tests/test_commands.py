@@ -0,0 +1,57 @@
+from cli import COMMAND_TRIE, DeviceCLI
+from commands import Command, CommandError, CommandTrie
+from device_state import DeviceState
+
+
+def resolve(line):
+    return COMMAND_TRIE.resolve(line.split())
+
+
+def test_unique_prefixes_resolve_to_the_full_command():
+    for line, path in (("show version", ("show", "version")),
+                       ("sh ver", ("show", "version")),
+                       ("sh sys st", ("show", "system", "storage")),
+                       ("sh int terse", ("show", "interfaces", "terse")),
+                       ("sh sys", ("show", "system"))):
+        resolution = resolve(line)
+        assert resolution.error is None, line
+        assert resolution.command.path == path
+
+
+def test_arguments_follow_the_keywords():
+    resolution = resolve("sh int ge-0/0/0")
+    assert resolution.command.path == ("show", "interfaces")
+    assert resolution.args == ("ge-0/0/0",)
+    resolution = resolve("show configuration interfaces ge-0/0/0")
+    assert resolution.args == ("interfaces ge-0/0/0",)
+
+
+def test_ambiguous_unknown_and_incomplete_commands():
+    assert resolve("show s").error is None  # only `system` starts with s
+    assert resolve("show bogus").error.startswith("Unknown")
+    assert resolve("sh").error.startswith("Incomplete command")
+    assert resolve("bogus").error.startswith("Unknown command: bogus")
+    assert resolve("show interface").error == "Error: Interface name required\r\n"
+
+
+def test_hidden_commands_need_the_full_keyword():
+    assert resolve("show interface ge-0/0/0").command.path == ("show", "interface")
+    assert "\r\n  interface " not in COMMAND_TRIE.completions(["show"])
+
+
+def test_ambiguous_prefix_lists_the_candidates():
+    trie = CommandTrie((Command("show system", "", None), Command("show storage", "", None)))
+    resolution = trie.resolve(["show", "s"])
+    assert resolution.error.startswith("Ambiguous command: s\r\n")
+    assert "storage" in resolution.error and "system" in resolution.error
+    assert trie.resolve(["show", "sy"]).command.path == ("show", "system")
+
+
+def test_cli_reports_failed_command_lines():
+    cli = DeviceCLI(DeviceState())
+    for line, failed in (("show version", False), ("show bogus", True),
+                         ("show version | bogus", True), ("show ?", False),
+                         ("sh int | match up", False)):
+        cli.process_command_bytes(line)
+        assert cli.failed is failed, line
+    assert isinstance(cli.resolve("show bogus"), CommandError)
@@ -0,0 +1,68 @@
+import pytest
+
+from cli import DeviceCLI
+from control import DeviceStore, TransactionError, VersionConflict
+from device_state import DeviceTemplate
+
+
+@pytest.fixture
+def store():
+    template = DeviceTemplate(interface_status={"ge-0/0/0": "up", "ge-0/0/1": "up",
+                                                "xe-0/0/0": "up"})
+    return DeviceStore({name: template.build(name) for name in ("dev0000", "dev0001")})
+
+
+def test_patterns_select_devices_and_interfaces(store):
+    assert store.apply([{"devices": "dev000*", "interfaces": {"ge-*": "down"}},
+                        {"devices": "dev0001", "hostname": "lab-{device}"}]) == (1, 2, 4)
+    down = {"ge-0/0/0": "down", "ge-0/0/1": "down", "xe-0/0/0": "up"}
+    assert store.describe("dev0000")["hostname"] == "dev0000"
+    assert store.describe("dev0000")["interfaces"] == down
+    assert store.describe("dev0001")["hostname"] == "lab-dev0001"
+    assert store.describe("dev0001")["interfaces"] == down
+    assert store.describe("dev0002") is None
+
+
+@pytest.mark.parametrize("changes", [
+    [{"devices": "nope", "hostname": "x"}],
+    [{"interfaces": {"ge-0/0/0": "down", "zz": "up"}}],
+    [{"interfaces": {"ge-0/0/0": "sideways"}}],
+    [{"hostname": "two words"}],
+    [{"color": "red"}],
+    "not a list",
+])
+def test_invalid_transactions_change_nothing(store, changes):
+    versions = {name: state.version for name, state in store.devices.items()}
+    with pytest.raises(TransactionError):
+        store.apply(changes)
+    assert {name: state.version for name, state in store.devices.items()} == versions
+    assert store.devices["dev0000"].interface_status["ge-0/0/0"] == "up"
+    assert store.version == 0
+
+
+def test_interface_changes_take_one_device_version(store):
+    state = store.devices["dev0000"]
+    version = state.version
+    assert store.apply([{"interfaces": {"*": "down"}}]) == (1, 2, 6)
+    assert state.version == version + 1
+    assert state.interface_status.items() == \
+        [("ge-0/0/0", "down"), ("ge-0/0/1", "down"), ("xe-0/0/0", "down")]
+
+
+def test_if_version_refuses_stale_transactions(store):
+    store.apply([{"hostname": "a-{device}"}], if_version=0)
+    with pytest.raises(VersionConflict):
+        store.apply([{"hostname": "b-{device}"}], if_version=0)
+    assert store.devices["dev0000"].hostname == "a-dev0000"
+
+
+def test_hostname_is_committed_to_the_configuration(store):
+    state = store.devices["dev0001"]
+    cli = DeviceCLI(state)
+    store.apply([{"devices": "dev0001", "hostname": "core-1"}])
+    assert cli.get_prompt() == "core-1> "
+    assert "host-name core-1;" in cli.process_command("show configuration system")
+    assert "by control via cli" in cli.process_command("show system commit")
+    # The other device built from the same template keeps its configuration
+    other = DeviceCLI(store.devices["dev0000"]).process_command("show configuration system")
+    assert "host-name core-1;" not in other
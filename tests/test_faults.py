@@ -0,0 +1,51 @@
+import pytest
+
+from cli import DeviceCLI
+from device_state import DeviceState
+from faults import DISCONNECT, FaultInjector, FaultRule, Pause, set_fault_injector
+
+
+@pytest.fixture
+def inject():
+    def install(**rule):
+        set_fault_injector(FaultInjector([FaultRule(**rule)], seed=1))
+    yield install
+    set_fault_injector(None)
+
+
+def output(command, screen_length=0):
+    chunks, _ = DeviceCLI(DeviceState()).command_output(command, screen_length)
+    return list(chunks)
+
+
+@pytest.mark.parametrize("screen_length", [0, 24])
+def test_disconnect_cuts_the_output_after_some_of_it(inject, screen_length):
+    full = b"".join(output("show version"))
+    inject(disconnect_rate=1)
+    for _ in range(20):
+        chunks = output("show version", screen_length)
+        assert chunks[-1] is DISCONNECT
+        sent = b"".join(chunks[:-1])
+        assert full.startswith(sent)
+        assert sent.strip(b"\r\n")
+        assert len(sent) < len(full)
+
+
+def test_latency_comes_before_the_output(inject):
+    inject(latency=0.5)
+    chunks = output("show version")
+    assert isinstance(chunks[0], Pause) and chunks[0].seconds == 0.5
+    assert chunks[1].startswith(b"\r\n")
+
+
+def test_error_replaces_the_output(inject):
+    inject(error_rate=1, error="error: database locked")
+    assert output("show version") == [b"\r\nerror: database locked\r\n"]
+
+
+def test_rules_match_resolved_commands_and_devices(inject):
+    inject(command="show configuration", devices="dev*", error_rate=1)
+    assert b"error:" not in b"".join(output("sh conf"))
+    inject(command="show configuration", error_rate=1)
+    assert b"error:" in b"".join(output("sh conf"))
+    assert b"error:" not in b"".join(output("show version"))
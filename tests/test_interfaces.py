@@ -0,0 +1,44 @@
+from device_state import DeviceTemplate
+from interfaces import InterfaceTable
+
+
+def test_copies_keep_their_own_statuses():
+    table = InterfaceTable.from_status({"ge-0/0/0": "up", "ge-0/0/1": "down"})
+    copy = table.copy()
+    copy["ge-0/0/0"] = "down"
+    assert table["ge-0/0/0"] == "up"
+    assert copy.items() == [("ge-0/0/0", "down"), ("ge-0/0/1", "down")]
+
+
+def test_adding_to_a_copied_table_leaves_the_copies_alone():
+    template = DeviceTemplate(interface_status={"ge-0/0/0": "up"})
+    built = template.build("dev0000")
+    template.interfaces.add("ge-0/0/1", oper="down")
+    assert list(built.interface_status) == ["ge-0/0/0"]
+    assert list(built.interface_status.iter_status_lines()) == \
+        ["ge-0/0/0        up       Gigabit Ethernet         \r\n"]
+    assert template.interfaces["ge-0/0/1"] == "down"
+
+
+def test_adding_to_a_copy_leaves_the_source_alone():
+    table = InterfaceTable.from_status({"ge-0/0/0": "up"})
+    copy = table.copy()
+    copy.add("lo0")
+    assert "lo0" not in table
+    assert len(table) == 1 and len(copy) == 2
+
+
+def test_set_oper_many_bumps_the_owner_version_once():
+    template = DeviceTemplate(interface_status={"ge-0/0/0": "up", "ge-0/0/1": "up"})
+    state = template.build("dev0000")
+    version = state.version
+    state.interface_status.set_oper_many([("ge-0/0/0", "down"), ("ge-0/0/1", "down")])
+    assert state.version == version + 1
+    assert state.interface_status.items() == [("ge-0/0/0", "down"), ("ge-0/0/1", "down")]
+
+
+def test_rates_of_fast_ports_fit_their_columns():
+    table = InterfaceTable()
+    for number, speed in enumerate((400000, 800000, 1600000)):
+        table.add(f"et-0/0/{number}", speed=speed)
+    assert max(table.in_rate) > 2**32
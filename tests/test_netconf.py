@@ -0,0 +1,84 @@
+import pytest
+
+from cli import DeviceCLI
+from device_state import DeviceState
+from netconf import BASE_1_0, BASE_1_1, END_OF_MESSAGE, NetconfError, NetconfSession
+
+
+def client_hello(*capabilities):
+    listed = "".join(f"<capability>{capability}</capability>" for capability in capabilities)
+    return (f'<hello xmlns="urn:ietf:params:xml:ns:netconf:base:1.0">'
+            f"<capabilities>{listed}</capabilities></hello>").encode() + END_OF_MESSAGE
+
+
+def rpc(operation, message_id="1"):
+    return f'<rpc message-id="{message_id}"><{operation}/></rpc>'.encode()
+
+
+def chunked(*parts):
+    return b"".join(b"\n#%d\n" % len(part) + part for part in parts) + b"\n##\n"
+
+
+def session(*capabilities):
+    netconf = NetconfSession(DeviceCLI(DeviceState()))
+    assert netconf.hello().endswith(END_OF_MESSAGE)
+    assert list(netconf.feed(client_hello(*capabilities))) == []
+    return netconf
+
+
+def test_end_of_message_framing():
+    netconf = session(BASE_1_0)
+    assert not netconf.chunked
+    reply = b"".join(netconf.feed(rpc("get-software-information") + END_OF_MESSAGE))
+    assert reply.startswith(b'<rpc-reply message-id="1"')
+    assert reply.endswith(b"</rpc-reply>\n" + END_OF_MESSAGE)
+    assert reply.count(END_OF_MESSAGE) == 1
+
+
+def test_end_of_message_split_across_reads():
+    netconf = session(BASE_1_0)
+    message = rpc("get-software-information") + END_OF_MESSAGE
+    assert list(netconf.feed(message[:-3])) == []
+    reply = b"".join(netconf.feed(message[-3:]))
+    assert reply.endswith(END_OF_MESSAGE)
+
+
+def test_chunked_framing_after_base_1_1_hello():
+    netconf = session(BASE_1_0, BASE_1_1)
+    assert netconf.chunked
+    message = rpc("get-software-information", "7")
+    reply = b"".join(netconf.feed(chunked(message[:10], message[10:])))
+    assert reply.startswith(b"\n#")
+    assert reply.endswith(b"\n##\n")
+    assert END_OF_MESSAGE not in reply
+
+    header, body = reply[2:].split(b"\n", 1)
+    assert body[:int(header)].startswith(b'<rpc-reply message-id="7"')
+
+
+def test_chunked_message_split_across_reads():
+    netconf = session(BASE_1_1)
+    data = chunked(rpc("get-software-information"))
+    assert list(netconf.feed(data[:5])) == []
+    assert list(netconf.feed(data[5:-2])) == []
+    assert b"".join(netconf.feed(data[-2:])).endswith(b"\n##\n")
+
+
+def test_unsupported_operation_is_an_rpc_error():
+    netconf = session(BASE_1_0)
+    reply = b"".join(netconf.feed(rpc("frobnicate") + END_OF_MESSAGE))
+    assert b"<error-tag>operation-not-supported</error-tag>" in reply
+    assert reply.endswith(END_OF_MESSAGE)
+
+
+@pytest.mark.parametrize("data", [b"#5\nhello\n##\n", b"\n#05\nhello\n##\n", b"\n#x\n"])
+def test_invalid_chunk_framing_ends_the_session(data):
+    netconf = session(BASE_1_1)
+    with pytest.raises(NetconfError):
+        list(netconf.feed(data))
+
+
+def test_first_message_must_be_hello():
+    netconf = NetconfSession(DeviceCLI(DeviceState()))
+    with pytest.raises(NetconfError):
+        list(netconf.feed(rpc("get-software-information") + END_OF_MESSAGE))
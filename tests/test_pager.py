@@ -0,0 +1,90 @@
+from cli import DeviceCLI
+from device_state import DeviceState
+from pager import CLEAR_PROMPT, MORE_PROMPT, Pager
+from session import CLISession, Terminal
+
+
+PROMPT = b"JUNOS-MX> "
+
+
+def lines(count):
+    return [b"line %d\r\n" % number for number in range(count)]
+
+
+def show(pager, count):
+    return b"".join(pager.show(count))
+
+
+def session(height=6):
+    cli = DeviceCLI(DeviceState())
+    return CLISession(cli, Terminal(80, height))
+
+
+def content_lines(output):
+    return output.split(CLEAR_PROMPT)[-1].replace(MORE_PROMPT, b"").count(b"\n")
+
+
+def test_pager_stops_at_the_more_prompt():
+    pager = Pager(lines(10), 6)
+    assert pager.page_lines == 5
+    assert show(pager, 5) == b"".join(lines(5)) + MORE_PROMPT
+    assert show(pager, 1) == b"line 5\r\n" + MORE_PROMPT
+    assert show(pager, 5) == b"".join(lines(10)[6:])
+
+
+def test_pager_splits_pieces_holding_several_lines():
+    pager = Pager([b"".join(lines(4))], 3)
+    assert show(pager, 2) == b"line 0\r\nline 1\r\n" + MORE_PROMPT
+    assert show(pager, 2) == b"line 2\r\nline 3\r\n"
+
+
+def test_first_page_is_as_long_as_the_others():
+    cli = session()
+    first = b"".join(cli.feed(b"show configuration\r"))
+    assert first.startswith(b"show configuration\r\n")
+    assert first.endswith(MORE_PROMPT)
+    # The echoed command line ends with the output's leading line end
+    assert content_lines(first[len(b"show configuration\r\n"):]) == 5
+    second = b"".join(cli.feed(b" "))
+    assert second.startswith(CLEAR_PROMPT) and second.endswith(MORE_PROMPT)
+    assert content_lines(second) == 5
+
+
+def test_enter_shows_one_more_line():
+    cli = session()
+    list(cli.feed(b"show configuration\r"))
+    output = b"".join(cli.feed(b"\r\n"))
+    assert output.startswith(CLEAR_PROMPT) and output.endswith(MORE_PROMPT)
+    assert content_lines(output) == 1
+
+
+def test_space_pages_to_the_end_and_prompts():
+    cli = session(height=40)
+    output = b"".join(cli.feed(b"show configuration\r"))
+    while output.endswith(MORE_PROMPT):
+        output = b"".join(cli.feed(b" "))
+    assert output.endswith(PROMPT)
+    assert b"".join(cli.feed(b"show bogus\r")).startswith(b"show bogus")
+
+
+def test_quit_abandons_the_output():
+    cli = session()
+    list(cli.feed(b"show configuration\r"))
+    assert b"".join(cli.feed(b"q")) == CLEAR_PROMPT + PROMPT
+    assert b"".join(cli.feed(b" ")) == b" "
+
+
+def test_quit_closes_the_command():
+    closed = []
+
+    def command():
+        try:
+            yield from lines(100)
+        finally:
+            closed.append(True)
+
+    pager = Pager(command(), 6)
+    show(pager, 5)
+    assert not closed
+    pager.close()
+    assert closed == [True]
@@ -0,0 +1,72 @@
+import pytest
+
+from cli import DeviceCLI
+from device_state import DeviceState
+from pipeline import PipeError, apply_pipes, compile_stages, iter_lines, split_pipes
+from session import CLISession
+
+
+DOWN_ROW = "ge-0/0/1        down     Gigabit Ethernet         \r\n"
+
+
+def lines(*texts):
+    return [text + "\r\n" for text in texts]
+
+
+def run(texts, *stages):
+    return list(apply_pipes(iter(texts), compile_stages(list(stages))))
+
+
+def test_split_pipes_keeps_quoted_bars():
+    assert split_pipes('show configuration | match "a|b" | count') == \
+        ("show configuration", ['match "a|b"', "count"])
+    assert split_pipes("show version") == ("show version", [])
+
+
+def test_iter_lines_joins_pieces_split_mid_line():
+    assert list(iter_lines(["ab", "c\r\nd", "e\r\n", "tail"])) == \
+        ["abc\r\n", "de\r\n", "tail"]
+
+
+def test_match_and_except():
+    text = lines("ge-0/0/0 up", "ge-0/0/1 down", "lo0 up")
+    assert run(text, "match down") == lines("ge-0/0/1 down")
+    assert run(text, 'except "up$"') == lines("ge-0/0/1 down")
+
+
+def test_count_and_last():
+    text = lines("a", "b", "c")
+    assert run(text, "count") == ["Count: 3 lines\r\n"]
+    assert run(text, "last 2") == lines("b", "c")
+    assert run(text, "match a|c", "count") == ["Count: 2 lines\r\n"]
+
+
+def test_stage_abbreviations_and_errors():
+    assert [stage.name for stage in compile_stages(["m x", "cou", "no"])] == \
+        ["match", "count", "no-more"]
+    for text in ("bogus", "match", "match (", "last 0", "count 3", "display yaml"):
+        with pytest.raises(PipeError):
+            compile_stages([text])
+
+
+def test_piped_output_starts_on_its_own_line():
+    cli = DeviceCLI(DeviceState())
+    assert cli.process_command_bytes("show interfaces | match down") == \
+        ("\r\n" + DOWN_ROW).encode()
+    assert cli.process_command_bytes("show interfaces | match down | count") == \
+        b"\r\nCount: 1 lines\r\n"
+    assert cli.process_command_bytes("show interfaces terse | display json").startswith(
+        b"\r\n{\r\n")
+
+
+def test_piped_output_in_a_session_is_byte_exact():
+    session = CLISession(DeviceCLI(DeviceState()))
+    output = b"".join(session.feed(b"show interfaces | match down\r"))
+    assert output == ("show interfaces | match down\r\n" + DOWN_ROW + "JUNOS-MX> ").encode()
+
+
+def test_unpiped_output_starts_the_same_way():
+    cli = DeviceCLI(DeviceState())
+    output = cli.process_command_bytes("show interfaces")
+    assert output.startswith(b"\r\nInterface Status:\r\n")
+    assert cli.process_command_bytes("show bogus").startswith(b"\r\nUnknown command: show bogus")
@@ -0,0 +1,62 @@
+import pytest
+
+from recorder import CLOSE, FRAME, INPUT, MAGIC, OPEN, OUTPUT, Recorder, iter_frames, scan_log
+from replay import load_sessions
+
+
+def record(path, hostname, inputs):
+    recorder = Recorder(str(path))
+    capture = recorder.open_session(hostname)
+    for data in inputs:
+        capture.input(data)
+        capture.output(b"echo " + data)
+    capture.close()
+    recorder.close()
+
+
+def test_frames_round_trip(tmp_path):
+    path = tmp_path / "sessions.log"
+    record(path, "dev0001", [b"show version\r", b"exit\r"])
+    frames = [(session_id, kind, bytes(payload))
+              for _, session_id, kind, payload in iter_frames(path.read_bytes())]
+    assert frames == [
+        (1, OPEN, b"dev0001"),
+        (1, INPUT, b"show version\r"),
+        (1, OUTPUT, b"echo show version\r"),
+        (1, INPUT, b"exit\r"),
+        (1, OUTPUT, b"echo exit\r"),
+        (1, CLOSE, b""),
+    ]
+
+
+def test_truncated_last_frame_is_ignored(tmp_path):
+    path = tmp_path / "sessions.log"
+    record(path, "dev0001", [b"show version\r"])
+    data = path.read_bytes()
+    assert len(list(iter_frames(data[:-1]))) == 3
+    with pytest.raises(ValueError):
+        list(iter_frames(b"not a log"))
+
+
+def test_sessions_of_a_restarted_server_stay_apart(tmp_path):
+    path = tmp_path / "sessions.log"
+    record(path, "dev0001", [b"show version\r"])
+    record(path, "dev0002", [b"show interfaces\r"])
+    assert path.read_bytes().count(MAGIC) == 1
+    assert scan_log(str(path))[0] == 2
+    sessions = load_sessions([path.read_bytes()])
+    assert [session.hostname for session in sessions] == ["dev0001", "dev0002"]
+    assert [bytes(session.inputs[0][1]) for session in sessions] == \
+        [b"show version\r", b"show interfaces\r"]
+
+
+def test_half_written_frame_is_dropped_on_restart(tmp_path):
+    path = tmp_path / "sessions.log"
+    record(path, "dev0001", [b"show version\r"])
+    whole = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(FRAME.pack(0.0, 1, INPUT, 100) + b"partial")
+    record(path, "dev0002", [b"exit\r"])
+    sessions = load_sessions([path.read_bytes()])
+    assert [session.hostname for session in sessions] == ["dev0001", "dev0002"]
+    assert path.stat().st_size > whole
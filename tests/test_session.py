@@ -0,0 +1,59 @@
+from cli import DeviceCLI
+from device_state import DeviceState
+from session import CLISession
+
+
+COMMAND = b"show interfaces | match down"
+OUTPUT = b"\r\nge-0/0/1        down     Gigabit Ethernet         \r\n"
+PROMPT = b"JUNOS-MX> "
+
+
+def session():
+    return CLISession(DeviceCLI(DeviceState()))
+
+
+def test_crlf_is_one_line_end():
+    cli = session()
+    assert b"".join(cli.feed(COMMAND + b"\r\n")) == COMMAND + OUTPUT + PROMPT
+
+
+def test_crlf_split_across_chunks_is_one_line_end():
+    cli = session()
+    assert b"".join(cli.feed(COMMAND + b"\r")) == COMMAND + OUTPUT + PROMPT
+    assert list(cli.feed(b"\n")) == []
+    assert list(cli.feed(b"\n")) == [PROMPT]
+
+
+def test_lone_cr_and_lf_end_lines():
+    cli = session()
+    assert b"".join(cli.feed(b"\r\n\n\r")) == PROMPT * 3
+
+
+def test_backspace_across_chunks():
+    cli = session()
+    assert b"".join(cli.feed(b"show interfaces | match dowx")) == \
+        b"show interfaces | match dowx"
+    assert b"".join(cli.feed(b"\x7f")) == b"\b \b"
+    assert b"".join(cli.feed(b"yy\x7f\x7f\x7fwn")) == b"yy\b \b\b \b\b \bwn"
+    assert cli.buffer == COMMAND.decode()
+    assert b"".join(cli.feed(b"\r")) == OUTPUT + PROMPT
+
+
+def test_backspace_on_an_empty_line_echoes_nothing():
+    cli = session()
+    assert list(cli.feed(b"\x7f\x7f")) == []
+    assert cli.buffer == ""
+
+
+def test_pipelined_lines_in_one_chunk():
+    cli = session()
+    output = b"".join(cli.feed(COMMAND + b"\r" + COMMAND + b"\r\nshow bo"))
+    assert output == (COMMAND + OUTPUT + PROMPT) * 2 + b"show bo"
+    assert cli.buffer == "show bo"
+
+
+def test_one_write_per_chunk():
+    cli = session()
+    writes = list(cli.feed(COMMAND + b"\r" + COMMAND + b"\r" + b"\r"))
+    assert len(writes) == 1
+    assert writes[0] == (COMMAND + OUTPUT + PROMPT) * 2 + PROMPT
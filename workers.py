@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Pre-forked worker processes for the simulated device
+
+The parent loads the host keys and (unless SO_REUSEPORT is requested) opens
+the listening socket once, then forks worker processes that each run the
+normal accept loop.  Every worker therefore presents the same host key
+fingerprint.  The parent only supervises: crashed workers are restarted,
+workers that keep failing at startup (a port that cannot be bound, say)
+stop the pool, and Ctrl+C stops the whole pool.
+"""
+
+import logging
+import os
+import signal
+import time
+from logger import flush_logging
+from metrics import start_metrics_server
+from recorder import flush_recording
+from ssh_server import DEFAULT_BACKLOG, create_server_socket, serve_forever
+from ssh_transport import TransportSettings
+
+
+log = logging.getLogger(__name__)
+
+
+# A worker that dies sooner than this after starting is treated as crash
+# looping and restarted only after RESTART_DELAY
+MIN_WORKER_LIFETIME = 1.0
+RESTART_DELAY = 1.0
+# Consecutive quick exits of one worker after which the pool gives up
+MAX_QUICK_EXITS = 5
+SHUTDOWN_TIMEOUT = 5.0
+
+
+def _terminate(signum, frame):
+    # Unwind through run_worker's finally, which flushes the recorder and log
+    raise SystemExit(0)
+
+
+def run_worker(listen_socket, settings, host, port, backlog, mode, metrics_port=None):
+    """Body of a worker process; never returns"""
+    # The terminal delivers Ctrl+C to the whole process group, but shutdown
+    # is coordinated by the parent, which sends SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+    status = 0
+    try:
+        if listen_socket is None:
+            listen_socket = create_server_socket(host, port, backlog, reuse_port=True)
+        if metrics_port is not None:
+            start_metrics_server(metrics_port)
+            log.info("Worker %d accepting connections, metrics on port %d",
+                     os.getpid(), metrics_port)
+        else:
+            log.info("Worker %d accepting connections", os.getpid())
+        if mode == "asyncio":
+            import asyncio
+            from async_server import serve
+            asyncio.run(serve(listen_socket, settings))
+        else:
+            serve_forever(listen_socket, settings)
+    except Exception as e:
+        log.error("Worker %d error: %s", os.getpid(), e)
+        status = 1
+    finally:
+        flush_recording()
+        flush_logging()
+        os._exit(status)
+
+
+class WorkerPool:
+    """Forks and supervises a fixed number of server processes"""
+
+    def __init__(self, host, port, workers, backlog=DEFAULT_BACKLOG,
+                 reuse_port=False, mode="threaded", settings=None, metrics_port=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.mode = mode
+        self.settings = settings
+        # Worker n serves its own metrics on metrics_port + n
+        self.metrics_port = metrics_port
+        self.listen_socket = None
+        self.children = {}  # pid -> (start time, worker number)
+        self.quick_exits = {}  # worker number -> consecutive quick exits
+        self.stopping = False
+
+    def spawn(self, number):
+        pid = os.fork()
+        if pid == 0:
+            metrics_port = self.metrics_port + number if self.metrics_port is not None else None
+            run_worker(self.listen_socket, self.settings, self.host, self.port,
+                       self.backlog, self.mode, metrics_port)
+        self.children[pid] = (time.monotonic(), number)
+        return pid
+
+    def start(self):
+        if self.settings is None:
+            self.settings = TransportSettings()
+        if not self.reuse_port:
+            self.listen_socket = create_server_socket(self.host, self.port, self.backlog)
+        for number in range(self.workers):
+            self.spawn(number)
+
+    def supervise(self):
+        """Wait for workers to exit and replace them until stopped"""
+        while not self.stopping:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                return
+            child = self.children.pop(pid, None)
+            if self.stopping or child is None:
+                continue
+            started, number = child
+            status = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started >= MIN_WORKER_LIFETIME:
+                self.quick_exits[number] = 0
+            else:
+                self.quick_exits[number] = self.quick_exits.get(number, 0) + 1
+                if self.quick_exits[number] >= MAX_QUICK_EXITS:
+                    log.error("Worker %d exited with status %d, %d times in a row at "
+                              "startup; stopping", pid, status, MAX_QUICK_EXITS)
+                    return
+            log.warning("Worker %d exited with status %d, restarting", pid, status)
+            if self.quick_exits[number]:
+                time.sleep(RESTART_DELAY)
+            self.spawn(number)
+
+    def stop(self):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+        if self.listen_socket:
+            self.listen_socket.close()
+
+
+def start_worker_pool(host='localhost', port=2222, workers=2, backlog=DEFAULT_BACKLOG,
+                      reuse_port=False, mode="threaded", settings=None, metrics_port=None):
+    """Start the SSH server as a supervised pool of worker processes"""
+    log.info("Starting SSH server on %s:%d with %d workers", host, port, workers)
+    log.info("Login credentials: username='admin', password='admin'")
+
+    pool = WorkerPool(host, port, workers, backlog, reuse_port, mode, settings, metrics_port)
+    try:
+        pool.start()
+        sharing = "SO_REUSEPORT" if reuse_port else "shared listening socket"
+        log.info("SSH server listening on %s:%d (%s)", host, port, sharing)
+        log.info("To connect: ssh admin@%s -p %d", host, port)
+        log.info("Press Ctrl+C to stop the server")
+        pool.supervise()
+    except KeyboardInterrupt:
+        log.info("Shutting down SSH server...")
+    except Exception as e:
+        log.error("Server error: %s", e)
+    finally:
+        pool.stop()